@@ -1,13 +1,12 @@
 
 #Grid Data Processor v0.0.2 by ydx and ghz
 #Used for Grid2 calibration
-#This is the main module, with the basic functions stored in 'gridBasicFunctions.py'
+#This is the main module, with the basic functions stored in 'gridBasicFunctions.py' and the processing stages in 'gridPipeline.py'
 
 import gridBasicFunctions as grid
-import gridExperimentFunctions as experiment
+import gridPipeline as pipeline
 import sys
 import os
-import numpy as np
 
 #******************************************************************************************************************************************************
 #***************************************************************Auxiliary functions*****************************************************************
@@ -28,6 +27,8 @@ def printUsage():
     print('\'o\': Save the process results in text files(.txt)')
     print('\'f\': Fit the data spectrum')
     print('\'g\': Do only gaussian peak fitting with no quadratic background in fit session')
+    print('\'w\': Warm-started fits in fit session, with the fit of each scan or file started from the peak and background of the previous one')
+    print('\'u\': Estimate the live time of count rate correction from unbinned data instead of the histogram fit')
     print('\'p\': Plot the processed data from the input file(s)')
     print('\'t\': Do temperature analysis and give the calibration results')
     print('\'b\': Do bias analysis and give the calibration results')
@@ -45,22 +46,38 @@ def printUsage():
     print('  Available sources:')
     print('  \'Am241\', \'Cs137\', \'Na22\', \'Th228\', \'Co60\', \'x\'')
     print('\'--mul\': Files with multiple scans. The scan numbers of interest can be specified with a following option \'--scan\'')
-    print('\'--scan\': Scan numbers to be processed for specified multiple scan file')
+    print('\'--scan\': Scan numbers to be processed for specified multiple scan file, only the bytes of these scans being read with the scan index saved beside the file(.gidx) at the first readout')
     print('  For multiple scan files the scans of interest can be specified in the form of \'[lower upper]\' or just \'lower upper\', only scans from #lower to #upper will be processed')
     print('\'--bkg\': set the background file')
     print('  For single channel fits or x-ray spectrum fits, please specify the channel number with a following option \'--ch\' or the fit range with a following option \'--range\'')
     print('\'--ch\': Channel number in range [0-3]')
     print('\'--range\': Fit range in ADC channels')
     print('  For x-ray fits, please give the fit range in the form of \'[lower upper]\' or just \'lower upper\'')
+    print('\'--autorange\': Locate the peaks of the spectra automatically and fit in the proposed windows instead of the reference fit range, the reference fit range or \'--range\' being used for the channels with no peak found')
     print('\'--nocorr\': Do not do temperature-bias correction')
     print('\'--iter\': Maximum number of iteration for spectrum fitting, 0 for no iteration')
     print('\'--sigma\': Boundary for auto-correction fit in \sigma, with boundaries being \mu - bound * \sigma and \mu + bound * \sigma')
     print('\'--noplot\': Do not plot the spectrum during fit session')
+    print('\'--ratecheck\': Cross-check the unbinned live time estimation with the histogram fit in count rate correction, printing both results')
     print('\'--simu\': Give simulation result for angular responce')
     print('\'--rate\': Style of calculating correct count rate from raw data, \'s\' for calculating with single time interval')
     print('\'--gridfile\': Give the filepath of GRID data, When processing nim data')
     print('\'--hpgefile\': Give the filepath of HPGe data, When processing nim data')
     print('\'--cut\': Time cut in seconds to cut off the data in initial fwe seconds, used to cut off data before the bias is stablized(6th ver.)')
+    print('\'--cache\': Directory of the decoded readout cache, the decoded data of each raw file will be saved there and loaded in later runs with the same readout options. \
+The spectrum fit results are cached there as well and loaded for the fits of the same spectra with the same fit options')
+    print('\'--cachesize\': Maximum size of the readout cache in MB, 2048 by default, the least recently used entries will be removed first')
+    print('\'--clearcache\': Remove the cache entries of the input files, or the whole cache if no input file is given')
+    print('\'--plotdir\': Directory of the figure files for batch plotting, all figures will be rendered to files there by separate processes instead of being shown')
+    print('\'--plotformat\': File formats of the figures for batch plotting, e.g. \'png\', \'pdf\' or \'png,pdf\', \'png\' by default')
+    print('\'--batch\': Run the jobs of a batch manifest(.json or .toml) instead of the files given, with \'output\' for the output directory, \'defaults\' for \
+the settings shared by all jobs and \'jobs\' for the list of jobs with their \'name\', \'option\' and other settings, named as in \'gridPipeline.jobDefaults\'')
+    print('\'--watch\': Watch the given directory for the text(.txt) files of SINGLE RUN written by the DAQ instead of processing the files given, each new file \
+being read out and fitted once complete, and the temperature/bias responce and angular responce updated with all files processed so far. Stop with Ctrl+C')
+    print('\'--follow\': Follow the given raw file still being written instead of processing the files given, the lines appended being decoded at each check \
+and the spectra and count rates of all channels updated and printed, with the spectra plotted with option \'p\'. Stop with Ctrl+C')
+    print('\'--interval\': Time between the checks of the watched directory or followed file in seconds, 2 by default')
+    print('\'--jobs\': Number of processes for reading out the raw files and fitting the scans of multiple scan files in parallel, 1 by default. A single raw file will be split into parts read out in parallel')
     print('Supported file type: text file(.txt)')
     return
 
@@ -68,804 +85,555 @@ def printUsage():
 #******************************************************************Main function********************************************************************
 #******************************************************************************************************************************************************
 
-isHex = False
-isScan = False
-fileOutput = False
-singlech = False
-odr = False
-fitPlot = True
-quadBkg = True
-newProgramme = False
-isCi = 0
-option = ''
-maxiter = 1
-iarg = 1
-
-#*****************************************************************************************************************************************************
-#****************************************************************Options readout******************************************************************
-#*****************************************************************************************************************************************************
-
-#h: hexprint, c: with (single) CI, s: with I-V scan, o:file output, f:fit, p: plot raw data, t: temperature calibration, B: bias calibration
-#i: import data from file, v: temp&bias curves & imon fit, r: temp/bias responce, O: odr fitting, a: angular responce
-#TBD: Think of and implement more options
-optionsAvailable = ['h', 'c', 's', 'o', 'f', 'p', 't', 'b', 'v', 'r', 'O', 'a', 'g', 'n', 'm']
-sourceAvailable = ['Am241', 'Ba133', 'Cs137', 'Na22', 'Th228', 'Co60', 'x']
-nbinsRef = {
-                'Am241':        2048,
-                'Ba133':        2048,
-                'Th228':        1024,
-                'Cs137':        512,
-                'Na22':         512,
-                'Co60':         512,
-    }
-
-if len(sys.argv) == 1:
-    printUsage()
-    sys.exit()
-
-if sys.argv[iarg][0] == '-' and not len(sys.argv[iarg]) == 1:
-    option = sys.argv[iarg][1:]
-    iarg += 1
-    for s in option:
-        if not s in optionsAvailable:
-            print('GridDataProcessor: unsupported option ' + s)
-            printUsage()
-            sys.exit()
-    if 's' in option:
-        isScan = True
-    if 'c' in option:
-        isCi = 1
-    if 'h' in option:
-        isHex = True
-        isCi = 0
-        isScan = False
-    if 'o' in option:
-        fileOutput = True
-    if 'O' in option:
-        odr = True
-    if 'r' in option or 'a' in option:
-        if not 'f' in option:
-            option += 'f'
-    if 'g' in option:
-        quadBkg = False
-    if 'n' in option:
-        newProgramme = True
-
-#Source, nbins, range, scans and files input part
-#v0.0.2 by ghz
-bkg = False
-simulation = False
-plotNIM = False
-binSpecified = False
-iterSpecified = False
-boundSpecified = False
-rateStyleSpecified = False
-timeCutSpecified = False
-corr = True
-source = ''
-fitRange = []
-scanRange = []
-channel = -1
-nbins = 65536
-bound = 3.0
-timeCut = 0.0
-filename = []
-mulfilename = []
-simuFilename = ''
-gridFilepath = ''
-hpgeFilepath = ''
-rateStyle = ''
-rateStyles = ['s', 'p']
-if 'i' in option:
-    importFilename = []
-    importPath = []
-    importMulFilename = []
+#guarded for the spawned worker processes of the parallel readout, fits and batch plotting, which import this script without running it
+if __name__ == '__main__':
+
+    singlech = False
+    fitPlot = True
+    rateCheck = False
+    autoRange = False
+    option = ''
+    maxiter = 1
+    iarg = 1
+
+    #*****************************************************************************************************************************************************
+    #****************************************************************Options readout******************************************************************
+    #*****************************************************************************************************************************************************
+
+    #Options and sources available given in 'gridPipeline.py'
+    #TBD: Think of and implement more options
+
+    if len(sys.argv) == 1:
+        printUsage()
+        sys.exit()
 
-while iarg < len(sys.argv):
-    #nbins
-    if sys.argv[iarg] == '--nbins':
+    if sys.argv[iarg][0] == '-' and not len(sys.argv[iarg]) == 1 and not sys.argv[iarg].startswith('--'):
+        option = sys.argv[iarg][1:]
         iarg += 1
-        if binSpecified:
-            print('GridDataProcessor: please do not specify nbins more than once. The first nbins given will be taken as the parameter for fit and plot')
+        for s in option:
+            if not s in pipeline.optionsAvailable:
+                print('GridDataProcessor: unsupported option ' + s)
+                printUsage()
+                sys.exit()
+        if 'r' in option or 'a' in option:
+            if not 'f' in option:
+                option += 'f'
+
+    #Source, nbins, range, scans and files input part
+    #v0.0.2 by ghz
+    simulation = False
+    plotNIM = False
+    binSpecified = False
+    iterSpecified = False
+    boundSpecified = False
+    rateStyleSpecified = False
+    timeCutSpecified = False
+    corr = True
+    source = ''
+    fitRange = []
+    scanRange = []
+    channel = -1
+    nbins = 65536
+    bound = 3.0
+    timeCut = 0.0
+    filename = []
+    mulfilename = []
+    bkgFilename = []
+    simuFilename = ''
+    gridFilepath = ''
+    hpgeFilepath = ''
+    rateStyle = ''
+    cacheDir = ''
+    cacheSize = 2048
+    cacheSizeSpecified = False
+    plotDir = ''
+    plotFormats = []
+    clearCache = False
+    batchFile = ''
+    watchDir = ''
+    followFilename = ''
+    interval = 2.0
+    intervalSpecified = False
+    jobs = 1
+    jobsSpecified = False
+    importPath = []
+
+    while iarg < len(sys.argv):
+        #nbins
+        if sys.argv[iarg] == '--nbins':
+            iarg += 1
+            if binSpecified:
+                print('GridDataProcessor: please do not specify nbins more than once. The first nbins given will be taken as the parameter for fit and plot')
+                iarg += 1
+                continue
+            try:
+                nbins = int(sys.argv[iarg])
+                if nbins <= 0 or nbins > 65536:
+                    raise Exception
+            except:
+                print('GridDataProcessor: nbins should be in integer form and within range [1-65536]')
+                sys.exit()
+            binSpecified = True
             iarg += 1
-            continue
-        try:
-            nbins = int(sys.argv[iarg])
-            if nbins <= 0 or nbins > 65536:
-                raise Exception
-        except:
-            print('GridDataProcessor: nbins should be in integer form and within range [1-65536]')
-            sys.exit()
-        binSpecified = True
-        iarg += 1
 
-    #Source
-    elif sys.argv[iarg] == '--src':
-        iarg += 1
-        if source in sourceAvailable:
-            print('GridDataProcessor: please do not specify the source more than once. The first source given will be taken as the source for fit')
-            iarg += 1
-            continue
-        source = sys.argv[iarg]
-        if not source in sourceAvailable:
-            print('GridDataProcessor: unknown source or source not given')
-            if 'f' in option:
-                print('GridDataProcessor: please specify the source in order to make the fit')
-            printUsage()
-            sys.exit()
-        elif source == 'x':
+        #Source
+        elif sys.argv[iarg] == '--src':
+            iarg += 1
+            if source in pipeline.sourceAvailable:
+                print('GridDataProcessor: please do not specify the source more than once. The first source given will be taken as the source for fit')
+                iarg += 1
+                continue
+            source = sys.argv[iarg]
+            if not source in pipeline.sourceAvailable:
+                print('GridDataProcessor: unknown source or source not given')
+                if 'f' in option:
+                    print('GridDataProcessor: please specify the source in order to make the fit')
+                printUsage()
+                sys.exit()
+            elif source == 'x':
+                singlech = True
+            iarg += 1
+
+        #Channel
+        elif sys.argv[iarg] == '--ch':
+            iarg += 1
+            if singlech and grid.isChannel(channel):
+                print('GridDataProcessor: please do not specify the channel more than once. The first channel given will be taken as the channel of interest')
+                iarg += 1
+                continue
+            try:
+                channel = int(sys.argv[iarg])
+                if channel < 0 or channel > 3:
+                    raise Exception
+            except:
+                print('GridDataProcessor: channel number not given in integer form or out of bound [0-3]')
+                if 'f' in option:
+                    print('GridDataProcessor: please give the channel number in order to fit the spectrum of the specific channel')
+                printUsage()
+                sys.exit()
             singlech = True
-        iarg += 1
+            iarg += 1
 
-    #Channel
-    elif sys.argv[iarg] == '--ch':
-        iarg += 1
-        if singlech and grid.isChannel(channel):
-            print('GridDataProcessor: please do not specify the channel more than once. The first channel given will be taken as the channel of interest')
+        #Fit range
+        elif sys.argv[iarg] == '--range':
+            iarg += 1
+            if not len(fitRange) == 0:
+                print('GridDataProcessor: please do not specify the fit range more than once. The first range given will be taken as the fit range')
+                iarg += 1
+                continue
+            try:
+                fitRange.append(int(sys.argv[iarg].split('[')[-1]))
+                iarg += 1
+                fitRange.append(int(sys.argv[iarg].split(']')[0]))
+                if fitRange[0] >= fitRange[1] or fitRange[0] < 0:
+                    raise Exception
+            except:
+                print('GridDataProcessor: fit range is not given in correct form \'[lower upper]\' or \'lower upper\' with lower and upper being both non-negative integers')
+                printUsage()
+                sys.exit()
             iarg += 1
-            continue
-        try:
-            channel = int(sys.argv[iarg])
-            if channel < 0 or channel > 3:
-                raise Exception
-        except:
-            print('GridDataProcessor: channel number not given in integer form or out of bound [0-3]')
-            if 'f' in option:
-                print('GridDataProcessor: please give the channel number in order to fit the spectrum of the specific channel')
-            printUsage()
-            sys.exit()
-        singlech = True
-        iarg += 1
 
-    #Fit range
-    elif sys.argv[iarg] == '--range':
-        iarg += 1
-        if not len(fitRange) == 0:
-            print('GridDataProcessor: please do not specify the fit range more than once. The first range given will be taken as the fit range')
+        #Maximum number of iteration
+        elif sys.argv[iarg] == '--iter':
+            iarg += 1
+            if iterSpecified:
+                print('GridDataProcessor: please do not specify maximum number of iteration more than once. The first maximum iteration number given will be taken as the parameter for spectrum fit')
+                iarg += 1
+                continue
+            try:
+                maxiter = int(sys.argv[iarg])
+                if maxiter < 0:
+                    raise Exception
+            except:
+                print('GridDataProcessor: maximum number of iteration should be a non-negative integer')
+                sys.exit()
+            iterSpecified = True
+            if maxiter == 0:
+                print('GridDataProcessor: no iteration will be conducted with \'maxiter = 0\' given')
             iarg += 1
-            continue
-        try:
-            fitRange.append(int(sys.argv[iarg].split('[')[-1]))
-            iarg += 1
-            fitRange.append(int(sys.argv[iarg].split(']')[0]))
-            if fitRange[0] >= fitRange[1] or fitRange[0] < 0:
-                raise Exception
-        except:
-            print('GridDataProcessor: fit range is not given in correct form \'[lower upper]\' or \'lower upper\' with lower and upper being both non-negative integers')
-            printUsage()
-            sys.exit()
-        iarg += 1
 
-    #Maximum number of iteration
-    elif sys.argv[iarg] == '--iter':
-        iarg += 1
-        if iterSpecified:
-            print('GridDataProcessor: please do not specify maximum number of iteration more than once. The first maximum iteration number given will be taken as the parameter for spectrum fit')
+        #Boundary of iteration
+        elif sys.argv[iarg] == '--sigma':
+            iarg += 1
+            if boundSpecified:
+                print('GridDataProcessor: please do not specify iteration boundary more than once. The first boundary given will be taken as the parameter for fit')
+                iarg += 1
+                continue
+            try:
+                bound = float(sys.argv[iarg])
+                if bound <= 0:
+                    raise Exception
+            except:
+                print('GridDataProcessor: boundary should be in positive float form')
+                sys.exit()
+            boundSpecified = True
             iarg += 1
-            continue
-        try:
-            maxiter = int(sys.argv[iarg])
-            if maxiter < 0:
-                raise Exception
-        except:
-            print('GridDataProcessor: maximum number of iteration should be a non-negative integer')
-            sys.exit()
-        iterSpecified = True
-        if maxiter == 0:
-            print('GridDataProcessor: no iteration will be conducted with \'maxiter = 0\' given')
-        iarg += 1
 
-    #Boundary of iteration
-    elif sys.argv[iarg] == '--sigma':
-        iarg += 1
-        if boundSpecified:
-            print('GridDataProcessor: please do not specify iteration boundary more than once. The first boundary given will be taken as the parameter for fit')
+        #Correct count rate calculation style
+        elif sys.argv[iarg] == '--rate':
+            iarg += 1
+            if rateStyleSpecified:
+                print('GridDataProcessor: please do not specify style of correct count rate calculation more than once. The first style given will be taken as the final calculation style')
+                iarg += 1
+                continue
+            if not sys.argv[iarg] in pipeline.rateStyles:
+                print('GridDataProcessor: rate calculation style \'' + sys.argv[iarg] + '\' not supported')
+                printUsage()
+                sys.exit()
+            rateStyle = sys.argv[iarg]
+            rateStyleSpecified = True
             iarg += 1
-            continue
-        try:
-            bound = float(sys.argv[iarg])
-            if bound <= 0:
-                raise Exception
-        except:
-            print('GridDataProcessor: boundary should be in positive float form')
-            sys.exit()
-        boundSpecified = True
-        iarg += 1
 
-    #Correct count rate calculation style
-    elif sys.argv[iarg] == '--rate':
-        iarg += 1
-        if rateStyleSpecified:
-            print('GridDataProcessor: please do not specify style of correct count rate calculation more than once. The first style given will be taken as the final calculation style')
+        #Time cut:
+        elif sys.argv[iarg] == '--cut':
+            iarg += 1
+            if timeCutSpecified:
+                print('GridDataProcessor: please do not specify cut time more than once. The first time given will be taken as the final cut time')
+                iarg += 1
+                continue
+            try:
+                timeCut = float(sys.argv[iarg])
+                if timeCut <= 0.0:
+                    raise Exception
+            except:
+                print('GridDataProcessor: cut time should be in positive float form')
+                printUsage()
+                sys.exit()
+            timeCutSpecified = True
             iarg += 1
-            continue
-        if not sys.argv[iarg] in rateStyles:
-            print('GridDataProcessor: rate calculation style \'' + sys.argv[iarg] + '\' not supported')
-            printUsage()
-            sys.exit()
-        rateStyle = sys.argv[iarg]
-        rateStyleSpecified = True
-        iarg += 1
 
-    #Time cut:
-    elif sys.argv[iarg] == '--cut':
-        iarg += 1
-        if timeCutSpecified:
-            print('GridDataProcessor: please do not specify cut time more than once. The first time given will be taken as the final cut time')
+        #Readout cache
+        elif sys.argv[iarg] == '--cache':
+            iarg += 1
+            if not cacheDir == '':
+                print('GridDataProcessor: please do not specify cache directory more than once. The first directory given will be taken as the cache directory')
+                iarg += 1
+                continue
+            if iarg >= len(sys.argv) or sys.argv[iarg].startswith('--'):
+                print('GridDataProcessor: cache directory not given')
+                printUsage()
+                sys.exit()
+            cacheDir = sys.argv[iarg]
             iarg += 1
-            continue
-        try:
-            timeCut = float(sys.argv[iarg])
-            if timeCut <= 0.0:
-                raise Exception
-        except:
-            print('GridDataProcessor: cut time should be in positive float form')
-            printUsage()
-            sys.exit()
-        timeCutSpecified = True
-        iarg += 1
 
-    #No temperature-bias correction
-    elif sys.argv[iarg] == '--nocorr':
-        iarg += 1
-        corr = False
-        
-    #No plotting during fitting
-    elif sys.argv[iarg] == '--noplot':
-        iarg += 1
-        fitPlot = False
+        #Readout cache size
+        elif sys.argv[iarg] == '--cachesize':
+            iarg += 1
+            if cacheSizeSpecified:
+                print('GridDataProcessor: please do not specify cache size more than once. The first size given will be taken as the cache size')
+                iarg += 1
+                continue
+            try:
+                cacheSize = float(sys.argv[iarg])
+                if cacheSize <= 0.0:
+                    raise Exception
+            except:
+                print('GridDataProcessor: cache size should be in positive float form')
+                printUsage()
+                sys.exit()
+            cacheSizeSpecified = True
+            iarg += 1
 
-    #Multiple scan files
-    elif sys.argv[iarg] == '--mul':
-        iarg += 1
-        if not os.path.exists(sys.argv[iarg]):
-            print('GridDataProcessor: multiple scan file \'' + sys.argv[iarg] + '\' not found, this multiple scan file (and the corresponding scan range) will be automatically omitted')
+        #Batch plot directory
+        elif sys.argv[iarg] == '--plotdir':
             iarg += 1
-            if sys.argv[iarg] == '--scan':
-                iarg += 3
-        mulfilename.append(sys.argv[iarg])
-        iarg += 1
-        if iarg >= len(sys.argv):
-            scanRange.append([])
-            break
-        if sys.argv[iarg] == '--scan':
+            if not plotDir == '':
+                print('GridDataProcessor: please do not specify plot directory more than once. The first directory given will be taken as the plot directory')
+                iarg += 1
+                continue
+            if iarg >= len(sys.argv) or sys.argv[iarg].startswith('--'):
+                print('GridDataProcessor: plot directory not given')
+                printUsage()
+                sys.exit()
+            plotDir = sys.argv[iarg]
+            iarg += 1
+
+        #Batch plot file formats
+        elif sys.argv[iarg] == '--plotformat':
+            iarg += 1
+            if not len(plotFormats) == 0:
+                print('GridDataProcessor: please do not specify plot formats more than once. The first formats given will be taken as the plot formats')
+                iarg += 1
+                continue
+            if iarg >= len(sys.argv) or sys.argv[iarg].startswith('--'):
+                print('GridDataProcessor: plot formats not given')
+                printUsage()
+                sys.exit()
+            plotFormats = [form.strip('.').lower() for form in sys.argv[iarg].split(',') if not form == '']
+            if not all([form in pipeline.plotFormatsAvailable for form in plotFormats]) or len(plotFormats) == 0:
+                print('GridDataProcessor: unsupported plot format ' + sys.argv[iarg] + ', supported formats: png, pdf, svg, eps, ps, jpg, tif')
+                printUsage()
+                sys.exit()
+            iarg += 1
+
+        #Number of readout processes
+        elif sys.argv[iarg] == '--jobs':
             iarg += 1
-            curscanRange = []
+            if jobsSpecified:
+                print('GridDataProcessor: please do not specify number of processes more than once. The first number given will be taken as the number of processes')
+                iarg += 1
+                continue
             try:
-                curscanRange.append(int(sys.argv[iarg].split('[')[-1]))
+                jobs = int(sys.argv[iarg])
+                if jobs <= 0:
+                    raise Exception
+            except:
+                print('GridDataProcessor: number of processes should be a positive integer')
+                printUsage()
+                sys.exit()
+            jobsSpecified = True
+            iarg += 1
+
+        #Batch manifest
+        elif sys.argv[iarg] == '--batch':
+            iarg += 1
+            if not batchFile == '':
+                print('GridDataProcessor: please do not specify batch manifest more than once. The first manifest given will be taken as the batch manifest')
                 iarg += 1
-                curscanRange.append(int(sys.argv[iarg].split(']')[0]))
-                if curscanRange[0] > curscanRange[1] or curscanRange[0] <= 0:
-                    raise Exception()
+                continue
+            if iarg >= len(sys.argv) or not os.path.isfile(sys.argv[iarg]):
+                print('GridDataProcessor: batch manifest not given or not found')
+                printUsage()
+                sys.exit()
+            batchFile = sys.argv[iarg]
+            iarg += 1
+
+        #Watched directory
+        elif sys.argv[iarg] == '--watch':
+            iarg += 1
+            if not watchDir == '':
+                print('GridDataProcessor: please do not specify watched directory more than once. The first directory given will be watched')
+                iarg += 1
+                continue
+            if iarg >= len(sys.argv) or not os.path.isdir(sys.argv[iarg]):
+                print('GridDataProcessor: watched directory not given or not found')
+                printUsage()
+                sys.exit()
+            watchDir = sys.argv[iarg]
+            iarg += 1
+
+        #Followed file
+        elif sys.argv[iarg] == '--follow':
+            iarg += 1
+            if not followFilename == '':
+                print('GridDataProcessor: please do not specify followed file more than once. The first file given will be followed')
+                iarg += 1
+                continue
+            if iarg >= len(sys.argv) or not os.path.isfile(sys.argv[iarg]):
+                print('GridDataProcessor: followed file not given or not found')
+                printUsage()
+                sys.exit()
+            followFilename = sys.argv[iarg]
+            iarg += 1
+
+        #Time between the checks of the watched directory or followed file
+        elif sys.argv[iarg] == '--interval':
+            iarg += 1
+            if intervalSpecified:
+                print('GridDataProcessor: please do not specify watch interval more than once. The first interval given will be taken as the watch interval')
+                iarg += 1
+                continue
+            try:
+                interval = float(sys.argv[iarg])
+                if interval <= 0.0:
+                    raise Exception
             except:
-                print('GridDataProcessor: scan range not given in correct form \'[lower upper]\' or \'lower upper\' with lower and upper being both integers')
+                print('GridDataProcessor: watch interval should be in positive float form')
                 printUsage()
                 sys.exit()
-            scanRange.append(curscanRange)
+            intervalSpecified = True
             iarg += 1
-        else:
-            scanRange.append([])
 
-    #Full directories
-    elif sys.argv[iarg] == '--dir':
-        iarg += 1
-        if not os.path.isdir(sys.argv[iarg]):
-            print('GridDataProcessor: directory \'' + sys.argv[iarg] + '\' does not exist, this directory will be automatically omitted')
+        #Readout cache invalidation
+        elif sys.argv[iarg] == '--clearcache':
             iarg += 1
-            continue
-        else:
-            files = os.listdir(sys.argv[iarg])
-            path = os.path.realpath(sys.argv[iarg])
-            if 'i' in option:
-                importPath.append(path)
+            clearCache = True
+
+        #No temperature-bias correction
+        elif sys.argv[iarg] == '--nocorr':
+            iarg += 1
+            corr = False
+        
+        #No plotting during fitting
+        elif sys.argv[iarg] == '--noplot':
+            iarg += 1
+            fitPlot = False
+
+        #Cross-check of the unbinned live time estimation
+        elif sys.argv[iarg] == '--ratecheck':
+            iarg += 1
+            rateCheck = True
+
+        #Automatic fit range with the peak locator
+        elif sys.argv[iarg] == '--autorange':
+            iarg += 1
+            autoRange = True
+
+        #Multiple scan files
+        elif sys.argv[iarg] == '--mul':
+            iarg += 1
+            if not os.path.exists(sys.argv[iarg]):
+                print('GridDataProcessor: multiple scan file \'' + sys.argv[iarg] + '\' not found, this multiple scan file (and the corresponding scan range) will be automatically omitted')
+                iarg += 1
+                if sys.argv[iarg] == '--scan':
+                    iarg += 3
+            mulfilename.append(sys.argv[iarg])
+            iarg += 1
+            if iarg >= len(sys.argv):
+                scanRange.append([])
+                break
+            if sys.argv[iarg] == '--scan':
+                iarg += 1
+                curscanRange = []
+                try:
+                    curscanRange.append(int(sys.argv[iarg].split('[')[-1]))
+                    iarg += 1
+                    curscanRange.append(int(sys.argv[iarg].split(']')[0]))
+                    if curscanRange[0] > curscanRange[1] or curscanRange[0] <= 0:
+                        raise Exception()
+                except:
+                    print('GridDataProcessor: scan range not given in correct form \'[lower upper]\' or \'lower upper\' with lower and upper being both integers')
+                    printUsage()
+                    sys.exit()
+                scanRange.append(curscanRange)
+                iarg += 1
             else:
-                for file in files:
-                    if file.endswith('.txt'):
-                        filename.append(path + '\\' + file)
+                scanRange.append([])
+
+        #Full directories
+        elif sys.argv[iarg] == '--dir':
             iarg += 1
+            if not os.path.isdir(sys.argv[iarg]):
+                print('GridDataProcessor: directory \'' + sys.argv[iarg] + '\' does not exist, this directory will be automatically omitted')
+                iarg += 1
+                continue
+            else:
+                files = os.listdir(sys.argv[iarg])
+                path = os.path.realpath(sys.argv[iarg])
+                if 'i' in option:
+                    importPath.append(path)
+                else:
+                    for file in files:
+                        if file.endswith('.txt'):
+                            filename.append(path + '\\' + file)
+                iarg += 1
 
-    #Background files
-    elif sys.argv[iarg] == '--bkg':
-        iarg += 1
-        if not bkg:
-            bkgFilename = []
-        if not os.path.exists(sys.argv[iarg]):
-            print('GridDataProcessor: background file \'' + sys.argv[iarg] + '\' not found, this background file will be automatically omitted')
-            iarg += 1
-            continue
-        bkg = True
-        bkgFilename.append(sys.argv[iarg])
-        iarg += 1
+        #Background files
+        elif sys.argv[iarg] == '--bkg':
+            iarg += 1
+            if not os.path.exists(sys.argv[iarg]):
+                print('GridDataProcessor: background file \'' + sys.argv[iarg] + '\' not found, this background file will be automatically omitted')
+                iarg += 1
+                continue
+            bkgFilename.append(sys.argv[iarg])
+            iarg += 1
 
-    #Simulation files
-    elif sys.argv[iarg] == '--simu':
-        iarg += 1
-        if simulation:
-            print('GridDataProcessor: please do not specify simulation file more than once. The first file given will be taken as the data for processing')
+        #Simulation files
+        elif sys.argv[iarg] == '--simu':
             iarg += 1
-            continue
-        if not os.path.exists(sys.argv[iarg]):
-            print('GridDataProcessor: simulation file \'' + sys.argv[iarg] + '\' not found, this simulation file will be automatically omitted')
+            if simulation:
+                print('GridDataProcessor: please do not specify simulation file more than once. The first file given will be taken as the data for processing')
+                iarg += 1
+                continue
+            if not os.path.exists(sys.argv[iarg]):
+                print('GridDataProcessor: simulation file \'' + sys.argv[iarg] + '\' not found, this simulation file will be automatically omitted')
+                iarg += 1
+                continue
+            simulation = True
+            simuFilename = sys.argv[iarg]
             iarg += 1
-            continue
-        simulation = True
-        simuFilename = sys.argv[iarg]
-        iarg += 1
 
-    #GRID filepath for NIM data
-    elif sys.argv[iarg] == '--gridfile':
-        iarg += 1
-        if simulation:
-            print('GridDataProcessor: please do not specify GRID filepath more than once. The first file given will be taken as the data for processing')
+        #GRID filepath for NIM data
+        elif sys.argv[iarg] == '--gridfile':
             iarg += 1
-            continue
-        if not os.path.exists(sys.argv[iarg]):
-            print('GridDataProcessor: GRID filepath \'' + sys.argv[iarg] + '\' not found, this GRID filepath will be automatically omitted')
+            if simulation:
+                print('GridDataProcessor: please do not specify GRID filepath more than once. The first file given will be taken as the data for processing')
+                iarg += 1
+                continue
+            if not os.path.exists(sys.argv[iarg]):
+                print('GridDataProcessor: GRID filepath \'' + sys.argv[iarg] + '\' not found, this GRID filepath will be automatically omitted')
+                iarg += 1
+                continue
+            plotNIM = True
+            gridFilepath = sys.argv[iarg]
             iarg += 1
-            continue
-        plotNIM = True
-        gridFilepath = sys.argv[iarg]
-        iarg += 1
 
-    #GRID filepath for NIM data
-    elif sys.argv[iarg] == '--hpgefile':
-        iarg += 1
-        if simulation:
-            print('GridDataProcessor: please do not specify HPGe filepath more than once. The first file given will be taken as the data for processing')
+        #GRID filepath for NIM data
+        elif sys.argv[iarg] == '--hpgefile':
             iarg += 1
-            continue
-        if not os.path.exists(sys.argv[iarg]):
-            print('GridDataProcessor: HPGe filepath \'' + sys.argv[iarg] + '\' not found, this HPGe filepath will be automatically omitted')
+            if simulation:
+                print('GridDataProcessor: please do not specify HPGe filepath more than once. The first file given will be taken as the data for processing')
+                iarg += 1
+                continue
+            if not os.path.exists(sys.argv[iarg]):
+                print('GridDataProcessor: HPGe filepath \'' + sys.argv[iarg] + '\' not found, this HPGe filepath will be automatically omitted')
+                iarg += 1
+                continue
+            plotNIM = True
+            hpgeFilepath = sys.argv[iarg]
             iarg += 1
-            continue
-        plotNIM = True
-        hpgeFilepath = sys.argv[iarg]
-        iarg += 1
 
-    #Single files
-    elif os.path.exists(sys.argv[iarg]):
-        filename.append(sys.argv[iarg])
-        iarg += 1
+        #Single files
+        elif os.path.exists(sys.argv[iarg]):
+            filename.append(sys.argv[iarg])
+            iarg += 1
 
-    #Wrong option
-    elif sys.argv[iarg].startswith('--'):
-        print('GridDataProcessor: \'' + sys.argv[iarg] + '\' is not in the options list, this option and the following value(s) will be automatically omitted')
-        if iarg < len(sys.argv) - 2:
-            iarg += 2
+        #Wrong option
+        elif sys.argv[iarg].startswith('--'):
+            print('GridDataProcessor: \'' + sys.argv[iarg] + '\' is not in the options list, this option and the following value(s) will be automatically omitted')
+            if iarg < len(sys.argv) - 2:
+                iarg += 2
+            else:
+                iarg = len(sys.argv)
+            if iarg < len(sys.argv) and sys.argv[iarg].endswith(']'):
+                iarg += 1
+
+        #Wrong input
         else:
-            iarg = len(sys.argv)
-        if iarg < len(sys.argv) and sys.argv[iarg].endswith(']'):
+            print('GridDataProcessor: unable to parse input \'' + sys.argv[iarg] + '\' or file not found, this input value will be automatically omitted')
+            print('GridDataProcessor: if this input value is an option, please add \'--\' before this value to indicate an possible option')
             iarg += 1
 
-    #Wrong input
-    else:
-        print('GridDataProcessor: unable to parse input \'' + sys.argv[iarg] + '\' or file not found, this input value will be automatically omitted')
-        print('GridDataProcessor: if this input value is an option, please add \'--\' before this value to indicate an possible option')
-        iarg += 1
+    #Batch of jobs from the manifest, with the number of processes given by '--jobs'
+    if not batchFile == '':
+        try:
+            batch = pipeline.readManifest(batchFile)
+        except Exception as e:
+            print(e)
+            sys.exit()
+        pipeline.runBatch(pipeline.makePipeline(0), batch, jobs)
+        print('GridDataProcessor: all jobs processed')
+        sys.exit()
 
-#nbins not specified if plot and fit is to be conducted
-if not binSpecified:
-    if source in nbinsRef:
-        binSpecified = True
-        nbins = nbinsRef[source]
-    elif 'f' in option or 'p' in option:
-        print('GridDataProcessor: to make the fit for data or plot the spectrum, nbins must be specified')
-        print('GridDataProcessor: nbins should be in integer form and within range [1-65536]')
+    #Job built from the options, with the settings checked there
+    try:
+        job = pipeline.makeJob(option, filename = filename, mulfilename = mulfilename, scanRange = scanRange, bkgFilename = bkgFilename, importPath = importPath, \
+            source = source, nbins = nbins if binSpecified else 0, channel = channel, fitRange = fitRange, maxiter = maxiter, bound = bound, rateStyle = rateStyle, \
+            timeCut = timeCut, corr = corr, fitPlot = fitPlot, rateCheck = rateCheck, autoRange = autoRange, simuFilename = simuFilename, gridFilepath = gridFilepath, \
+            hpgeFilepath = hpgeFilepath, cacheDir = cacheDir, cacheSize = cacheSize, plotDir = plotDir, plotFormats = plotFormats, clearCache = clearCache, jobs = jobs)
+    except Exception as e:
+        print(e)
         printUsage()
         sys.exit()
 
-#Unknown source
-if not source in sourceAvailable:
-    if 'f' in option and not 'b' in option:
-        print('GridDataProcessor: to make the fit for data, the source must be specified')
-        printUsage()
+    #Watch of the directory, with the new files processed until interrupted
+    if not watchDir == '':
+        try:
+            pipeline.watchFolder(pipeline.makePipeline(0), job, watchDir, interval)
+        except Exception as e:
+            print(e)
         sys.exit()
 
-#Channel or fit range not specified for x-ray data fit
-elif source == 'x':
-    if 'f' in option:
-        if not (grid.isChannel(channel) and not len(fitRange) == 0):
-            print('GridDataProcessor: to make the fit for x-ray data, the channel and fit range must be specified')
-            print('GridDataProcessor: the channel should be within range [0-3], and fit range in the form of \'[lower upper]\' \
-                or \'lower upper\' with lower and upper being both non-negative integers')
-            printUsage()
-            sys.exit()
+    #Live readout of the file, with the appended lines decoded until interrupted
+    if not followFilename == '':
+        try:
+            pipeline.followFile(job, followFilename, interval)
+        except Exception as e:
+            print(e)
+        sys.exit()
 
-#Import path not specified for processed data import
-if 'i' in option and len(importPath) == 0:
-    print('GridDataProcessor: import path specified, setting the import path as default (current path)')
-    importPath.append(os.getcwd())
-
-#****************************************************************************************************************************************************
-#**********************************************************Data readout and fit part************************************************************
-#****************************************************************************************************************************************************
-#v0.0.2 by ghz
-
-#Background readout
-bamp = []
-for ich in range(4):
-    bamp.append([])
-bkgTime = np.ones(4)
-brateAll = 0.0
-brateAllErr = 0.0
-curbamp = []
-curbtimeCorrect = []
-brateData = []
-brateDataErr = []
-if bkg:
-    bkgTime = np.zeros(4)
-    for bkfile in bkgFilename:
-        for file in filename:
-            if file.endswith(bkfile):
-                del filename[filename.index(file)]
-        bkgdata = grid.dataReadout(bkfile, isHex, isCi = 1, rateStyle = rateStyle)
-        curbamp, curbuscountEvt, curbtimeCorrect = bkgdata[0], bkgdata[7], bkgdata[8]
-        for ich in range(4):
-            bamp[ich] += list(curbamp[ich])
-            bkgTime[ich] += curbuscountEvt[ich][-1] - curbuscountEvt[ich][0]
-        if not rateStyle == '':
-            curbrateData = grid.fitRateCorrect(bkfile, curbtimeCorrect, fitPlot, odr, rateStyle = rateStyle)
-            brateData.append(curbrateData[0])
-            brateDataErr.append(curbrateData[1])
-    bamp = np.array(bamp)
-    if not rateStyle == '':
-        brateAll = np.average(np.array(brateData))
-        brateAllErr = np.sqrt(np.std(np.array(brateData)) ** 2 + np.sum(np.array(brateDataErr) ** 2) / len(brateData) ** 2)
-
-#Data readout and fit
-amp = []
-tempSipm = []
-tempAdc = []
-vMon = []
-iMon = []
-bias = []
-uscount = []
-uscountEvt = []
-timeCorrect = []
-effectiveCount = []
-missingCount = []
-if not isCi == 0:
-    ampCI = []
-    uscountEvtCI = []
-    effectiveCountCI = []
-    missingCountCI = []
-if isScan:
-    vSet = []
-    vScan = []
-    iScan = []
-for ich in range(4):
-    amp.append([])
-    tempSipm.append([])
-    tempAdc.append([])
-    vMon.append([])
-    iMon.append([])
-    bias.append([])
-    uscountEvt.append([])
-    if isCi == 1:
-        ampCI.append([])
-        uscountEvtCI.append([])
-    if isScan:
-        vScan.append([])
-        iScan.append([])
-
-if 'f' in option:
-    fitResults = []
-    if not singlech:
-        for ich in range(4):
-            fitResults.append([])
-
-curamp = []
-curtempSipm = []
-curtempAdc = []
-curvMon = []
-curiMon = []
-curbias = []
-curuscount = []
-curuscountEvt = []
-curtimeCorrect = []
-cureffectiveCount = []
-curmissingCount = []
-if not isCi == 0:
-    curampCI = []
-    curuscountEvtCI = []
-    cureffectiveCountCI = []
-    curmissingCountCI = []
-if isScan:
-    curvSet = []
-    curvScan = []
-    curiScan = []
-
-for file in mulfilename + filename:
-    #Data readout
-    curCi = isCi
-    curscanRange = []
-    scanNum = []
-    if file in mulfilename:
-        curCi = 2
-        curscanRange = scanRange[mulfilename.index(file)]
-    #Readout from processed files
-    if 'i' in option:
-        #UNUSED
-        if isScan:
-            if curCi == 0:
-                curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curvSet, \
-                    curvScan, curiScan = grid.importData(file, importPath, curCi, isScan, curscanRange)
-            else:
-                curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, \
-                    curuscountEvtCI, cureffectiveCountCI, curmissingCountCI, curvSet, curvScan, curiScan, scanNum = grid.importData(file, importPath, curCi, isScan, curscanRange)
-        else:
-            if curCi == 0:
-                curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount = grid.importData(\
-                    file, importPath, curCi, isScan, curscanRange)
-            else:
-                curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, \
-                    curuscountEvtCI, cureffectiveCountCI, curmissingCountCI, scanNum = grid.importData(file, importPath, curCi, isScan, curscanRange)
-    #Readout from raw data
-    else:
-        if isScan:
-            if curCi == 0:
-                curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curvSet, curvScan, \
-                    curiScan = grid.dataReadout(file, isHex, curCi, isScan, curscanRange, rateStyle, newProgramme, timeCut = timeCut)
-                if fileOutput:
-                    grid.fileOutput(file.split('\\')[-1], curCi, isScan, curscanRange, *[curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, \
-                        curtimeCorrect, cureffectiveCount, curmissingCount, curvSet, curvScan, curiScan])
-            else:
-                curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, \
-                    cureffectiveCountCI, curmissingCountCI, curvSet, curvScan, curiScan = grid.dataReadout(file, isHex, curCi, isScan, curscanRange, rateStyle, newProgramme, timeCut = timeCut)
-                if fileOutput:
-                    grid.fileOutput(file.split('\\')[-1], curCi, isScan, curscanRange, *[curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, \
-                        cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, cureffectiveCountCI, curmissingCountCI, curvSet, curvScan, curiScan])
-        else:
-            if curCi == 0:
-                curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount = grid.dataReadout(\
-                    file, isHex, curCi, isScan, curscanRange, rateStyle, newProgramme, timeCut = timeCut)
-                if fileOutput:
-                    grid.fileOutput(file.split('\\')[-1], curCi, isScan, curscanRange, *[curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, \
-                        cureffectiveCount, curmissingCount])
-            else:
-                curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, \
-                    cureffectiveCountCI, curmissingCountCI = grid.dataReadout(file, isHex, curCi, isScan, curscanRange, rateStyle, newProgramme, timeCut = timeCut)
-                if fileOutput:
-                    grid.fileOutput(file.split('\\')[-1], curCi, isScan, curscanRange, *[curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, \
-                        cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, cureffectiveCountCI, curmissingCountCI])
-
-    #Plot raw spectrum
-    rateAll = 1.0
-    if 'p' in option:
-        #Multiple scans
-        if curCi == 2:
-            for isc in range(len(curuscount)):
-                if not len(curscanRange) == 0 and not (isc >= curscanRange[0] - 1 and isc <= curscanRange[1] - 1):
-                    continue
-                if rateStyleSpecified:
-                    rateAll, rateAllErr = grid.fitRateCorrect('', curtimeCorrect[isc], False, odr, rateStyle = rateStyle)
-                timeSpec = []
-                for ich in range(4):
-                    timeSpec.append(curuscountEvt[ich][isc][-1] - curuscountEvt[ich][isc][0])
-                grid.plotRawData('Run #' + str(isc + 1) + ' of ' + file.split('\\')[-1], curamp[:, isc], nbins * grid.getBiasnbinsFactor(isc + 1), grid.tempBiasCorrection(\
-                    curtempSipm[:, isc], curbias[:, isc], False, not 't' in option)[0], timeSpec, singlech, channel = channel, rateStyle = rateStyle, rateAll = rateAll, \
-                    doCorr = corr)
-        #Single scan
-        else:
-            if rateStyleSpecified:
-                rateAll, rateAllErr = grid.fitRateCorrect('', curtimeCorrect, False, odr, rateStyle = rateStyle)
-            timeSpec = []
-            for ich in range(4):
-                timeSpec.append(curuscountEvt[ich][-1] - curuscountEvt[ich][0])
-            grid.plotRawData(file.split('\\')[-1], curamp, nbins, grid.tempBiasCorrection(curtempSipm, curbias, False, not 't' in option)[0], timeSpec, singlech, \
-                channel = channel, rateStyle = rateStyle, rateAll = rateAll, doCorr = corr)
-
-    #Fit session
-    if 'f' in option:
-        #Multiple scans
-        if curCi == 2:
-            if source == 'x':
-                for isc in range(len(curuscount)):
-                    if not len(curscanRange) == 0 and not (isc >= curscanRange[0] - 1 and isc <= curscanRange[1] - 1):
-                        continue
-                    rateAll = 0.0
-                    rateAllErr = 0.0
-                    if rateStyleSpecified:
-                        rateAll, rateAllErr = grid.fitRateCorrect(str(isc + 1) + '_' + file.split('\\')[-1], curtimeCorrect[isc], fitPlot, odr, rateStyle = rateStyle)
-                    timeSpec = []
-                    for ich in range(4):
-                        timeSpec.append(curuscountEvt[ich][isc][-1] - curuscountEvt[ich][isc][0])
-                    currfitResults = grid.fitSpectrum(str(isc + 1) + '_' + file.split('\\')[-1], curamp[:, isc], nbins * grid.getBiasnbinsFactor(isc + 1), source, \
-                        grid.tempBiasCorrection(curtempSipm[:, isc], curbias[:, isc], False, False)[0], timeSpec, fileOutput, singlech, bkg, \
-                        xRange = fitRange, channel = channel, bkgAmp = bamp, bkgtime = bkgTime, corrErr = grid.tempBiasCorrection(curtempSipm[:, isc], \
-                        curbias[:, isc], False, False)[1], odr = odr, maxiter = maxiter, bound = bound, plot = fitPlot, rateStyle = rateStyle, rateAll = rateAll, \
-                        rateAllErr = rateAllErr, bkgRate = brateAll, bkgRateErr = brateAllErr, quadBkg = quadBkg, doCorr = corr)
-                    for ich in range(4):
-                        fitResults[ich].append(currfitResult[ich])
-            else:
-                for isc in range(len(curuscount)):
-                    if not len(curscanRange) == 0 and not (isc >= curscanRange[0] - 1 and isc <= curscanRange[1] - 1):
-                        continue
-                    rateAll = 0.0
-                    rateAllErr = 0.0
-                    if rateStyleSpecified:
-                        rateAll, rateAllErr = grid.fitRateCorrect(str(isc + 1) + '_' + file.split('\\')[-1], curtimeCorrect[isc], fitPlot, odr, rateStyle = rateStyle)
-                    timeSpec = []
-                    for ich in range(4):
-                        timeSpec.append(curuscountEvt[ich][isc][-1] - curuscountEvt[ich][isc][0])
-                    if 'b' in option:
-                        curfitResults = grid.fitSpectrum(str(isc + 1) + '_' + file.split('\\')[-1], curamp[:, isc], nbins * grid.getBiasnbinsFactor(isc + 1), \
-                            'x', grid.tempBiasCorrection(curtempSipm[:, isc], curbias[:, isc], False, False)[0], timeSpec, fileOutput, singlech, bkg, \
-                            xRange = grid.getBiasFitRange(isc, False), channel = channel, bkgAmp = bamp, bkgtime = bkgTime, corrErr = grid.tempBiasCorrection(\
-                            curtempSipm[:, isc], curbias[:, isc], False, False)[1], odr = odr, maxiter = maxiter, bound = bound, plot = fitPlot, rateStyle = rateStyle, \
-                            rateAll = rateAll, rateAllErr = rateAllErr, bkgRate = brateAll, bkgRateErr = brateAllErr, quadBkg = quadBkg, doCorr = corr)
-                    else:
-                        curfitResults = grid.fitSpectrum(str(isc + 1) + '_' + file.split('\\')[-1], curamp[:, isc], nbins * grid.getBiasnbinsFactor(isc + 1), \
-                            source, grid.tempBiasCorrection(curtempSipm[:, isc], curbias[:, isc], False, False)[0], timeSpec, fileOutput, singlech, bkg, \
-                            channel = channel, bkgAmp = bamp, bkgtime = bkgTime, corrErr = grid.tempBiasCorrection(curtempSipm[:, isc], curbias[:, isc], False, \
-                            False)[1], odr = odr, maxiter = maxiter, bound = bound, plot = fitPlot, rateStyle = rateStyle, rateAll = rateAll, rateAllErr = \
-                            rateAllErr, bkgRate = brateAll, bkgRateErr = brateAllErr, quadBkg = quadBkg, doCorr = corr)
-                    if singlech:
-                        fitResults.append(curfitResults)
-                    else:
-                        for ich in range(4):
-                            fitResults[ich].append(curfitResults[ich])
-
-        #Single scan
-        else:
-            if source == 'x':
-                rateAll = 0.0
-                rateAllErr = 0.0
-                if rateStyleSpecified:
-                    rateAll, rateAllErr = grid.fitRateCorrect(file.split('\\')[-1], curtimeCorrect, fitPlot, odr, rateStyle = rateStyle)
-                timeSpec = []
-                for ich in range(4):
-                    timeSpec.append(curuscountEvt[ich][-1] - curuscountEvt[ich][0])
-                fitResults.append(grid.fitSpectrum(file.split('\\')[-1], curamp, nbins, source, grid.tempBiasCorrection(curtempSipm, curbias, False, False)[0], \
-                    timeSpec, fileOutput, singlech, bkg, xRange = fitRange, channel = channel, bkgAmp = bamp, bkgtime = bkgTime, corrErr = grid.tempBiasCorrection(\
-                    curtempSipm, curbias, False, False)[1], odr = odr, maxiter = maxiter, bound = bound, plot = fitPlot, rateStyle = rateStyle, rateAll = rateAll, \
-                    rateAllErr = rateAllErr, bkgRate = brateAll, bkgRateErr = brateAllErr, quadBkg = quadBkg, doCorr = corr))
-            else:
-                if not singlech:
-                    for ich in range(4):
-                        fitResults.append([])
-                rateAll = 0.0
-                rateAllErr = 0.0
-                if rateStyleSpecified:
-                    rateAll, rateAllErr = grid.fitRateCorrect(file.split('\\')[-1], curtimeCorrect, fitPlot, odr, rateStyle = rateStyle)
-                timeSpec = []
-                for ich in range(4):
-                    timeSpec.append(curuscountEvt[ich][-1] - curuscountEvt[ich][0])
-                curfitResults = grid.fitSpectrum(file.split('\\')[-1], curamp, nbins, source, grid.tempBiasCorrection(curtempSipm, curbias, False, False)[0], \
-                    timeSpec, fileOutput, singlech, bkg, channel = channel, bkgAmp = bamp, bkgtime = bkgTime, corrErr = grid.tempBiasCorrection(curtempSipm, \
-                    curbias, False, False)[1], odr = odr, maxiter = maxiter, bound = bound, plot = fitPlot, rateStyle = rateStyle, rateAll = rateAll, \
-                    rateAllErr = rateAllErr, bkgRate = brateAll, bkgRateErr = brateAllErr, quadBkg = quadBkg, doCorr = corr)
-                if singlech:
-                    fitResults.append(curfitResults)
-                else:
-                    for ich in range(4):
-                        fitResults[ich].append(curfitResults[ich])
-
-    #Remove empty runs for multiple scan files
-    if curCi == 2:
-        if not len(scanRange) == 0:
-            curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, \
-                curampCI, curuscountEvtCI, cureffectiveCountCI, curmissingCountCI = grid.deleteEmptyRun(curamp, curtempSipm, curtempAdc, curvMon, curiMon, \
-                curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, cureffectiveCountCI, curmissingCountCI, \
-                curscanRange, rateStyle, newProgramme)
-
-    #Add processed data to data list
-    for ich in range(4):
-        if curCi == 2:
-            for isc in range(len(curuscount)):
-                amp[ich].append(curamp[ich][isc])
-                tempSipm[ich].append(curtempSipm[ich][isc])
-                tempAdc[ich].append(curtempAdc[ich][isc])
-                vMon[ich].append(curvMon[ich][isc])
-                iMon[ich].append(curiMon[ich][isc])
-                bias[ich].append(curbias[ich][isc])
-                uscountEvt[ich].append(curuscountEvt[ich][isc])
-        else:
-            amp[ich].append(curamp[ich])
-            tempSipm[ich].append(curtempSipm[ich])
-            tempAdc[ich].append(curtempAdc[ich])
-            vMon[ich].append(curvMon[ich])
-            iMon[ich].append(curiMon[ich])
-            bias[ich].append(curbias[ich])
-            uscountEvt[ich].append(curuscountEvt[ich])
-            if not isCi == 0:
-                ampCI[ich].append(curampCI[ich])
-                uscountEvtCI[ich].append(curuscountEvtCI[ich])
-        if isScan:
-            vScan[ich].append(curvScan[ich])
-            iScan[ich].append(curiScan[ich])
-    if curCi == 2:
-        for isc in range(len(curuscount)):
-            uscount.append(curuscount[isc])
-            if not rateStyle == '':
-                timeCorrect.append(curtimeCorrect[isc])
-            if newProgramme:
-                effectiveCount.append(cureffectiveCount[isc])
-                effectiveCountCI.append(cureffectiveCountCI[isc])
-                missingCount.append(curmissingCount[isc])
-                missingCountCI.append(curmissingCountCI[isc])
-    else:
-        uscount.append(curuscount)
-        if not rateStyle == '':
-            timeCorrect.append(curtimeCorrect)
-        if newProgramme:
-            effectiveCount.append(cureffectiveCount)
-            missingCount.append(curmissingCount)
-            if not isCi == 0:
-                effectiveCountCI.append(cureffectiveCountCI)
-                missingCountCI.append(curmissingCountCI)
-    if isScan:
-        vSet.append(curvSet)
-
-amp = np.array(amp)
-tempSipm = np.array(tempSipm)
-tempAdc = np.array(tempAdc)
-vMon = np.array(vMon)
-iMon = np.array(iMon)
-bias = np.array(bias)
-uscount = np.array(uscount)
-uscountEvt = np.array(uscountEvt)
-if not rateStyle == '':
-    timeCorrect = np.array(timeCorrect)
-if newProgramme:
-    effectiveCount = np.array(effectiveCount)
-    missingCount = np.array(missingCount)
-if not isCi == 0:
-    ampCI = np.array(ampCI)
-    uscountEvtCI = np.array(uscountEvtCI)
-    if newProgramme:
-        effectiveCountCI = np.array(effectiveCountCI)
-        missingCountCI = np.array(missingCountCI)
-if isScan:
-    vSet = np.array(vSet)
-    vScan = np.array(vScan)
-    iScan = np.array(iScan)
-
-if 'f' in option:
-    fitResults = np.array(fitResults)
-
-#*****************************************************************************************************************************************************
-#**********************************************************Temperature and bias part************************************************************
-#*****************************************************************************************************************************************************
-
-#Temperature and bias curves, leak current and overvoltage fit
-if ('b' in option or 't' in option) and 'v' in option:
-    experiment.tempBiasVariation(tempSipm, bias, vMon, iMon, uscount, 't' in option, singlech, False, filenames = filename)
-    #if 't' in option:
-    #    currentInput = tempSipm
-    #else:
-    #    currentInput = bias
-    #experiment.currentFit(currentInput, iMon, 't' in option, fileOutput, form = 'mixexp', odr = odr)
-    #experiment.overvoltageFit(tempSipm, bias, 't' in option, fileOutput, odr = odr)
-
-#Temperature\bias responce fit
-if 'r' in option:
-    if 't' in option and 'b' in option:
-        experiment.tempBiasFit(fitResults, tempSipm, bias, True, fileOutput, singlech, channel = channel, odr = odr, corr = True, cont = False)
-    elif 't' in option:
-        tempFit = experiment.tempBiasFit(fitResults, tempSipm, bias, True, fileOutput, singlech, channel = channel, odr = odr)
-    elif 'b' in option:
-        biasFit = experiment.tempBiasFit(fitResults, tempSipm, bias, False, fileOutput, singlech, channel = channel, odr = odr)
-
-#****************************************************************************************************************************************************
-#************************************************************Angular responce part**************************************************************
-#****************************************************************************************************************************************************
-
-angle = np.arange(0, 375, 15)
-#Plot angular responce
-if 'a' in option:
-    experiment.plotAngularResponce(fitResults, angle, source, fileOutput, singlech, channel = channel, rateCorr = True, simuFile = \
-        simuFilename)
-
-#****************************************************************************************************************************************************
-#************************************************************ NIM data part **************************************************************
-#****************************************************************************************************************************************************
-
-#Plot nim data, including EC, Resolution and efficiency
-if 'm' in option:
-    gridResult = experiment.plotEnergyChannel(gridFilepath, ch = channel, doCorr = corr, isPlotSpec = False, isPlotEC = plotNIM, rateCorr = True, fitEC = False)
-    hpgeResult = experiment.processHPGe(hpgeFilepath, isPlotSpec = False)
-    efficiencyResult = experiment.getEfficiency(gridResult, hpgeResult, isPlot = plotNIM)
-
-#Ending line
-print('GridDataProcessor: all files processed')
+    #Readout, fit and experiment stages, with no readout kept in memory after the run
+    pipeline.runJob(pipeline.makePipeline(0), job)
+
+    #Ending line
+    print('GridDataProcessor: all files processed')
@@ -4,14 +4,21 @@ v0.0.2 for Grid2 calibration result analysis by ydx and ghz
 """
 
 import numpy as np
-import lmfit
-from scipy.odr import ODR, Model, Data, RealData
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-import struct
-import crc16
+import sys
+import types
+import importlib
 import os
+import json
+import shutil
+import hashlib
+import pickle
+import io
+import contextlib
+import multiprocessing
+import signal
+from concurrent.futures import ProcessPoolExecutor
 from copy import copy
+from collections import deque
 
 #******************************************************************************************************************************************************
 #*****************************************************Basic readout and fit functions*************************************************************
@@ -21,6 +28,40 @@ from copy import copy
 #***************************************************************Auxiliariry functions**************************************************************
 #*****************************************************************************************************************************************************
 
+def lazyImport(name):
+
+    """
+    Function for importing a module lazily, the module being loaded on the first access of its attributes
+    :param name: full name of the module, e.g. 'matplotlib.pyplot'
+    :return: the module if already loaded, or a placeholder module forwarding all attribute access to the module
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+    module = types.ModuleType(name)
+    module.__getattr__ = lambda attr: getattr(importlib.import_module(name), attr)
+    return module
+
+#Heavy packages loaded only when the fit or plot stages run, to keep the start-up of readout-only runs fast
+lmfit = lazyImport('lmfit')
+scipyOdr = lazyImport('scipy.odr')
+plt = lazyImport('matplotlib.pyplot')
+gridspec = lazyImport('matplotlib.gridspec')
+
+def processPool(workers, initializer = None, initargs = ()):
+
+    """
+    Function for creating the process pool of the parallel readout, fits and batch plotting, with forked worker processes where available and spawned \
+ones otherwise(e.g. on Windows), in which case the main script must be guarded by if __name__ == '__main__' so that the workers do not run it again
+    :param workers: number of worker processes
+    :param initializer: function run by each worker process at its start, None for no initializer
+    :param initargs: tuple of the arguments of the initializer
+    :return: the ProcessPoolExecutor
+    """
+
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method), initializer=initializer, initargs=initargs)
+
 def isChannel(input):
 
     """
@@ -37,28 +78,49 @@ def isChannel(input):
         return False
     return True
 
-def getSpectrum(amp, nbins = 65536, singlech = False):
+def fullSpectrum(amp, singlech = False):
+
+    """
+    Function for getting the spectrum of the amplitude data in full resolution, i.e. 65536 bins of one ADC channel each, which can be rebinned \
+to any number of bins by getSpectrum() without going through the amplitude data again
+    :param amp: amplitude of all 4 channels, in integer ADC channels
+    :param singlech: boolean indicating whether the amplitude is of single channel
+    :return: the full resolution spectrum, ndarray in the form of [channel][bin], or [bin] for single channel
+    """
+
+    if not singlech:
+        return np.array([fullSpectrum(amp[ich], True) for ich in range(4)], dtype=np.int64).reshape(4, 65536)
+    amp = np.asarray(amp)
+    if not np.issubdtype(amp.dtype, np.integer):
+        amp = amp[(amp >= 0.) * (amp <= 65536.)].astype(np.int64)
+    if amp.size > 0 and (amp.min() < 0 or amp.max() > 65535):
+        amp = np.minimum(amp[(amp >= 0) * (amp <= 65536)], 65535)
+    return np.bincount(amp, minlength=65536)
+
+def getSpectrum(amp, nbins = 65536, singlech = False, full = None):
 
     """
     Function for getting the spectrum of the amplitude data
     :param amp: amplitude of all 4 channels
     :param nbins: number of bins, 0 < nbins <= 65536
     :param singlech: boolean indicating whether the fit is for single channel
+    :param full: full resolution spectrum of the amplitude data from fullSpectrum(), calculated from amp if not given
     :return: the corresponding spectrum of the input and the bin centers
+    The spectrum is rebinned from the full resolution spectrum, the same as np.histogram() of the amplitude data with range (0, 65536)
     """
 
     if nbins <= 0 or nbins > 65536:
         raise Exception('getSpectrum: parameter \'nbins\' out of range [1-65536]')
-    if not singlech:
-        spectrum = []
-        x = []
-        for ich in range(4):
-            specch, xch = np.histogram(amp[ich], bins=nbins, range=(0., 65536.))
-            spectrum.append(specch)
-            x.append((xch[:-1] + xch[1:]) / 2)
+    if full is None:
+        full = fullSpectrum(amp, singlech)
+    edges = np.linspace(0., 65536., nbins + 1)
+    if 65536 % nbins == 0:
+        spectrum = full.reshape(full.shape[:-1] + (nbins, 65536 // nbins)).sum(axis=-1)
     else:
-        spectrum, x = np.histogram(amp, bins=nbins, range=(0., 65536.))
-        x = (x[:-1] + x[1:]) / 2
+        spectrum = np.add.reduceat(full, np.searchsorted(np.arange(65536), edges[:-1]), axis=-1)
+    x = (edges[:-1] + edges[1:]) / 2
+    if not singlech:
+        return [spectrum[ich] for ich in range(4)], [x.copy() for ich in range(4)]
     return spectrum, x
 
 #************************************************************************************************************************************************************
@@ -97,6 +159,90 @@ def getTime(filename):
     print('getTime: unable to parse filename ' + filename)
     return -1
 
+#Lookup table of CRC16-XMODEM(polynomial 0x1021, initial value 0), crc of each byte value shifted to the high byte
+crcTable = np.zeros(256, dtype=np.uint16)
+for icrc in range(256):
+    crcValue = icrc << 8
+    for ibit in range(8):
+        crcValue = ((crcValue << 1) ^ 0x1021) if crcValue & 0x8000 else crcValue << 1
+    crcTable[icrc] = crcValue & 0xFFFF
+del icrc, ibit, crcValue
+
+def crcCalculate(data, length = None):
+
+    """
+    Function for calculating CRC16-XMODEM of many packets at once, with the table swept column by column across all packets
+    :param data: packets in the form of (n, m) uint8 ndarray
+    :param length: number of leading bytes of each packet included in the crc, all m bytes if None
+    :return: crc of each packet, in the form of uint16 ndarray
+    """
+
+    data = np.asarray(data, dtype=np.uint8)
+    if data.ndim == 1:
+        data = data[None, :]
+    columns = np.ascontiguousarray(data.T)
+    crc = np.zeros(data.shape[0], dtype=np.uint16)
+    if length is None:
+        for column in columns:
+            crc = (crc << 8) ^ crcTable[(crc >> 8) ^ column]
+    else:
+        length = np.asarray(length)
+        for icol in range(columns.shape[0]):
+            inside = length > icol
+            if not np.any(inside):
+                break
+            crc = np.where(inside, (crc << 8) ^ crcTable[(crc >> 8) ^ columns[icol]], crc)
+    return crc
+
+def crcCheckBatch(data, crc, length = None):
+
+    """
+    Function for checking crc of many packets at once
+    :param data: data parts for calculating crc, in the form of (n, m) uint8 ndarray
+    :param crc: crc parts in original data, in the form of (n, 2) uint8 ndarray
+    :param length: number of leading bytes of each data part included in the crc, all m bytes if None
+    :return: boolean ndarray, True for the packets with correct crc
+    """
+
+    crc = np.asarray(crc, dtype=np.uint16)
+    if crc.ndim == 1:
+        crc = crc[None, :]
+    return crcCalculate(data, length) == (crc[:, 0] << 8) + crc[:, 1]
+
+def crcValue(crc):
+
+    """
+    Auxiliary function to get the crc values given by the crc parts of packets as crc[0] * 256 + crc[1], with crc parts out of the byte range taken \
+as they are like the original line-by-line readout
+    :param crc: crc parts in the form of (n, 2) non-negative int64 ndarray
+    :return: crc value of each packet, -1 for the crc parts that can match no crc
+    """
+
+    crc = np.asarray(crc, dtype=np.int64)
+    if crc.ndim == 1:
+        crc = crc[None, :]
+    inRange = (crc[:, 0] <= 255) * (crc[:, 1] <= 65535)
+    return np.where(inRange, np.where(inRange, crc[:, 0], 0) * 256 + np.where(inRange, crc[:, 1], 0), -1)
+
+def crcCheckWide(data, crc, length = None):
+
+    """
+    Function for checking crc of many packets at once with token values out of the byte range, the packets with such values in their data parts \
+failing the check as in crcCheck()
+    :param data: data parts for calculating crc, in the form of (n, m) non-negative int64 ndarray
+    :param crc: crc parts in original data, in the form of (n, 2) non-negative int64 ndarray
+    :param length: number of leading bytes of each data part included in the crc, all m bytes if None
+    :return: boolean ndarray, True for the packets with correct crc
+    """
+
+    data = np.asarray(data, dtype=np.int64)
+    if data.ndim == 1:
+        data = data[None, :]
+    overflow = data > 255
+    if length is not None:
+        overflow *= np.arange(data.shape[1])[None, :] < np.asarray(length)[:, None]
+    return ~np.any(overflow, axis=1) * (crcCalculate(data.astype(np.uint8), length).astype(np.int64) == crcValue(crc))
+
 def crcCheck(data, crc):
 
     """
@@ -106,626 +252,1812 @@ def crcCheck(data, crc):
     :return: True if crc check is correct, False if not
     """
 
-    lineBytes = b''
+    if len(crc) < 2:
+        return False
     try:
-        for x in data:
-            lineBytes += struct.pack('B', x)
+        data = np.array([int(x) for x in data], dtype=np.int64)
+        crc = np.array([int(x) for x in crc[:2]], dtype=np.int64)
     except:
         return False
-    crcCalculated = crc16.crc16xmodem(lineBytes)
-    crcData = crc[0] * 256 + crc[1]
-    if not crcCalculated == crcData:
+    if np.any(data < 0) or np.any(crc < 0):
         return False
-    return True
+    return bool(crcCheckWide(data[None, :], crc[None, :])[0])
+
+#*****************************************************************************************************************************************************
+#***********************************************************Vectorized packet decode part**********************************************************
+#*****************************************************************************************************************************************************
+
+#Lookup tables for the raw text, blank characters stripped by rstrip() and digit values of decimal and hexprint tokens(255 for non-digits)
+blankTable = np.zeros(256, dtype=bool)
+blankTable[[9, 10, 11, 12, 13, 28, 29, 30, 31, 32]] = True
+decTable = np.full(256, 255, dtype=np.uint8)
+decTable[48:58] = np.arange(10)
+hexTable = np.full(256, 255, dtype=np.uint8)
+hexTable[48:58] = np.arange(10)
+hexTable[65:71] = np.arange(10, 16)
+hexTable[97:103] = np.arange(10, 16)
+
+#Byte offsets of the 44 events in a event packet and the 7 records in a telemetry packet
+evtChOffset = np.concatenate(([3], 26 + 11 * np.arange(43)))
+evtUsOffset = (evtChOffset + 1)[:, None] + np.arange(8)[None, :]
+evtAmpOffset = (evtChOffset + 9)[:, None] + np.arange(2)[None, :]
+telUsOffset = (15 + 70 * np.arange(7))[:, None] + np.arange(8)[None, :]
+telMonOffset = (70 * np.arange(7))[:, None, None] + (2 * np.arange(4))[None, :, None] + np.arange(2)[None, None, :]
+
+def splitRawLines(buf):
 
-def dataReadout(filename, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0):
-    
     """
-    Function for reading out single Grid raw outout file
+    Auxiliary function to find the line boundaries of raw data, equivalent to reading the file line by line with rstrip()
+    :param buf: raw data of the file, in the form of uint8 ndarray
+    :return: start byte offsets and end byte offsets(with trailing blanks stripped) of all lines
+    """
+
+    newline = np.flatnonzero(buf == 10)
+    if buf.size > 0 and not buf[-1] == 10:
+        newline = np.append(newline, buf.size)
+    lineStart = np.concatenate(([0], newline[:-1] + 1))[:newline.size].astype(np.int64)
+    nonBlank = np.flatnonzero(~blankTable[buf])
+    if nonBlank.size == 0:
+        return lineStart, lineStart.copy()
+    last = np.searchsorted(nonBlank, newline) - 1
+    lastPos = nonBlank[np.maximum(last, 0)]
+    lineEnd = np.where((last >= 0) * (lastPos >= lineStart), lastPos + 1, lineStart)
+    return lineStart, lineEnd
+
+def tokenizeLines(buf, lineStart, lineEnd, isHex = False):
+
+    """
+    Function for converting the space-separated tokens of all lines to one uint8 array, equivalent to int(token) or int(token, 16) for every token of \
+line.split(' ') but without any python-level loop
+    :param buf: raw data of the file, in the form of uint8 ndarray
+    :param lineStart: start byte offsets of the lines
+    :param lineEnd: end byte offsets of the lines, with trailing blanks stripped
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :return: values of all tokens(0 for unparsable ones and those out of the byte range[0-255]) padded with 512 zeros, index of the first token of \
+each line, number of tokens of each line, number of leading tokens of each line that can be parsed, the latter being the length of the 'lineFloat' \
+list in the original line-by-line readout, and the positions in values and the int64 values of the parsed tokens out of the byte range as a tuple, \
+the values beyond 2 ** 62 being folded above 2 ** 62 with equal tokens kept equal
+    """
+
+    nLines = lineStart.size
+    spaces = np.flatnonzero(buf == 32)
+    spaceLine = np.searchsorted(lineStart, spaces, 'right') - 1
+    qSpace = spaces < lineEnd[spaceLine]
+    spaces = spaces[qSpace]
+    spaceLine = spaceLine[qSpace]
+    fieldCount = np.bincount(spaceLine, minlength=nLines) + 1
+    firstField = np.concatenate(([0], np.cumsum(fieldCount)[:-1])).astype(np.int64)
+    nFields = int(np.sum(fieldCount))
+    fieldStart = np.empty(nFields, dtype=np.int64)
+    fieldEnd = np.empty(nFields, dtype=np.int64)
+    fieldStart[firstField] = lineStart
+    fieldEnd[firstField + fieldCount - 1] = lineEnd
+    spaceIndex = np.arange(spaces.size) + spaceLine
+    fieldEnd[spaceIndex] = spaces
+    fieldStart[spaceIndex + 1] = spaces + 1
+
+    if isHex:
+        base = 16
+        digit = hexTable[buf]
+    else:
+        base = 10
+        digit = decTable[buf]
+    badCount = np.concatenate(([0], np.cumsum(digit == 255)))
+    fieldLen = fieldEnd - fieldStart
+    valid = (fieldLen > 0) * (badCount[fieldEnd] - badCount[fieldStart] == 0)
+
+    #Values from the significant digits after the leading zeros, exact in int64 up to 18 decimal or 15 hexadecimal digits
+    nonZero = np.append(np.flatnonzero((digit > 0) * (digit < 255)), buf.size)
+    sigStart = np.minimum(nonZero[np.searchsorted(nonZero, fieldStart)], fieldEnd)
+    sigLen = fieldEnd - sigStart
+    exact = valid * (sigLen <= (15 if isHex else 18))
+    values = np.zeros(nFields, dtype=np.int64)
+    digit = digit.astype(np.int64)
+    maxLen = int(np.max(sigLen[exact])) if np.any(exact) else 0
+    for k in range(maxLen):
+        pos = fieldEnd - 1 - k
+        q = exact * (pos >= sigStart)
+        values[q] += digit[pos[q]] * base ** k
+    for ifield in np.flatnonzero(valid * ~exact):
+        values[ifield] = (1 << 62) + int(bytes(buf[sigStart[ifield]:fieldEnd[ifield]]), base) % ((1 << 61) - 1)
+    overflowPos = np.flatnonzero(valid * (values > 255))
+    overflow = (overflowPos, values[overflowPos])
+    values[~valid] = 0
+    values[overflowPos] = 0
+
+    validCount = fieldCount.copy()
+    bad = np.flatnonzero(~valid)
+    if bad.size > 0:
+        badLine = np.searchsorted(firstField, bad, 'right') - 1
+        badLine, firstBad = np.unique(badLine, return_index=True)
+        validCount[badLine] = bad[firstBad] - firstField[badLine]
+    values = np.concatenate((values.astype(np.uint8), np.zeros(512, dtype=np.uint8)))
+    return values, firstField, fieldCount, validCount, overflow
+
+def gatherValues(values, index, overflow):
+
+    """
+    Auxiliary function to gather token values with the tokens out of the byte range at their int64 values
+    :param values: token values returned by tokenizeLines()
+    :param index: positions of the tokens in values, ndarray of any shape
+    :param overflow: positions and values of the tokens out of the byte range returned by tokenizeLines()
+    :return: int64 ndarray of the token values in the shape of index
+    """
+
+    gathered = values[index].astype(np.int64)
+    overflowPos, overflowValue = overflow
+    if overflowPos.size > 0 and gathered.size > 0:
+        iover = np.minimum(np.searchsorted(overflowPos, index), overflowPos.size - 1)
+        hit = overflowPos[iover] == index
+        gathered[hit] = overflowValue[iover[hit]]
+    return gathered
+
+def findPackets(values, firstField, validCount, lineActive, isHex = False, newProgramme = False):
+
+    """
+    Function for locating event and telemetry packets with vectorized signature matching
+    :param values: token values returned by tokenizeLines()
+    :param firstField: index of the first token of each line
+    :param validCount: number of parsable leading tokens of each line
+    :param lineActive: boolean array indicating the lines to be searched
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :return: positions of the packet headers in values, corresponding line numbers and boolean array being True for event packets, in the order \
+of readout
+    """
+
+    n = values.size - 512
+    if n <= 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=bool)
+    if newProgramme:
+        evtHead, evtTail, evtLen = (170, 187, 204), 507, 510
+        telHead, telTail = (18, 52, 86), (120, 154, 188)
+    else:
+        evtHead, evtTail, evtLen = (170, 187, 204), 499, 502
+        telHead, telTail = (1, 35, 69), (103, 137, 16)
+
+    packets = []
+    for head, tail, length, isEvt in [(evtHead, (221, 238, 255), evtLen, True), (telHead, telTail, 502, False)]:
+        pos = np.flatnonzero((values[:n] == head[0]) * (values[1:n + 1] == head[1]) * (values[2:n + 2] == head[2]))
+        line = np.searchsorted(firstField, pos, 'right') - 1
+        q = lineActive[line] * (pos - firstField[line] + length <= validCount[line])
+        pos = pos[q]
+        line = line[q]
+        tailStart = evtTail if isEvt else 493
+        q = (values[pos + tailStart] == tail[0]) * (values[pos + tailStart + 1] == tail[1]) * (values[pos + tailStart + 2] == tail[2])
+        packets.append((pos[q], line[q], np.full(np.sum(q), isEvt)))
+    pos = np.concatenate((packets[0][0], packets[1][0]))
+    line = np.concatenate((packets[0][1], packets[1][1]))
+    isEvt = np.concatenate((packets[0][2], packets[1][2]))
+    order = np.argsort(pos, kind='stable')
+    pos, line, isEvt = pos[order], line[order], isEvt[order]
+
+    #hexprint readout skips the whole 512 bytes after each packet
+    if isHex and pos.size > 1:
+        close = (np.diff(pos) < 512) * (np.diff(line) == 0)
+        if np.any(close):
+            keep = np.ones(pos.size, dtype=bool)
+            nextPos = -1
+            lastLine = -1
+            for ip in range(pos.size):
+                if line[ip] == lastLine and pos[ip] < nextPos:
+                    keep[ip] = False
+                    continue
+                nextPos = pos[ip] + 512
+                lastLine = line[ip]
+            pos, line, isEvt = pos[keep], line[keep], isEvt[keep]
+    return pos, line, isEvt
+
+def crcCheckPackets(values, start, length, crcPos, overflow, blockSize = 65536):
+
+    """
+    Function for checking crc of packets located in the token array, in blocks of packets to limit the memory of the gathered packets, the packets \
+with tokens out of the byte range in their crc data failing the check
+    :param values: token values returned by tokenizeLines()
+    :param start: positions of the first byte of the crc data of each packet in values
+    :param length: number of bytes of the crc data of each packet, at most 512
+    :param crcPos: positions of the 2 crc bytes of each packet in values, -1 for packets without crc bytes
+    :param overflow: positions and values of the tokens out of the byte range returned by tokenizeLines()
+    :param blockSize: number of packets checked in one block
+    :return: boolean ndarray, True for the packets with correct crc
+    """
+
+    start = np.asarray(start, dtype=np.int64)
+    length = np.asarray(length, dtype=np.int64)
+    crcPos = np.asarray(crcPos, dtype=np.int64)
+    crcOk = np.zeros(start.size, dtype=bool)
+    dataOk = np.searchsorted(overflow[0], start + np.maximum(length, 0)) == np.searchsorted(overflow[0], start)
+    for first in range(0, start.size, blockSize):
+        block = slice(first, first + blockSize)
+        nByte = max(int(np.max(length[block])), 0)
+        data = values[start[block, None] + np.arange(nByte)[None, :]]
+        crc = gatherValues(values, np.maximum(crcPos[block], 0)[:, None] + np.arange(2)[None, :], overflow)
+        fullLength = None if np.all(length[block] == nByte) else length[block]
+        crcOk[block] = (crcCalculate(data, fullLength).astype(np.int64) == crcValue(crc)) * dataOk[block] * (crcPos[block] >= 0)
+    return crcOk
+
+def decodeEventPackets(values, pos, newProgramme = False):
+
+    """
+    Function for decoding all events in the given event packets at once
+    :param values: token values returned by tokenizeLines()
+    :param pos: positions of the event packet headers in values
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :return: channel numbers(1-4 for legal channels), uscount in clock ticks(24.05MHz) and ADC amplitude of the 44 events of each packet, in the \
+form of (len(pos), 44) ndarrays, and effective count and missing count of each packet(empty for old programme)
+    """
+
+    pos = np.asarray(pos, dtype=np.int64)
+    ch = values[pos[:, None] + evtChOffset[None, :]].astype(np.uint16)
+    if newProgramme:
+        ch += 1
+    uscount = np.ascontiguousarray(values[pos[:, None, None] + evtUsOffset[None, :, :]]).view('>u8')[..., 0].astype(np.uint64)
+    amp = np.ascontiguousarray(values[pos[:, None, None] + evtAmpOffset[None, :, :]]).view('>u2')[..., 0].astype(np.uint16)
+    if newProgramme:
+        effectiveCount = np.ascontiguousarray(values[pos[:, None] + 499 + np.arange(4)[None, :]]).view('>u4')[:, 0].astype(np.int64)
+        missingCount = np.ascontiguousarray(values[pos[:, None] + 503 + np.arange(4)[None, :]]).view('>u4')[:, 0].astype(np.int64)
+    else:
+        effectiveCount = np.zeros(0, dtype=np.int64)
+        missingCount = np.zeros(0, dtype=np.int64)
+    return ch, uscount, amp, effectiveCount, missingCount
+
+def decodeTelemetryPackets(rows, biasFactor):
+
+    """
+    Function for decoding all records in the given telemetry packets at once
+    :param rows: telemetry packets in the form of (n, 496) uint8 ndarray, starting with the packet header
+    :param biasFactor: factor of monitored current when calculating bias, for each packet
+    :return: uscount in seconds in the form of (n * 7) ndarray, and SiPM temperature, ADC temperature, monitored voltage, monitored current and bias \
+in the form of (4, n * 7) ndarrays
+    """
+
+    nRec = rows.shape[0] * 7
+    uscount = np.ascontiguousarray(rows[:, telUsOffset]).view('>u8')[..., 0].astype(np.float64).ravel() / 24.05e6
+    monitor = []
+    for start in [23, 31, 39, 47]:
+        raw = np.ascontiguousarray(rows[:, start + telMonOffset]).view('>u2')[..., 0].astype(np.int64)
+        monitor.append(raw.transpose(2, 0, 1).reshape(4, nRec))
+    tempSipm = np.where(monitor[0] > 2048, (monitor[0] - 4096).astype(np.float64) / 16.0, monitor[0].astype(np.float64) / 16.0)
+    tempAdc = np.where(monitor[1] > 2048, (monitor[1] - 4096).astype(np.float64) / 16.0, monitor[1].astype(np.float64) / 16.0)
+    vMon = monitor[2].astype(np.float64) / 4096.0 * 3.3 * 11.0
+    iMon = monitor[3].astype(np.float64) / 4096.0 * 3.3
+    bias = vMon - iMon * np.repeat(np.asarray(biasFactor, dtype=np.float64), 7)[None, :]
+    return uscount, tempSipm, tempAdc, vMon, iMon, bias
+
+def buildArray(data, depth):
+
+    """
+    Auxiliary function to build ndarray from nested lists of 1-D data, being a regular ndarray when all innermost data share the same length like \
+np.array() does, otherwise an object ndarray holding the innermost data as 1-D ndarrays
+    :param data: nested lists with 1-D ndarrays as the innermost elements
+    :param depth: number of nested list levels above the innermost data
+    :return: the corresponding ndarray
+    """
+
+    shape = []
+    level = data
+    for idepth in range(depth):
+        shape.append(len(level))
+        if len(level) == 0:
+            break
+        level = level[0]
+    shape = tuple(shape)
+    leaves = [data]
+    for idepth in range(len(shape)):
+        leaves = [sub for item in leaves for sub in item]
+    if len(shape) == depth and len(leaves) > 0 and all(len(leaf) == len(leaves[0]) for leaf in leaves):
+        return np.array(leaves).reshape(shape + (len(leaves[0]),))
+    array = np.empty(shape, dtype=object)
+    for ileaf, leaf in enumerate(leaves):
+        array[np.unravel_index(ileaf, shape)] = np.array(leaf)
+    return array
+
+def readoutState(isCi = 0):
+
+    """
+    Function for creating the readout state carried from one block of raw data to the next block of the same file
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :return: dict of the readout state, including the CI flag, the current scan number, the telemetry crc repair buffers and the error counts
+    The crc repair buffers keep their entries in a FIFO queue for eviction and in a table from the key(bytes 498-503 of the packet) to the \
+entries with this key in FIFO order, so that the oldest entry matching a packet is found without scanning the buffer
+    """
+
+    state = {
+        'bCi':          not isCi == 0,
+        'nScan':        -1,
+        'dataBuffer':   {'queue': deque(), 'table': {}}, #to fix the problem of telemetry data crc check, checking the data before the current data
+        'lineBuffer':   {'queue': deque(), 'table': {}, 'pending': 0}, #also for the DAMN telemetry data crc check, checking the data after the current data
+        'crcError':     0, #count of crc error data
+        'indexOut':     0, #count of events with channel index out of range[1-4]
+    }
+    return state
+
+def readRawBlocks(f, chunkSize = 1 << 26, end = -1):
+
+    """
+    Generator for reading raw data in blocks of complete lines from the current position of an opened file
+    :param f: file opened in binary mode
+    :param chunkSize: size of each read from the file in bytes
+    :param end: byte offset where the reading stops, -1 for the end of file
+    :return: yields blocks of complete lines in bytes, with the last block holding the remaining bytes(possibly empty)
+    """
+
+    pending = b''
+    while True:
+        size = chunkSize if end < 0 else min(chunkSize, end - f.tell())
+        if size <= 0:
+            break
+        data = f.read(size)
+        if not data:
+            break
+        pending += data
+        cut = pending.rfind(b'\n')
+        if cut < 0:
+            continue
+        yield pending[:cut + 1]
+        pending = pending[cut + 1:]
+    yield pending
+
+def processMarkers(raw, lineStart, lineEnd, state, isCi = 0, isScan = False, scanRange = [], verbose = True):
+
+    """
+    Function for processing the marker lines(I-V scan, begin and end of CI) of a block in the order of the file
+    :param raw: raw data of the block in bytes, consisting of complete lines
+    :param lineStart: start byte offsets of the lines
+    :param lineEnd: end byte offsets of the lines, with trailing blanks stripped
+    :param state: readout state returned by readoutState(), with the CI flag and scan number updated in place
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part
+    :param scanRange: list containing the scan range for multiple scans
+    :param verbose: boolean indicating whether to print the run numbers
+    :return: boolean ndarray marking the marker lines, scan number and CI flag of each line and the I-V scan data of the block
+    """
+
+    nLines = lineStart.size
+    vSet = [] #i-v scan data
+    vScan = [] #i-v scan data
+    iScan = [] #i-v scan data
+    for ich in range(4):
+        vScan.append([])
+        iScan.append([])
+
+    ranged = False
+    if isCi == 2:
+        if not len(scanRange) == 0:
+            ranged = True
+            lower = scanRange[0] - 1
+            upper = scanRange[1] - 1
+    bCi = state['bCi']
+    nScan = state['nScan']
+
+    keywords = [b'End']
+    if isCi == 2:
+        keywords.append(b'Begin')
+    if isScan:
+        keywords.append(b'Point')
+    markerLines = set()
+    for keyword in keywords:
+        ind = raw.find(keyword)
+        while ind >= 0:
+            iline = int(np.searchsorted(lineStart, ind, 'right')) - 1
+            if ind + len(keyword) <= lineEnd[iline]:
+                markerLines.add(iline)
+            ind = raw.find(keyword, ind + 1)
+    markerLines = sorted(markerLines)
+    isMarker = np.zeros(nLines, dtype=bool)
+    stateLine = [] #marker lines and the (nScan, bCi) states after them
+    stateAfter = []
+    for iline in markerLines:
+        line = raw[lineStart[iline]:lineEnd[iline]].decode(errors='replace')
+        isMarker[iline] = True
+        #I-V scan
+        if isScan and 'Point' in line:
+            lineList = line.split(',')
+            scanData = []
+            bScan = True #ensuring that corrupted data are disposed
+            try:
+                scanData.append(int(lineList[3]))
+                scanList = lineList[4].split()
+                for iscan in range(4):
+                    scanData.append(float(scanList[2 * iscan]) / 4096.0 * 3.3 * 11.0)
+                    scanData.append(float(scanList[1 + 2 * iscan]) / 4096.0 * 2.0 * 3.3)
+            except:
+                #print('Scan data error') #Debug
+                bScan = False
+            if bScan:
+                vSet.append(scanData[0])
+                for ich in range(4):
+                    vScan[ich].append(scanData[1 + 2 * iscan])
+                    iScan[ich].append([scanData[2 + 2 * iscan]])
+            continue
+
+        #begin and end of CI, also scan counts for multiple scans
+        if isCi == 2 and 'Begin' in line:
+            bCi = True
+            nScan += 1
+            if verbose:
+                if ranged and not (nScan >= lower and nScan <= upper):
+                    print('Skipping run #' + str(nScan + 1))
+                else:
+                    print('Run #' + str(nScan + 1))
+        elif 'End' in line:
+            bCi = False
+        else:
+            isMarker[iline] = False
+            continue
+        stateLine.append(iline)
+        stateAfter.append((nScan, bCi))
+    stateLine = np.array(stateLine, dtype=np.int64)
+    stateScan = np.array([state['nScan']] + [after[0] for after in stateAfter], dtype=np.int64)
+    stateCi = np.array([state['bCi']] + [after[1] for after in stateAfter], dtype=bool)
+    lineState = np.searchsorted(stateLine, np.arange(nLines), 'right')
+    state['bCi'] = bCi
+    state['nScan'] = nScan
+    return isMarker, stateScan[lineState], stateCi[lineState], vSet, vScan, iScan
+
+def decodePacketBlock(raw, state, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0):
+
+    """
+    Function for decoding the packets in a block of complete lines of Grid raw output, with packets located by vectorized signature matching and \
+all events decoded at once, the telemetry packets are only gathered for the telemetry crc repair in repairTelemetryBlock()
+    :param raw: raw data of the block in bytes, consisting of complete lines
+    :param state: readout state returned by readoutState(), updated in place except the telemetry crc repair buffers
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part
+    :param scanRange: list containing the scan range for multiple scans
+    :param rateStyle: the style of calculating real count rate, '' for none, 's' for calculation with small data packs(512byte), \
+'p' for calculation with whole data packs
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :param timeCut: cut of time data in seconds, specially designed for temp-bias data with pid bias control(6th ver.)
+    :return: dict of the decoded events of the block as in decodeRawBlock(), together with the bytes 496-503, row length, scan number and type of \
+every packet(old programme only) and the crc rows, row lengths, decode rows, scan numbers and packet indices of the telemetry packets
+    """
+
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    lineStart, lineEnd = splitRawLines(buf)
+
+    if isHex: #in hexprint files there is no CI and I-V scan part
+        isCi = 0
+        isScan = False
+    isMarker, lineScan, lineCi, vSet, vScan, iScan = processMarkers(raw, lineStart, lineEnd, state, isCi, isScan, scanRange)
+    lineActive = ~isMarker
+    if isHex:
+        lineCi[:] = False
+    if isCi == 2:
+        lineActive *= lineScan >= 0
+        if not len(scanRange) == 0:
+            lineActive *= (lineScan >= scanRange[0] - 1) * (lineScan <= scanRange[1] - 1)
+
+    #Tokenizing and packet search
+    if lineStart.size > 0:
+        values, firstField, fieldCount, validCount, overflow = tokenizeLines(buf, lineStart, lineEnd, isHex)
+        lineActive *= fieldCount > 502
+        pos, posLine, isEvt = findPackets(values, firstField, validCount, lineActive, isHex, newProgramme)
+    else:
+        values = np.zeros(512, dtype=np.uint8)
+        overflow = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        firstField, validCount, pos, posLine = [np.zeros(0, dtype=np.int64) for i in range(4)]
+        isEvt = np.zeros(0, dtype=bool)
+    del buf
+
+    #Crc data row of each packet, the whole line for normal files and the 512 bytes after the header for hexprint files
+    if isHex:
+        rowStart = pos
+        rowLen = np.minimum(firstField[posLine] + validCount[posLine] - pos, 512)
+    else:
+        rowStart = firstField[posLine]
+        rowLen = validCount[posLine].astype(np.int64)
+
+    #Crc check of event packets
+    evtCrcLen = 510 if newProgramme else 502
+    evtIndex = np.flatnonzero(isEvt)
+    evtOk = np.zeros(pos.size, dtype=bool)
+    evtOk[evtIndex] = crcCheckPackets(values, rowStart[evtIndex], np.minimum(rowLen[evtIndex], evtCrcLen), \
+np.where(rowLen[evtIndex] >= evtCrcLen + 2, rowStart[evtIndex] + evtCrcLen, -1), overflow)
+    state['crcError'] += int(np.sum(~evtOk[evtIndex]))
+
+    #Event decoding
+    evtPos = pos[evtOk]
+    evtScan = lineScan[posLine[evtOk]]
+    evtCi = lineCi[posLine[evtOk]]
+    ch, uscountRaw, amp, effectiveCount, missingCount = decodeEventPackets(values, evtPos, newProgramme)
+    uscountEvt = uscountRaw.astype(np.float64) / 24.05e6
+    state['indexOut'] += int(np.sum((ch < 1) + (ch > 4)))
+    timeCorrect = np.zeros(0)
+    timeScan = np.zeros(0, dtype=np.int64)
+    if rateStyle == 's':
+        timeCorrect = np.diff(uscountEvt[~evtCi], axis=1).ravel()
+        timeScan = np.repeat(evtScan[~evtCi], 43)
+    elif rateStyle == 'p':
+        timeCorrect = uscountEvt[~evtCi, 43] - uscountEvt[~evtCi, 0]
+        timeScan = evtScan[~evtCi]
+    evtDataScan = np.repeat(evtScan.astype(np.int32), 44)
+    evtDataCi = np.repeat(evtCi, 44)
+    ch = ch.ravel()
+    uscountRaw = uscountRaw.ravel()
+    uscountEvt = uscountEvt.ravel()
+    amp = amp.ravel()
+    qEvt = evtDataCi + (uscountEvt > timeCut) #time cut, not applied on CI data
+
+    #Telemetry packets and the packet tails needed by the telemetry crc repair
+    telIndex = np.flatnonzero(~isEvt)
+    if newProgramme:
+        pktIndex = np.zeros(0, dtype=np.int64)
+    else:
+        pktIndex = np.arange(pos.size)
+    packets = {
+        'ch':                   ch[qEvt],
+        'amp':                  amp[qEvt],
+        'uscountRaw':           uscountRaw[qEvt],
+        'evtScan':              evtDataScan[qEvt],
+        'evtCi':                evtDataCi[qEvt],
+        'effectiveCount':       effectiveCount,
+        'missingCount':         missingCount,
+        'packetScan':           evtScan.astype(np.int32) if newProgramme else np.zeros(0, dtype=np.int32),
+        'packetCi':             evtCi if newProgramme else np.zeros(0, dtype=bool),
+        'timeCorrect':          timeCorrect,
+        'timeScan':             timeScan,
+        'vSet':                 vSet,
+        'vScan':                vScan,
+        'iScan':                iScan,
+        'pktTail':              gatherValues(values, rowStart[pktIndex][:, None] + np.arange(496, 504)[None, :], overflow),
+        'pktLen':               rowLen[pktIndex],
+        'pktScan':              lineScan[posLine[pktIndex]],
+        'pktEvt':               isEvt[pktIndex],
+        'telRow':               gatherValues(values, rowStart[telIndex][:, None] + np.arange(512)[None, :], overflow),
+        'telLen':               rowLen[telIndex],
+        'telDecode':            values[pos[telIndex][:, None] + np.arange(496)[None, :]],
+        'telScan':              lineScan[posLine[telIndex]],
+        'telPacket':            telIndex,
+    }
+    return packets
+
+def repairTelemetryBlock(packets, state, isHex = False, newProgramme = False, timeCut = -1.0):
+
+    """
+    Function for the telemetry crc repair, crc check and decoding of the telemetry packets of a block, the repair being done packet by packet \
+with the repair buffers in the readout state before checking all telemetry packets at once
+    :param packets: dict returned by decodePacketBlock()
+    :param state: readout state returned by readoutState(), updated in place
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :param timeCut: cut of time data in seconds, specially designed for temp-bias data with pid bias control(6th ver.)
+    :return: dict of the decoded data of the block as in decodeRawBlock()
+    """
+
+    dataQueue = state['dataBuffer']['queue']
+    dataTable = state['dataBuffer']['table']
+    lineBuffer = state['lineBuffer']
+    lineTable = lineBuffer['table']
+    bufferLen = 500
+    lineLen = 500
+
+    #Telemetry crc repair, finding the crc data and crc bytes of each telemetry packet
+    telCand = [] #telemetry index(-1 for buffered rows), buffered row, repaired crc bytes(None for no repair) and scan number of the packets to check
+    if not newProgramme:
+        pktTail = packets['pktTail']
+        pktLen = packets['pktLen']
+        telOfPacket = np.full(pktLen.size, -1, dtype=np.int64)
+        telOfPacket[packets['telPacket']] = np.arange(packets['telPacket'].size)
+        for ip in range(pktLen.size):
+            key = pktTail[ip, 2:max(2, min(pktLen[ip], 504) - 496)].tobytes() #row[498:504]
+            crcBytes = pktTail[ip, 0:max(0, min(pktLen[ip], 498) - 496)] #row[496:498]
+            #check the data before the current data
+            crcCorrect = []
+            if not packets['pktEvt'][ip] and key in dataTable:
+                crcCorrect = dataTable[key][0]
+            #check the previous telemetry data, entries being [key, row, pending]
+            if key in lineTable:
+                buf = lineTable[key].popleft()
+                if len(lineTable[key]) == 0:
+                    del lineTable[key]
+                buf[2] = False
+                lineBuffer['pending'] -= 1
+                telCand.append((-1, buf[1], crcBytes.copy(), packets['pktScan'][ip]))
+            #crc buffer fill
+            if len(dataQueue) >= bufferLen:
+                oldKey = dataQueue.popleft()
+                dataTable[oldKey].popleft()
+                if len(dataTable[oldKey]) == 0:
+                    del dataTable[oldKey]
+            dataQueue.append(key)
+            if not key in dataTable:
+                dataTable[key] = deque()
+            dataTable[key].append(crcBytes.copy())
+            if not packets['pktEvt'][ip]:
+                it = telOfPacket[ip]
+                if len(crcCorrect) == 0:
+                    if lineBuffer['pending'] >= lineLen:
+                        while not lineBuffer['queue'][0][2]: #skipping the entries already matched
+                            lineBuffer['queue'].popleft()
+                        buf = lineBuffer['queue'].popleft()
+                        lineTable[buf[0]].popleft()
+                        if len(lineTable[buf[0]]) == 0:
+                            del lineTable[buf[0]]
+                        buf[2] = False
+                        lineBuffer['pending'] -= 1
+                        state['crcError'] += 1
+                    buf = [key, packets['telRow'][it, :min(packets['telLen'][it], 512)].copy(), True]
+                    lineBuffer['queue'].append(buf)
+                    if not key in lineTable:
+                        lineTable[key] = deque()
+                    lineTable[key].append(buf)
+                    lineBuffer['pending'] += 1
+                    if len(lineBuffer['queue']) > 2 * lineLen:
+                        lineBuffer['queue'] = deque([buf for buf in lineBuffer['queue'] if buf[2]])
+                    telCand.append((it, None, None, packets['pktScan'][ip]))
+                else:
+                    telCand.append((it, None, crcCorrect, packets['pktScan'][ip]))
+        telCrcLen = 510
+    else:
+        telCand = [(it, None, None, packets['telScan'][it]) for it in range(packets['telPacket'].size)]
+        telCrcLen = 496
+
+    #Crc check
+    telIndex = np.array([cand[0] for cand in telCand], dtype=np.int64)
+    direct = telIndex >= 0
+    telRows = np.zeros((telIndex.size, 512), dtype=np.int64)
+    telRows[direct] = packets['telRow'][telIndex[direct]]
+    telLen = np.zeros(telIndex.size, dtype=np.int64)
+    telLen[direct] = packets['telLen'][telIndex[direct]]
+    decodeRows = np.zeros((telIndex.size, 496), dtype=np.uint8)
+    decodeRows[direct] = packets['telDecode'][telIndex[direct]]
+    for icand, cand in enumerate(telCand):
+        if cand[1] is not None:
+            telRows[icand, :cand[1].size] = cand[1]
+            telLen[icand] = cand[1].size
+            decodeRows[icand] = telRows[icand, :496]
+    telCrc = telRows[:, 496:498].copy()
+    for icand, cand in enumerate(telCand):
+        if cand[2] is not None:
+            telRows[icand, 496:498] = cand[2]
+    telOk = crcCheckWide(telRows, telCrc, np.minimum(telLen, telCrcLen)) * (telLen >= 498)
+    state['crcError'] += int(np.sum(~telOk))
+    telFactor = np.array([1.0 if cand[1] is not None or isHex else 2.0 for cand in telCand])[telOk]
+    telScan = np.array([cand[3] for cand in telCand], dtype=np.int64)[telOk]
+    decodeRows = decodeRows[telOk]
+
+    #Telemetry decoding
+    if decodeRows.shape[0] > 0:
+        uscount, tempSipm, tempAdc, vMon, iMon, bias = decodeTelemetryPackets(decodeRows, telFactor)
+    else:
+        uscount = np.zeros(0)
+        tempSipm, tempAdc, vMon, iMon, bias = [np.zeros((4, 0)) for i in range(5)]
+    telDataScan = np.repeat(telScan, 7)
+    qTel = uscount > timeCut #time cut
+
+    block = {}
+    for key in ['ch', 'amp', 'uscountRaw', 'evtScan', 'evtCi', 'effectiveCount', 'missingCount', 'packetScan', 'packetCi', 'timeCorrect', \
+                'timeScan']:
+        block[key] = packets[key]
+    block['uscount'] = uscount[qTel]
+    block['tempSipm'] = tempSipm[:, qTel]
+    block['tempAdc'] = tempAdc[:, qTel]
+    block['vMon'] = vMon[:, qTel]
+    block['iMon'] = iMon[:, qTel] / 2.0
+    block['bias'] = bias[:, qTel]
+    block['telScan'] = telDataScan[qTel]
+    for key in ['vSet', 'vScan', 'iScan']:
+        block[key] = packets[key]
+    block['crcError'] = state['crcError'] + lineBuffer['pending']
+    block['indexOut'] = state['indexOut']
+    block['nScan'] = state['nScan']
+    return block
+
+def decodeRawBlock(raw, state, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0):
+
+    """
+    Function for decoding a block of complete lines of Grid raw output, with packets located by vectorized signature matching and all events and \
+telemetry records decoded at once, only the telemetry crc repair is done packet by packet before the batched crc check
+    :param raw: raw data of the block in bytes, consisting of complete lines
+    :param state: readout state returned by readoutState(), updated in place
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part
+    :param scanRange: list containing the scan range for multiple scans
+    :param rateStyle: the style of calculating real count rate, '' for none, 's' for calculation with small data packs(512byte), \
+'p' for calculation with whole data packs
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :param timeCut: cut of time data in seconds, specially designed for temp-bias data with pid bias control(6th ver.)
+    :return: dict of the decoded data of the block, with channel number, amplitude, uscount in clock ticks, scan number and CI flag of every event(in \
+compact integer types), effective \
+count, missing count, scan number and CI flag of every event packet, live time samples with their scan numbers, uscount, SiPM&ADC temperatures, \
+SiPM voltage&leak current and scan number of every telemetry record, I-V scan data as lists and the accumulated crc error count, channel index \
+error count and scan number of the file so far
+    """
+
+    packets = decodePacketBlock(raw, state, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut)
+    return repairTelemetryBlock(packets, state, isHex, newProgramme, timeCut)
+
+def dataReadoutChunks(filename, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0, \
+                      chunkSize = 1 << 26):
+
+    """
+    Generator for reading out single Grid raw output file block by block, with the file read in blocks of complete lines and the telemetry crc \
+repair buffers and CI/scan states carried across the blocks, so that the memory used is limited by the block size instead of the file size
     :param filename: name of the output file, currently supporting only .txt files
     :param isHex: boolean indicating whether the input file is hexprint output
     :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
     :param isScan: boolean indicating whether the input file has I-V scan part
     :param scanRange: list containing the scan range for multiple scans
     :param rateStyle: the style of calculating real count rate, '' for none, 's' for calculation with small data packs(512byte), \
-'l' for calculation with large data packs(4096byte)
+'p' for calculation with whole data packs
     :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
     :param timeCut: cut of time data in seconds, specially designed for temp-bias data with pid bias control(6th ver.)
-    :return: all data extracted from the data file, including spectrums, SiPM&ADC temperatures, SiPM voltage&leak current,\
- uscount, correct live time, effective counts, missing counts, [CI data], [I-V scan data], all data in the form of ndarray
+    :param chunkSize: size of each read from the file in bytes
+    :return: yields the decoded data of each block as returned by decodeRawBlock(), at least one block for each file
     """
 
     styleAvailable = ['s', 'p', '']
     if not rateStyle in styleAvailable:
-        raise Exception('dataReadout: count rate calculation style \'' + rateStyle + '\' not available')
+        raise Exception('dataReadoutChunks: count rate calculation style \'' + rateStyle + '\' not available')
+    if chunkSize <= 0:
+        raise Exception('dataReadoutChunks: chunk size must be positive')
 
-    dataBuffer = [] #to fix the problem of telemetry data crc check, checking the data before the current data
-    lineBuffer = [] #also for the DAMN telemetry data crc check, checking the data after the current data
-    bufferLen = 500
-    lineLen = 500
+    state = readoutState(isCi)
+    with open(filename, 'rb') as f:
+        for raw in readRawBlocks(f, chunkSize):
+            yield decodeRawBlock(raw, state, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut)
 
-    print('dataReadout: processing ' + filename)
-    with open(filename) as f:
-        lines = [line.rstrip() for line in f]
-    
-    amp = [] #after CI for data with CI
-    ampCI = []
-    tempSipm = []
-    tempAdc = []
-    vMon = []
-    iMon = []
-    bias = []
-    uscount = [] #uscount in telemetry data
-    uscountEvt = []
-    uscountEvtCI = []
+#*****************************************************************************************************************************************************
+#**************************************************************Sharded parallel decode part***********************************************************
+#*****************************************************************************************************************************************************
+
+def shardBounds(filename, nShards):
+
+    """
+    Function for splitting a raw output file into byte ranges at line boundaries
+    :param filename: name of the output file
+    :param nShards: number of shards wanted
+    :return: list of the byte offsets of the shard boundaries, starting with 0 and ending with the file size
+    """
+
+    size = os.path.getsize(filename)
+    bounds = [0]
+    with open(filename, 'rb') as f:
+        for ishard in range(1, nShards):
+            target = max(size * ishard // nShards, bounds[-1])
+            f.seek(target)
+            f.readline() #moving to the start of the next line
+            if f.tell() >= size:
+                break
+            if f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return bounds
+
+def shardStates(filename, bounds, isHex = False, isCi = 0, isScan = False, scanRange = [], chunkSize = 1 << 26):
+
+    """
+    Function for finding the CI flag and scan number at the start of each shard, with only the marker lines processed
+    :param filename: name of the output file
+    :param bounds: shard boundaries returned by shardBounds()
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part
+    :param scanRange: list containing the scan range for multiple scans
+    :param chunkSize: size of each read from the file in bytes
+    :return: list of the (bCi, nScan) states at the start of each shard
+    """
+
+    state = readoutState(isCi)
+    states = [(state['bCi'], state['nScan'])]
+    if isHex:
+        isCi = 0
+        isScan = False
+    with open(filename, 'rb') as f:
+        for ishard in range(len(bounds) - 2):
+            for raw in readRawBlocks(f, chunkSize, bounds[ishard + 1]):
+                lineStart, lineEnd = splitRawLines(np.frombuffer(raw, dtype=np.uint8))
+                processMarkers(raw, lineStart, lineEnd, state, isCi, isScan, scanRange, False)
+            states.append((state['bCi'], state['nScan']))
+    return states
+
+def decodeShard(args):
+
+    """
+    Auxiliary function for decoding the packets of a shard in a worker process, the printed messages kept to be printed by the main process
+    :param args: tuple of filename, start and end byte offsets of the shard, (bCi, nScan) state at the start, readout parameters as a tuple of \
+(isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut) and chunk size
+    :return: list of dicts returned by decodePacketBlock() for the blocks of the shard together with the (bCi, nScan) states after each block, \
+crc error and channel index error counts of the shard and the printed messages
+    """
+
+    filename, start, end, shardState, params, chunkSize = args
+    state = readoutState(params[1])
+    state['bCi'], state['nScan'] = shardState
+    blocks = []
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        with open(filename, 'rb') as f:
+            f.seek(start)
+            for raw in readRawBlocks(f, chunkSize, end):
+                if len(raw) > 0:
+                    blocks.append((decodePacketBlock(raw, state, *params), state['bCi'], state['nScan']))
+    return blocks, state['crcError'], state['indexOut'], output.getvalue()
+
+def dataReadoutShards(filename, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0, \
+                      chunkSize = 1 << 26, jobs = 1):
+
+    """
+    Generator for reading out single Grid raw output file with the packets of byte-range shards decoded in parallel, the telemetry crc repair \
+is then done over all shards in the order of the file so that the result is the same as dataReadoutChunks()
+    :param filename: name of the output file, currently supporting only .txt files
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part
+    :param scanRange: list containing the scan range for multiple scans
+    :param rateStyle: the style of calculating real count rate, '' for none, 's' for calculation with small data packs(512byte), \
+'p' for calculation with whole data packs
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :param timeCut: cut of time data in seconds, specially designed for temp-bias data with pid bias control(6th ver.)
+    :param chunkSize: size of each read from the file in bytes
+    :param jobs: number of worker processes, also the number of shards
+    :return: yields the decoded data of each block as returned by decodeRawBlock(), at least one block for each file
+    """
+
+    styleAvailable = ['s', 'p', '']
+    if not rateStyle in styleAvailable:
+        raise Exception('dataReadoutShards: count rate calculation style \'' + rateStyle + '\' not available')
+    if jobs <= 1:
+        for block in dataReadoutChunks(filename, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut, chunkSize):
+            yield block
+        return
+
+    bounds = shardBounds(filename, jobs)
+    states = shardStates(filename, bounds, isHex, isCi, isScan, scanRange, chunkSize)
+    params = (isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut)
+    shardArgs = [(filename, bounds[ishard], bounds[ishard + 1], states[ishard], params, chunkSize) for ishard in range(len(bounds) - 1)]
+    state = readoutState(isCi)
+    with processPool(len(shardArgs)) as executor:
+        for blocks, crcError, indexOut, output in executor.map(decodeShard, shardArgs):
+            print(output, end='')
+            state['crcError'] += crcError
+            state['indexOut'] += indexOut
+            for packets, state['bCi'], state['nScan'] in blocks:
+                yield repairTelemetryBlock(packets, state, isHex, newProgramme, timeCut)
+    last = decodePacketBlock(b'', state, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut)
+    yield repairTelemetryBlock(last, state, isHex, newProgramme, timeCut)
+
+#*****************************************************************************************************************************************************
+#*******************************************************************Scan index part*******************************************************************
+#*****************************************************************************************************************************************************
+
+#Version of the scan index files, the index being built again for other versions
+scanIndexVersion = 1
+
+def scanIndexPath(filename):
+
+    """
+    Auxiliary function to get the path of the scan index file of a raw output file, kept beside the raw file
+    :param filename: name of the output file
+    :return: path of the index file
+    """
+
+    return filename + '.gidx'
+
+def buildScanIndex(filename, chunkSize = 1 << 26):
+
+    """
+    Function for building the scan index of a raw output file, i.e. the byte offsets of the lines with 'Begin', 'End' and 'Point' in the file, with \
+only the keywords searched instead of tokenizing the lines
+    :param filename: name of the output file
+    :param chunkSize: size of each read from the file in bytes
+    :return: dict of the index, with the size and modification time of the file and the sorted line offsets of each keyword
+    """
+
+    stat = os.stat(filename)
+    offsets = {'Begin': [], 'End': [], 'Point': []}
+    start = 0
+    with open(filename, 'rb') as f:
+        for raw in readRawBlocks(f, chunkSize, stat.st_size):
+            for keyword in offsets:
+                ind = raw.find(keyword.encode())
+                while ind >= 0:
+                    lineStart = start + raw.rfind(b'\n', 0, ind) + 1
+                    if len(offsets[keyword]) == 0 or not offsets[keyword][-1] == lineStart:
+                        offsets[keyword].append(lineStart)
+                    ind = raw.find(keyword.encode(), ind + 1)
+            start += len(raw)
+    index = {'version': scanIndexVersion, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    for keyword in offsets:
+        index[keyword.lower()] = np.array(offsets[keyword], dtype=np.int64)
+    return index
+
+def loadScanIndex(filename, chunkSize = 1 << 26):
+
+    """
+    Function for loading the scan index of a raw output file, with the index built and saved beside the file if not found or out of date
+    :param filename: name of the output file
+    :param chunkSize: size of each read from the file in bytes, see buildScanIndex()
+    :return: dict of the index returned by buildScanIndex()
+    """
+
+    path = scanIndexPath(filename)
+    stat = os.stat(filename)
+    if os.path.isfile(path):
+        try:
+            with np.load(path) as saved:
+                index = {key: saved[key] for key in saved.files}
+            if int(index['version']) == scanIndexVersion and int(index['size']) == stat.st_size and int(index['mtime']) == stat.st_mtime_ns:
+                return index
+        except Exception:
+            pass
+    print('loadScanIndex: building the scan index of ' + filename)
+    index = buildScanIndex(filename, chunkSize)
+    try:
+        with open(path, 'wb') as f:
+            np.savez(f, **index)
+    except OSError:
+        print('loadScanIndex: unable to save the scan index to ' + path + ', the index will be built again for the next readout')
+    return index
+
+def dataReadoutIndexed(filename, index, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0, \
+                       chunkSize = 1 << 26):
+
+    """
+    Generator for reading out the scans in the scan range of a multiple scan file, with only the bytes from the 'Begin' line of the first scan to the \
+'Begin' line of the scan after the last one read according to the scan index, the result being the same as dataReadoutChunks() since the lines out \
+of the scan range are never decoded there
+    :param filename: name of the output file, currently supporting only .txt files
+    :param index: scan index of the file returned by loadScanIndex()
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part, the I-V scan lines out of the scan range also read
+    :param scanRange: list containing the scan range for multiple scans
+    :param rateStyle: the style of calculating real count rate, '' for none, 's' for calculation with small data packs(512byte), \
+'p' for calculation with whole data packs
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :param timeCut: cut of time data in seconds, specially designed for temp-bias data with pid bias control(6th ver.)
+    :param chunkSize: size of each read from the file in bytes
+    :return: yields the decoded data of each block as returned by decodeRawBlock(), at least one block for each file
+    """
+
+    begin = index['begin']
+    point = index['point'] if isScan else np.zeros(0, dtype=np.int64)
+    begin = np.setdiff1d(begin, point) #the I-V scan lines processed before the CI markers
+    size = int(index['size'])
+    start = int(begin[scanRange[0] - 1]) if scanRange[0] - 1 < begin.size else size
+    end = int(begin[scanRange[1]]) if scanRange[1] < begin.size else size
+    state = readoutState(isCi)
+    state['nScan'] = scanRange[0] - 2
+
+    with open(filename, 'rb') as f:
+        #I-V scan lines before the scan range
+        lines = []
+        for offset in point[point < start]:
+            f.seek(offset)
+            lines.append(f.readline().rstrip(b'\n') + b'\n')
+        if not len(lines) == 0:
+            yield decodeRawBlock(b''.join(lines), state, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut)
+
+        #Scans in the scan range
+        f.seek(start)
+        for raw in readRawBlocks(f, chunkSize, end):
+            if len(raw) > 0:
+                yield decodeRawBlock(raw, state, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut)
+
+        #I-V scan lines after the scan range
+        lines = []
+        for offset in point[point >= end]:
+            f.seek(offset)
+            lines.append(f.readline().rstrip(b'\n') + b'\n')
+        if not len(lines) == 0:
+            yield decodeRawBlock(b''.join(lines), state, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut)
+    state['nScan'] = begin.size - 1
+    yield decodeRawBlock(b'', state, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut)
+
+def decodeFile(filename, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0, \
+               chunkSize = 1 << 26, jobs = 1):
+
+    """
+    Function for decoding single Grid raw output file to flat data, with all blocks returned by dataReadoutChunks() joined together
+    :param filename: name of the output file, currently supporting only .txt files
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part
+    :param scanRange: list containing the scan range for multiple scans
+    :param rateStyle: the style of calculating real count rate, '' for none, 's' for calculation with small data packs(512byte), \
+'p' for calculation with whole data packs
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :param timeCut: cut of time data in seconds, specially designed for temp-bias data with pid bias control(6th ver.)
+    :param chunkSize: size of each read from the file in bytes, see dataReadoutChunks()
+    :param jobs: number of worker processes decoding shards of the file, see dataReadoutShards()
+    :return: dict of the decoded data with the same keys as the blocks returned by decodeRawBlock(), I-V scan data also in the form of ndarray
+    Multiple scan files with a scan range are read with the scan index of the file instead, see dataReadoutIndexed()
+    """
+
+    blocks = {}
     vSet = [] #i-v scan data
-    vScan = [] #i-v scan data
-    iScan = [] #i-v scan data
-    timeCorrect = []
-    effectiveCount = []
-    effectiveCountCI = []
-    missingCount = []
-    missingCountCI = []
+    vScan = [[] for ich in range(4)] #i-v scan data
+    iScan = [[] for ich in range(4)] #i-v scan data
+    if isCi == 2 and not isHex and not len(scanRange) == 0:
+        readout = dataReadoutIndexed(filename, loadScanIndex(filename, chunkSize), isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut, \
+            chunkSize)
+    else:
+        readout = dataReadoutShards(filename, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut, chunkSize, jobs)
+    for block in readout:
+        for key in block:
+            if key in ['vSet', 'vScan', 'iScan', 'crcError', 'indexOut', 'nScan']:
+                continue
+            if not key in blocks:
+                blocks[key] = []
+            blocks[key].append(block[key])
+        vSet += block['vSet']
+        for ich in range(4):
+            vScan[ich] += block['vScan'][ich]
+            iScan[ich] += block['iScan'][ich]
+    decoded = {}
+    for key in blocks:
+        decoded[key] = np.concatenate(blocks[key], axis=-1)
+    del blocks
+    decoded['vSet'] = np.array(vSet)
+    decoded['vScan'] = np.array(vScan)
+    decoded['iScan'] = np.array(iScan)
+    for key in ['crcError', 'indexOut', 'nScan']:
+        decoded[key] = block[key]
+    return decoded
+
+def applyTimeCut(decoded, timeCut = -1.0):
 
-    if isCi == 2:
-        ranged = False
-        if not len(scanRange) == 0:
-            ranged = True
-            lower = scanRange[0] - 1
-            upper = scanRange[1] - 1
+    """
+    Function for applying the time cut on decoded data, with the same result as decoding with the time cut
+    :param decoded: dict of the decoded data returned by decodeFile() without time cut
+    :param timeCut: cut of time data in seconds, CI data not cut
+    :return: dict of the decoded data with the time cut, decoded itself if nothing is cut
+    """
 
-    for ich in range(4):
-        amp.append([])
-        ampCI.append([])
-        tempSipm.append([])
-        tempAdc.append([])
-        vMon.append([])
-        iMon.append([])
-        bias.append([])
-        uscountEvt.append([])
-        uscountEvtCI.append([])
-        vScan.append([])
-        iScan.append([])
+    qEvt = decoded['evtCi'] + (decoded['uscountRaw'].astype(np.float64) / 24.05e6 > timeCut)
+    qTel = decoded['uscount'] > timeCut
+    if np.all(qEvt) and np.all(qTel):
+        return decoded
+    cut = dict(decoded)
+    for key in ['ch', 'amp', 'uscountRaw', 'evtScan', 'evtCi']:
+        cut[key] = decoded[key][qEvt]
+    for key in ['uscount', 'telScan']:
+        cut[key] = decoded[key][qTel]
+    for key in ['tempSipm', 'tempAdc', 'vMon', 'iMon', 'bias']:
+        cut[key] = decoded[key][:, qTel]
+    return cut
+
+#*****************************************************************************************************************************************************
+#****************************************************************Live tail readout part***************************************************************
+#*****************************************************************************************************************************************************
+
+def tailState(filename, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0):
+
+    """
+    Function for creating the state of a live readout following a raw output file still being written, see tailReadout()
+    :param filename: name of the output file, currently supporting only .txt files
+    :param isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut: see dataReadout()
+    :return: dict of the live readout state, including the byte offset decoded so far, the readout state of decodeRawBlock() carried to the next \
+poll, the running full resolution spectra of all 4 channels(and of the CI data), the uscount of the first and last events of each channel in \
+seconds, the number of events decoded so far, and with rateStyle the running sum and number of the live time intervals above the dead time along \
+with the live time data kept for the final outlier cut, see tailLiveTime()
+    """
+
+    styleAvailable = ['s', 'p', '']
+    if not rateStyle in styleAvailable:
+        raise Exception('tailState: count rate calculation style \'' + rateStyle + '\' not available')
+    tail = {
+        'filename':     filename,
+        'params':       (isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut),
+        'offset':       0,
+        'state':        readoutState(isCi),
+        'full':         np.zeros((4, 65536), dtype=np.int64),
+        'fullCI':       np.zeros((4, 65536), dtype=np.int64),
+        'first':        np.full(4, np.nan),
+        'last':         np.full(4, np.nan),
+        'events':       0,
+        'timeSum':      0.0,
+        'timeCount':    0,
+        'timeCorrect':  [],
+    }
+    return tail
+
+def tailReadout(tail, chunkSize = 1 << 26):
+
+    """
+    Function for decoding the lines appended to a raw output file since the last call, with the readout state(CI flag, scan number and telemetry \
+crc repair buffers) carried over and the running spectra and live time updated from the new events only, so that each poll costs the new data only
+    :param tail: live readout state returned by tailState(), updated in place
+    :param chunkSize: size of each read from the file in bytes
+    :return: number of new bytes decoded, the incomplete last line left to the next call
+    The running spectra are the same as fullSpectrum() of the amplitudes of dataReadout() once the file is complete, and can be rebinned by \
+getSpectrum() with full, and the live time of each channel is tail['last'] - tail['first'] as the time of the spectra in the fit session, with \
+the rate-corrected live time estimate of tailLiveTime() updated from the live time data of the new events as well if rateStyle is given
+    """
+
+    start = tail['offset']
+    with open(tail['filename'], 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < start:
+            raise Exception('tailReadout: file ' + tail['filename'] + ' truncated since the last readout')
+        f.seek(start)
+        for raw in readRawBlocks(f, chunkSize, size):
+            if not raw.endswith(b'\n'):
+                break
+            block = decodeRawBlock(raw, tail['state'], *tail['params'])
+            tail['offset'] += len(raw)
+
+            #Running spectra and live time from the new events
+            ch = block['ch'].astype(np.int64)
+            valid = (ch >= 1) * (ch <= 4)
+            for ci, key in [(False, 'full'), (True, 'fullCI')]:
+                q = valid * (block['evtCi'] == ci)
+                tail[key] += np.bincount((ch[q] - 1) * 65536 + block['amp'][q].astype(np.int64), minlength=4 * 65536).reshape(4, 65536)
+            q = valid * ~block['evtCi']
+            for ich in range(4):
+                uscountEvt = block['uscountRaw'][q][ch[q] == ich + 1]
+                if uscountEvt.size > 0:
+                    if np.isnan(tail['first'][ich]):
+                        tail['first'][ich] = uscountEvt[0] / 24.05e6
+                    tail['last'][ich] = uscountEvt[-1] / 24.05e6
+            tail['events'] += int(np.sum(q))
+
+            #Running sum and number of the live time intervals above the dead time, as the mean of estimateLiveTime()
+            rateStyle = tail['params'][4]
+            if not rateStyle == '':
+                C = 50e-6
+                offset = C if rateStyle == 's' else 43 * C
+                timeCorrect = block['timeCorrect']
+                tail['timeCorrect'].append(timeCorrect)
+                tail['timeSum'] += float(np.sum(timeCorrect[timeCorrect > offset] - offset))
+                tail['timeCount'] += int(np.sum(timeCorrect > offset))
+    return tail['offset'] - start
+
+def tailLiveTime(tail, final = False):
+
+    """
+    Function for getting the live time parameter b of the count rate correction of a live readout, as the running mean of the live time intervals \
+kept by tailReadout(), or with final as estimateLiveTime() of all live time data after the outlier cut of dataReadout()
+    :param tail: live readout state returned by tailState() and updated by tailReadout()
+    :param final: boolean indicating whether the outlier cut is applied to all live time data, to be used once the file is complete
+    :return: b, its error and the number of live time data used, as a tuple, with b 0.0 if there is no live time data above the dead time yet
+    """
+
+    rateStyle = tail['params'][4]
+    if rateStyle == '':
+        raise Exception('tailLiveTime: count rate calculation style not specified for the live readout of ' + tail['filename'])
+    if final:
+        timeCorrect = np.concatenate(tail['timeCorrect']) if len(tail['timeCorrect']) > 0 else np.zeros(0)
+        if len(timeCorrect) > 0:
+            timeCorrect = timeCorrect[(timeCorrect > 0) * (timeCorrect < 20 * np.std(timeCorrect))]
+        return estimateLiveTime(timeCorrect, rateStyle)
+    if tail['timeCount'] == 0:
+        return 0.0, 0.0, 0
+    shape = 1 if rateStyle == 's' else 43
+    b = tail['timeSum'] / tail['timeCount'] / shape
+    return b, b / np.sqrt(shape * tail['timeCount']), tail['timeCount']
+
+#*****************************************************************************************************************************************************
+#**************************************************************Decoded readout cache part*************************************************************
+#*****************************************************************************************************************************************************
+
+readoutCacheVersion = 3 #to be increased whenever the decoded data format changes, so that old cache entries are no longer used
+
+#Running total size of each cache directory in bytes, counted by pruneReadoutCache() and increased by each entry saved since
+cacheTotal = {}
+
+def readoutCacheKey(filename, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0):
+
+    """
+    Function for getting the cache key of a raw output file readout, with the hash of the file content and the hash of the readout parameters
+    :param filename: name of the output file
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part
+    :param scanRange: list containing the scan range for multiple scans
+    :param rateStyle: the style of calculating real count rate
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :param timeCut: cut of time data in seconds
+    :return: the cache key string
+    """
+
+    fileHash = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(1 << 24)
+            if not data:
+                break
+            fileHash.update(data)
+    params = repr((readoutCacheVersion, bool(isHex), int(isCi), bool(isScan), [int(x) for x in scanRange], rateStyle, bool(newProgramme), \
+        float(timeCut)))
+    return fileHash.hexdigest() + '_' + hashlib.sha1(params.encode()).hexdigest()[:16]
+
+def loadReadoutCache(cacheDir, key):
+
+    """
+    Function for loading decoded data from the cache, with the arrays memory-mapped
+    :param cacheDir: directory of the cache
+    :param key: cache key returned by readoutCacheKey()
+    :return: dict of the decoded data as returned by decodeFile(), None if the entry is not found or broken
+    """
+
+    entry = os.path.join(cacheDir, key)
+    infoFile = os.path.join(entry, 'info.json')
+    if not os.path.isfile(infoFile):
+        return None
+    try:
+        with open(infoFile) as f:
+            info = json.load(f)
+        decoded = {}
+        for name in info['arrays']:
+            decoded[name] = np.load(os.path.join(entry, name + '.npy'), mmap_mode='r')
+        for name in info['counts']:
+            decoded[name] = info['counts'][name]
+        os.utime(infoFile) #marking the entry as recently used
+    except:
+        print('loadReadoutCache: unable to load cache entry ' + key + ', the file will be decoded again')
+        return None
+    return decoded
+
+def pruneReadoutCache(cacheDir, cacheSize = 2048):
+
+    """
+    Function for limiting the size of the cache, with the least recently used entries removed first and the total size left recorded in cacheTotal
+    :param cacheDir: directory of the cache
+    :param cacheSize: maximum total size of the cache in MB
+    :return: number of entries removed
+    """
+
+    if not os.path.isdir(cacheDir):
+        return 0
+    entries = []
+    for key in os.listdir(cacheDir):
+        entry = os.path.join(cacheDir, key)
+        infoFile = os.path.join(entry, 'info.json')
+        if not os.path.isfile(infoFile):
+            continue
+        size = sum([os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry)])
+        entries.append((os.path.getmtime(infoFile), size, key))
+    entries.sort()
+    total = sum([entry[1] for entry in entries])
+    nRemoved = 0
+    while total > cacheSize * 1024 ** 2 and nRemoved < len(entries):
+        shutil.rmtree(os.path.join(cacheDir, entries[nRemoved][2]), ignore_errors=True)
+        total -= entries[nRemoved][1]
+        nRemoved += 1
+    cacheTotal[os.path.realpath(cacheDir)] = total
+    if nRemoved > 0:
+        print('pruneReadoutCache: ' + str(nRemoved) + ' cache entries removed to keep the cache within ' + str(cacheSize) + 'MB')
+    return nRemoved
+
+def addCacheEntry(cacheDir, key, cacheSize = 2048):
+
+    """
+    Function for counting a newly saved entry in the running total size of the cache, with the cache directory only listed and pruned by \
+pruneReadoutCache() at the first save of the run and whenever the total exceeds the maximum size
+    :param cacheDir: directory of the cache
+    :param key: cache key of the saved entry
+    :param cacheSize: maximum total size of the cache in MB
+    :return: number of entries removed
+    """
+
+    cachePath = os.path.realpath(cacheDir)
+    if cachePath in cacheTotal:
+        entry = os.path.join(cacheDir, key)
+        cacheTotal[cachePath] += sum([os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry)])
+        if cacheTotal[cachePath] <= cacheSize * 1024 ** 2:
+            return 0
+    return pruneReadoutCache(cacheDir, cacheSize)
+
+def saveReadoutCache(cacheDir, key, decoded, filename = '', cacheSize = 2048):
+
+    """
+    Function for saving decoded data to the cache, with each array saved as .npy file for memory-mapped loading
+    :param cacheDir: directory of the cache
+    :param key: cache key returned by readoutCacheKey()
+    :param decoded: dict of the decoded data returned by decodeFile()
+    :param filename: name of the raw output file, recorded for invalidation with clearReadoutCache()
+    :param cacheSize: maximum total size of the cache in MB
+    :return: True if the entry is saved, False if not
+    """
+
+    entry = os.path.join(cacheDir, key)
+    temp = entry + '.tmp' + str(os.getpid())
+    try:
+        os.makedirs(temp, exist_ok=True)
+        info = {
+            'filename':     os.path.realpath(filename),
+            'arrays':       [],
+            'counts':       {},
+        }
+        for name in decoded:
+            if isinstance(decoded[name], np.ndarray):
+                np.save(os.path.join(temp, name + '.npy'), decoded[name])
+                info['arrays'].append(name)
+            else:
+                info['counts'][name] = int(decoded[name])
+        with open(os.path.join(temp, 'info.json'), 'w') as f:
+            json.dump(info, f)
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        os.rename(temp, entry)
+    except:
+        print('saveReadoutCache: unable to save cache entry ' + key)
+        shutil.rmtree(temp, ignore_errors=True)
+        return False
+    addCacheEntry(cacheDir, key, cacheSize)
+    return True
+
+def clearReadoutCache(cacheDir, filename = ''):
+
+    """
+    Function for invalidating cache entries
+    :param cacheDir: directory of the cache
+    :param filename: name of the raw output file whose entries(readout entries and fit entries of its spectra) are to be removed, all entries will \
+be removed if not given
+    :return: number of entries removed
+    """
+
+    if not os.path.isdir(cacheDir):
+        return 0
+    nRemoved = 0
+    for key in os.listdir(cacheDir):
+        entry = os.path.join(cacheDir, key)
+        if not os.path.isdir(entry):
+            continue
+        if not filename == '':
+            try:
+                with open(os.path.join(entry, 'info.json')) as f:
+                    info = json.load(f)
+                if not os.path.realpath(filename) in (info['filenames'] if 'filenames' in info else [info['filename']]):
+                    continue
+            except:
+                continue
+        shutil.rmtree(entry, ignore_errors=True)
+        nRemoved += 1
+    return nRemoved
+
+#*****************************************************************************************************************************************************
+#****************************************************************Fit result cache part***************************************************************
+#*****************************************************************************************************************************************************
+
+fitCacheVersion = 1 #to be increased whenever the fit procedure or the fit result format changes, so that old cache entries are no longer used
+
+def fitCacheKey(spectrum, bkgSpectrum, options):
+
+    """
+    Function for getting the cache key of a spectrum fit, with the hash of the binned spectra and the hash of the fit options
+    :param spectrum: binned spectrum(or spectra of all 4 channels) to be fitted, in counts
+    :param bkgSpectrum: binned background spectrum in the same form as spectrum, None for no background
+    :param options: dict of all fit options affecting the fit results, with values of numbers, strings, lists, dicts or ndarrays
+    :return: the cache key string, in the form of 'fit_' + hash to be kept apart from readout cache entries in the same directory
+    """
+
+    dataHash = hashlib.sha1()
+    dataHash.update(np.ascontiguousarray(spectrum, dtype=np.float64).tobytes())
+    if bkgSpectrum is not None:
+        dataHash.update(np.ascontiguousarray(bkgSpectrum, dtype=np.float64).tobytes())
+    params = json.dumps([fitCacheVersion, options], sort_keys=True, default=lambda value: np.asarray(value).tolist())
+    return 'fit_' + dataHash.hexdigest() + '_' + hashlib.sha1(params.encode()).hexdigest()[:16]
+
+def loadFitCache(cacheDir, key):
+
+    """
+    Function for loading fit results from the cache
+    :param cacheDir: directory of the cache
+    :param key: cache key returned by fitCacheKey()
+    :return: fit results and plot data as returned by fitSpectrum() with deferPlot, None if the entry is not found or broken
+    """
+
+    entry = os.path.join(cacheDir, key)
+    infoFile = os.path.join(entry, 'info.json')
+    if not os.path.isfile(infoFile):
+        return None
+    try:
+        with open(os.path.join(entry, 'fit.pkl'), 'rb') as f:
+            fitResult, plotData = pickle.load(f)
+        os.utime(infoFile) #marking the entry as recently used
+    except:
+        print('loadFitCache: unable to load cache entry ' + key + ', the spectrum will be fitted again')
+        return None
+    return fitResult, plotData
+
+def saveFitCache(cacheDir, key, fitResult, plotData, sourceFiles = [], cacheSize = 2048):
+
+    """
+    Function for saving fit results to the cache, in the same entry layout as the readout cache so that both are limited together by \
+pruneReadoutCache() and removed by clearReadoutCache()
+    :param cacheDir: directory of the cache
+    :param key: cache key returned by fitCacheKey()
+    :param fitResult: fit results returned by fitSpectrum()
+    :param plotData: plot data of the fit for plotSpectrumFit()
+    :param sourceFiles: names of the raw output files of the fitted spectra(data and background), recorded for invalidation with clearReadoutCache()
+    :param cacheSize: maximum total size of the cache in MB
+    :return: True if the entry is saved, False if not
+    """
+
+    entry = os.path.join(cacheDir, key)
+    temp = entry + '.tmp' + str(os.getpid())
+    try:
+        os.makedirs(temp, exist_ok=True)
+        with open(os.path.join(temp, 'fit.pkl'), 'wb') as f:
+            pickle.dump((fitResult, plotData), f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(temp, 'info.json'), 'w') as f:
+            json.dump({'filenames': [os.path.realpath(file) for file in sourceFiles], 'fit': plotData['filename']}, f)
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        os.rename(temp, entry)
+    except:
+        print('saveFitCache: unable to save cache entry ' + key)
+        shutil.rmtree(temp, ignore_errors=True)
+        return False
+    addCacheEntry(cacheDir, key, cacheSize)
+    return True
+
+#*****************************************************************************************************************************************************
+#*******************************************************************Ragged array part****************************************************************
+#*****************************************************************************************************************************************************
+
+class RaggedArray:
+
+    """
+    Container of nested data whose innermost 1-D data differ in length, e.g. [channel][scan][event], with all innermost data kept in one flat \
+ndarray and located by their start and end offsets
+    Indexing the outer levels works like ndarray(integers, slices, index arrays and masks), returning either a RaggedArray of the selected \
+innermost data or the innermost data itself, both as views of the flat data without copying
+    """
+
+    def __init__(self, data, start, end):
+
+        """
+        :param data: flat 1-D ndarray holding all innermost data
+        :param start: ndarray in the outer shape, start offsets of the innermost data in the flat data
+        :param end: ndarray in the outer shape, end offsets of the innermost data in the flat data
+        """
+
+        self.data = data
+        self.start = np.asarray(start)
+        self.end = np.asarray(end)
+        self.shape = self.start.shape
+        self.ndim = self.start.ndim
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        start = self.start[index]
+        end = self.end[index]
+        if np.ndim(start) == 0:
+            return self.data[start:end]
+        return RaggedArray(self.data, start, end)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __reduce__(self):
+        #only the innermost data covered are pickled, so that sending e.g. a single scan to a worker process does not copy the whole file
+        start = self.start.reshape(-1)
+        end = self.end.reshape(-1)
+        size = end - start
+        if np.sum(size) >= len(self.data):
+            return RaggedArray, (self.data, self.start, self.end)
+        data = np.concatenate([self.data[start[i]:end[i]] for i in range(len(start))] + [self.data[:0]])
+        end = np.cumsum(size)
+        return RaggedArray, (data, (end - size).reshape(self.shape), end.reshape(self.shape))
+
+def buildRagged(data, depth):
+
+    """
+    Auxiliary function to build RaggedArray from nested lists of 1-D data, copying all innermost data into one flat ndarray
+    :param data: nested lists(or RaggedArray, ndarray) with 1-D ndarrays as the innermost elements
+    :param depth: number of nested list levels above the innermost data
+    :return: the corresponding RaggedArray
+    """
+
+    shape = []
+    level = data
+    for idepth in range(depth):
+        shape.append(len(level))
+        if len(level) == 0:
+            break
+        level = level[0]
+    shape = tuple(shape + [0] * (depth - len(shape)))
+    leaves = [data]
+    for idepth in range(depth):
+        leaves = [sub for item in leaves for sub in item]
+    size = np.array([len(leaf) for leaf in leaves], dtype=np.int64)
+    end = np.cumsum(size)
+    flat = np.concatenate(leaves) if len(leaves) > 0 else np.zeros(0)
+    return RaggedArray(flat, (end - size).reshape(shape), end.reshape(shape))
+
+def splitRagged(data, group, shape):
+
+    """
+    Auxiliary function to build RaggedArray from flat data sorted by group, without copying the data
+    :param data: 1-D ndarray of the flat data
+    :param group: 1-D ndarray of the group of each datum in ascending order, being the index of its innermost data in the flattened outer shape, \
+data with groups out of [0, size of outer shape) are left out
+    :param shape: outer shape of the RaggedArray
+    :return: the corresponding RaggedArray
+    """
+
+    bounds = np.searchsorted(group, np.arange(int(np.prod(shape)) + 1))
+    return RaggedArray(data, bounds[:-1].reshape(shape), bounds[1:].reshape(shape))
+
+#*****************************************************************************************************************************************************
+#*******************************************************************Event table part*****************************************************************
+#*****************************************************************************************************************************************************
+
+#Structured type of the event table, with channel in [0-3], raw uscount in clock ticks(24.05MHz), ADC amplitude, CI flag and scan index
+eventDtype = np.dtype([('ch', np.uint8), ('uscount', np.uint64), ('amp', np.uint16), ('ci', np.bool_), ('scan', np.int32)])
+
+def eventGroupKey(ich, isc, ci):
+
+    """
+    Auxiliary function for the sort key of the event table, grouping the events by CI flag, channel and scan
+    :param ich: channel number in [0-3]
+    :param isc: scan index, -1 for files without multiple scans
+    :param ci: CI flag
+    :return: the sort key(s) in int64
+    """
+
+    return (np.asarray(ci, dtype=np.int64) << 40) + (np.asarray(ich, dtype=np.int64) << 32) + np.asarray(isc, dtype=np.int64) + 1
+
+def buildEventTable(decoded):
+
+    """
+    Function for building the event table from decoded data, sorted once by CI flag, channel and scan with the time order kept in each group, \
+so that the events of any channel and scan are a contiguous slice of the table
+    :param decoded: dict of the decoded data returned by decodeFile()
+    :return: event table in the form of structured ndarray of eventDtype(events with channel out of bound[0-3] excluded), and the index of the \
+table as a dict holding the sort key, start and end of every group
+    """
+
+    q = (decoded['ch'] >= 1) * (decoded['ch'] <= 4)
+    events = np.empty(int(np.sum(q)), dtype=eventDtype)
+    events['ch'] = decoded['ch'][q] - 1
+    events['uscount'] = decoded['uscountRaw'][q]
+    events['amp'] = decoded['amp'][q]
+    events['ci'] = decoded['evtCi'][q]
+    events['scan'] = decoded['evtScan'][q]
+    key = eventGroupKey(events['ch'], events['scan'], events['ci'])
+    order = np.argsort(key, kind='stable')
+    events = events[order]
+    groups, start = np.unique(key[order], return_index=True)
+    eventIndex = {
+        'groups':   groups,
+        'start':    start,
+        'end':      np.append(start[1:], events.size).astype(np.int64),
+    }
+    return events, eventIndex
+
+def eventView(events, eventIndex, ich, isc = -1, ci = False):
+
+    """
+    Function for getting the events of a channel and a scan from the event table, without copying
+    :param events: event table returned by buildEventTable()
+    :param eventIndex: index of the event table returned by buildEventTable()
+    :param ich: channel number in [0-3]
+    :param isc: scan index, -1 for files without multiple scans
+    :param ci: boolean indicating whether to get the CI events
+    :return: view of the event table holding the events of the group in time order
+    """
 
-    bCi = True
-    if isCi == 0:
-        bCi = False
-    if isHex: #in hexprint files there is no CI and I-V scan part
-        isCi = 0
-        isScan = False
-    nScan = -1
-    indexOut = 0 #count of events with channel index out of range[1-4]
-    crcError = 0 #count of crc error data
+    key = eventGroupKey(ich, isc, ci)
+    igroup = int(np.searchsorted(eventIndex['groups'], key))
+    if igroup < eventIndex['groups'].size and eventIndex['groups'][igroup] == key:
+        return events[eventIndex['start'][igroup]:eventIndex['end'][igroup]]
+    return events[0:0]
 
-    for line in lines:
-        #I-V scan
-        if isScan and 'Point' in line:
-            lineList = line.split(',')
-            scanData = []
-            bScan = True #ensuring that corrupted data are disposed
-            try:
-                scanData.append(int(lineList[3]))
-                scanList = lineList[4].split()
-                for iscan in range(4):
-                    scanData.append(float(scanList[2 * iscan]) / 4096.0 * 3.3 * 11.0)
-                    scanData.append(float(scanList[1 + 2 * iscan]) / 4096.0 * 2.0 * 3.3)
-            except:
-                #print('Scan data error') #Debug
-                bScan = False
-            if bScan:
-                vSet.append(scanData[0])
-                for ich in range(4):
-                    vScan[ich].append(scanData[1 + 2 * iscan])
-                    iScan[ich].append([scanData[2 + 2 * iscan]])
-            continue
+def decodeReadout(filename, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, chunkSize = 1 << 26, \
+                  cacheDir = '', cacheSize = 2048, jobs = 1):
 
-        #begin and end of CI, also scan counts for multiple scans
-        if isCi == 2 and 'Begin' in line:
-            bCi = True
-            nScan += 1
-            if ranged and not (nScan >= lower and nScan <= upper):
-                print('Skipping run #' + str(nScan + 1))
-            else:
-                print('Run #' + str(nScan + 1))
-            uscount.append([])
-            if not rateStyle == '':
-                timeCorrect.append([])
-            if newProgramme:
-                effectiveCount.append([])
-                effectiveCountCI.append([])
-                missingCount.append([])
-                missingCountCI.append([])
-            for ich in range(4):
-                amp[ich].append([])
-                ampCI[ich].append([])
-                tempSipm[ich].append([])
-                tempAdc[ich].append([])
-                vMon[ich].append([])
-                iMon[ich].append([])
-                bias[ich].append([])
-                uscountEvt[ich].append([])
-                uscountEvtCI[ich].append([])
-            continue
-        elif 'End' in line:
-            bCi = False
-            continue
+    """
+    Function for decoding single Grid raw output file without time cut, with the decoded data loaded from or saved to the readout cache
+    :param filename: name of the output file, currently supporting only .txt files
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part
+    :param scanRange: list containing the scan range for multiple scans
+    :param rateStyle: the style of calculating real count rate, '' for none, 's' for calculation with small data packs(512byte), \
+'p' for calculation with whole data packs
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :param chunkSize: size of each read from the file in bytes, see dataReadoutChunks()
+    :param cacheDir: directory of the decoded readout cache, '' for no cache
+    :param cacheSize: maximum total size of the cache in MB
+    :param jobs: number of worker processes decoding shards of the file, see dataReadoutShards()
+    :return: dict of the decoded data as returned by decodeFile(), shared by the readouts with different time cuts
+    """
 
-        #Readout of single line
-        lineList = line.split(' ')
-        if len(lineList) > 502:
-            if not isHex:
-                #non-hexprint
-                if isCi == 2 and ranged:
-                    if not (nScan >= lower and nScan <= upper):
-                        continue
-                lineFloat = []
-                try:
-                    for linestr in lineList:
-                        lineFloat.append(int(linestr))
-                except:
-                    pass
+    decoded = None
+    if not cacheDir == '':
+        key = readoutCacheKey(filename, isHex, isCi, isScan, scanRange, rateStyle, newProgramme)
+        decoded = loadReadoutCache(cacheDir, key)
+        if decoded is not None:
+            print('decodeReadout: decoded data loaded from cache ' + os.path.join(cacheDir, key))
+    if decoded is None:
+        decoded = decodeFile(filename, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, -1.0, chunkSize, jobs)
+        if not cacheDir == '':
+            saveReadoutCache(cacheDir, key, decoded, filename, cacheSize)
+    return decoded
+
+def dataReadout(filename, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0, \
+                chunkSize = 1 << 26, cacheDir = '', cacheSize = 2048, jobs = 1, eventTable = False, ragged = False, decoded = None):
 
-                for il in range(len(lineFloat)):
-                    #Evevt data
-                    if (lineFloat[il] == 170 and lineFloat[il + 1] == 187 and lineFloat[il + 2] == 204) and \
-                        ((il + 502 <= len(lineFloat) and lineFloat[il + 499] == 221 and lineFloat[il + 500] == 238 and lineFloat[il + 501] == 255 and (not newProgramme)) \
-                        or (il + 510 <= len(lineFloat) and lineFloat[il + 507] == 221 and lineFloat[il + 508] == 238 and lineFloat[il + 509] == 255 and newProgramme)):
-                            timeEvtBegin = 0.0
-                            timeEvtEnd = 0.0
-                            timeIntv = []
-                            if not newProgramme:
-                                #crc check and crc buffer fill
-                                if len(dataBuffer) >= bufferLen:
-                                    del dataBuffer[0]
-                                dataBuffer.append(lineFloat[496:504])
-                                #check the previous telemetry data
-                                for buf in lineBuffer:
-                                    if buf[498:504] == lineFloat[498:504]:
-                                        bufMatch = buf
-                                        bufcrc = buf[496:498]
-                                        bufMatch[496:498] = lineFloat[496:498]
-                                        if not crcCheck(bufMatch[0:510], bufcrc):
-                                            crcError += 1
-                                            del lineBuffer[lineBuffer.index(buf)]
-                                        else:
-                                            if isCi == 2:
-                                                for it in range(7):
-                                                    uscount[nScan].append(float(sum([buf[15 + 70 * it + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                                    for ich in range(4):
-                                                        tempSipm[ich][nScan].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                            if buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] > 2048 \
-                                                            else tempSipm[ich][nScan].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it]) / 16.0)
-                                                        tempAdc[ich][nScan].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                            if buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] > 2048 \
-                                                            else tempAdc[ich][nScan].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it]) / 16.0)
-                                                        vMon[ich][nScan].append(float(buf[39 + 2 * ich + 70 * it] * 256 + buf[40 + 2 * ich + 70 * it]) / 4096.0 * 3.3 * 11.0)
-                                                        iMon[ich][nScan].append(float(buf[47 + 2 * ich + 70 * it] * 256 + buf[48 + 2 * ich + 70 * it]) / 4096.0 * 3.3)
-                                                        bias[ich][nScan].append(vMon[ich][nScan][-1] - iMon[ich][nScan][-1])
-                                            else:
-                                                for it in range(7):
-                                                    uscount.append(float(sum([buf[15 + 70 * it + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                                    for ich in range(4):
-                                                        tempSipm[ich].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                            if buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] > 2048 \
-                                                            else tempSipm[ich].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it]) / 16.0)
-                                                        tempAdc[ich].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                            if buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] > 2048 \
-                                                            else tempAdc[ich].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it]) / 16.0)
-                                                        vMon[ich].append(float(buf[39 + 2 * ich + 70 * it] * 256 + buf[40 + 2 * ich + 70 * it]) / 4096.0 * 3.3 * 11.0)
-                                                        iMon[ich].append(float(buf[47 + 2 * ich + 70 * it] * 256 + buf[48 + 2 * ich + 70 * it]) / 4096.0 * 3.3)
-                                                        bias[ich].append(vMon[ich][-1] - iMon[ich][-1])
-                                            del lineBuffer[lineBuffer.index(buf)]
-                                        break
-                                if not crcCheck(lineFloat[:502], lineFloat[502:504]):
-                                    crcError += 1
-                                    continue
-                            else:
-                                if not crcCheck(lineFloat[:510], lineFloat[510:512]):
-                                    crcError += 1
-                                    continue
-                            ch = lineFloat[il + 3]
-                            if newProgramme:
-                                ch += 1
-                            if isCi == 2:
-                                if ch > 0 and ch < 5:
-                                    if bCi:
-                                        ampCI[ch - 1][nScan].append(lineFloat[il + 12] * 256 + lineFloat[il + 13])
-                                        uscountEvtCI[ch - 1][nScan].append(float(sum([lineFloat[il + 4 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                    else:
-                                        amp[ch - 1][nScan].append(lineFloat[il + 12] * 256 + lineFloat[il + 13])
-                                        uscountEvt[ch - 1][nScan].append(float(sum([lineFloat[il + 4 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                else:
-                                    indexOut += 1
-                            else:
-                                if ch > 0 and ch < 5:
-                                    if bCi:
-                                        ampCI[ch - 1].append(lineFloat[il + 12] * 256 + lineFloat[il + 13])
-                                        uscountEvtCI[ch - 1].append(float(sum([lineFloat[il + 4 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                    else:
-                                        amp[ch - 1].append(lineFloat[il + 12] * 256 + lineFloat[il + 13])
-                                        uscountEvt[ch - 1].append(float(sum([lineFloat[il + 4 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                else:
-                                    indexOut += 1
-                            if rateStyle == 's' and not bCi:
-                                timeIntv.append(float(sum([lineFloat[il + 4 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                            elif rateStyle == 'p' and not bCi:
-                                timeEvtBegin = float(sum([lineFloat[il + 4 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6
-                            for ie in range(43):
-                                ch = lineFloat[il + 26 + 11 * ie]
-                                if newProgramme:
-                                    ch += 1
-                                if isCi == 2:
-                                    if ch > 0 and ch < 5:
-                                        if bCi:
-                                            ampCI[ch - 1][nScan].append(lineFloat[il + 35 + 11 * ie] * 256 + lineFloat[il + 36 + 11 * ie])
-                                            uscountEvtCI[ch - 1][nScan].append(float(sum([lineFloat[il + 27 + 11 * ie + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                        else:
-                                            amp[ch - 1][nScan].append(lineFloat[il + 35 + 11 * ie] * 256 + lineFloat[il + 36 + 11 * ie])
-                                            uscountEvt[ch - 1][nScan].append(float(sum([lineFloat[il + 27 + 11 * ie + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                    else:
-                                        indexOut += 1
-                                else:
-                                    if ch > 0 and ch < 5:
-                                        if bCi:
-                                            ampCI[ch - 1].append(lineFloat[il + 35 + 11 * ie] * 256 + lineFloat[il + 36 + 11 * ie])
-                                            uscountEvtCI[ch - 1].append(float(sum([lineFloat[il + 27 + 11 * ie + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                        else:
-                                            amp[ch - 1].append(lineFloat[il + 35 + 11 * ie] * 256 + lineFloat[il + 36 + 11 * ie])
-                                            uscountEvt[ch - 1].append(float(sum([lineFloat[il + 27 + 11 * ie + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                    else:
-                                        indexOut += 1
-                                if rateStyle == 's' and not bCi:
-                                    timeIntv.append(float(sum([lineFloat[il + 27 + 11 * ie + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                            if rateStyle == 's' and not bCi:
-                                timeIntv = np.array(timeIntv)
-                                if isCi == 2:
-                                    timeCorrect[nScan] += list(timeIntv[1:] - timeIntv[:-1])
-                                else:
-                                    timeCorrect += list(timeIntv[1:] - timeIntv[:-1])
-                            elif rateStyle == 'p' and not bCi:
-                                timeEvtEnd = float(sum([lineFloat[il + 27 + 11 * 42 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6
-                                if isCi == 2:
-                                    timeCorrect[nScan].append(timeEvtEnd - timeEvtBegin)
-                                else:
-                                    timeCorrect.append(timeEvtEnd - timeEvtBegin)
-                            if newProgramme:
-                                if isCi == 2:
-                                    if bCi:
-                                        effectiveCountCI[nScan].append(int(sum([lineFloat[il + 499 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-                                        missingCountCI[nScan].append(int(sum([lineFloat[il + 503 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-                                    else:
-                                        effectiveCount[nScan].append(int(sum([lineFloat[il + 499 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-                                        missingCount[nScan].append(int(sum([lineFloat[il + 503 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-                                else:
-                                    if bCi:
-                                        effectiveCountCI.append(int(sum([lineFloat[il + 499 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-                                        missingCountCI.append(int(sum([lineFloat[il + 503 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-                                    else:
-                                        effectiveCount.append(int(sum([lineFloat[il + 499 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-                                        missingCount.append(int(sum([lineFloat[il + 503 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-
-                    #Telemetry data
-                    elif (lineFloat[il] == 1 and lineFloat[il + 1] == 35 and lineFloat[il + 2] == 69 and il + 502 <= len(lineFloat) and lineFloat[il + 493] == 103 and lineFloat[il + 494] == 137 \
-                        and lineFloat[il + 495] == 16 and (not newProgramme)) or (lineFloat[il] == 18 and lineFloat[il + 1] == 52 and lineFloat[il + 2] == 86 and il + 502 <= len(lineFloat) and \
-                        lineFloat[il + 493] == 120 and lineFloat[il + 494] == 154 and lineFloat[il + 495] == 188 and newProgramme):
-                            if not newProgramme:
-                                #check the data before the current data
-                                crcCorrect = []
-                                for databuf in dataBuffer:
-                                    if databuf[2:] == lineFloat[498:504]:
-                                        crcCorrect = databuf[:2]
-                                        break
-                                #check the previous telemetry data
-                                for buf in lineBuffer:
-                                    if buf[498:504] == lineFloat[498:504]:
-                                        bufMatch = buf
-                                        bufcrc = buf[496:498]
-                                        bufMatch[496:498] = lineFloat[496:498]
-                                        if not crcCheck(bufMatch[0:510], bufcrc):
-                                            crcError += 1
-                                            del lineBuffer[lineBuffer.index(buf)]
-                                        else:
-                                            if isCi == 2:
-                                                for it in range(7):
-                                                    uscount[nScan].append(float(sum([buf[15 + 70 * it + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                                    for ich in range(4):
-                                                        tempSipm[ich][nScan].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                            if buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] > 2048 \
-                                                            else tempSipm[ich][nScan].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it]) / 16.0)
-                                                        tempAdc[ich][nScan].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                            if buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] > 2048 \
-                                                            else tempAdc[ich][nScan].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it]) / 16.0)
-                                                        vMon[ich][nScan].append(float(buf[39 + 2 * ich + 70 * it] * 256 + buf[40 + 2 * ich + 70 * it]) / 4096.0 * 3.3 * 11.0)
-                                                        iMon[ich][nScan].append(float(buf[47 + 2 * ich + 70 * it] * 256 + buf[48 + 2 * ich + 70 * it]) / 4096.0 * 3.3)
-                                                        bias[ich][nScan].append(vMon[ich][nScan][-1] - iMon[ich][nScan][-1])
-                                            else:
-                                                for it in range(7):
-                                                    uscount.append(float(sum([buf[15 + 70 * it + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                                    for ich in range(4):
-                                                        tempSipm[ich].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                            if buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] > 2048 \
-                                                            else tempSipm[ich].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it]) / 16.0)
-                                                        tempAdc[ich].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                            if buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] > 2048 \
-                                                            else tempAdc[ich].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it]) / 16.0)
-                                                        vMon[ich].append(float(buf[39 + 2 * ich + 70 * it] * 256 + buf[40 + 2 * ich + 70 * it]) / 4096.0 * 3.3 * 11.0)
-                                                        iMon[ich].append(float(buf[47 + 2 * ich + 70 * it] * 256 + buf[48 + 2 * ich + 70 * it]) / 4096.0 * 3.3)
-                                                        bias[ich].append(vMon[ich][-1] - iMon[ich][-1])
-                                            del lineBuffer[lineBuffer.index(buf)]
-                                        break
-                                #crc check and crc buffer fill
-                                if len(dataBuffer) >= bufferLen:
-                                    del dataBuffer[0]
-                                dataBuffer.append(lineFloat[496:504])
-                                temp = lineFloat[496:498]
-                                if not len(crcCorrect) == 0:
-                                    lineFloat[496:498] = crcCorrect
-                                else:
-                                    if len(lineBuffer) >= lineLen:
-                                        del lineBuffer[0]
-                                        crcError += 1
-                                    lineBuffer.append(lineFloat)
-                                if not crcCheck(lineFloat[0:510], temp):
-                                    crcError += 1
-                                    continue
-                            else:
-                                if not crcCheck(lineFloat[0:496], lineFloat[496:498]):
-                                    crcError += 1
-                                    continue
-                            for it in range(7):
-                                if isCi == 2:
-                                    uscount[nScan].append(float(sum([lineFloat[il + 15 + 70 * it + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                    for ich in range(4):
-                                        tempSipm[ich][nScan].append(float(lineFloat[il + 23 + 2 * ich + 70 * it] * 256 + lineFloat[il + 24 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                            if lineFloat[il + 23 + 2 * ich + 70 * it] * 256 + lineFloat[il + 24 + 2 * ich + 70 * it] > 2048 \
-                                            else tempSipm[ich][nScan].append(float(lineFloat[il + 23 + 2 * ich + 70 * it] * 256 + lineFloat[il + 24 + 2 * ich + 70 * it]) / 16.0)
-                                        tempAdc[ich][nScan].append(float(lineFloat[il + 31 + 2 * ich + 70 * it] * 256 + lineFloat[il + 32 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                            if lineFloat[il + 31 + 2 * ich + 70 * it] * 256 + lineFloat[il + 32 + 2 * ich + 70 * it] > 2048 \
-                                            else tempAdc[ich][nScan].append(float(lineFloat[il + 31 + 2 * ich + 70 * it] * 256 + lineFloat[il + 32 + 2 * ich + 70 * it]) / 16.0)
-                                        vMon[ich][nScan].append(float(lineFloat[il + 39 + 2 * ich + 70 * it] * 256 + lineFloat[il + 40 + 2 * ich + 70 * it]) / 4096.0 * 3.3 * 11.0)
-                                        iMon[ich][nScan].append(float(lineFloat[il + 47 + 2 * ich + 70 * it] * 256 + lineFloat[il + 48 + 2 * ich + 70 * it]) / 4096.0 * 3.3)
-                                        bias[ich][nScan].append(vMon[ich][nScan][-1] - iMon[ich][nScan][-1] * 2.0)
-                                else:
-                                    uscount.append(float(sum([lineFloat[il + 15 + 70 * it + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                    for ich in range(4):
-                                        tempSipm[ich].append(float(lineFloat[il + 23 + 2 * ich + 70 * it] * 256 + lineFloat[il + 24 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                            if lineFloat[il + 23 + 2 * ich + 70 * it] * 256 + lineFloat[il + 24 + 2 * ich + 70 * it] > 2048 \
-                                            else tempSipm[ich].append(float(lineFloat[il + 23 + 2 * ich + 70 * it] * 256 + lineFloat[il + 24 + 2 * ich + 70 * it]) / 16.0)
-                                        tempAdc[ich].append(float(lineFloat[il + 31 + 2 * ich + 70 * it] * 256 + lineFloat[il + 32 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                            if lineFloat[il + 31 + 2 * ich + 70 * it] * 256 + lineFloat[il + 32 + 2 * ich + 70 * it] > 2048 \
-                                            else tempAdc[ich].append(float(lineFloat[il + 31 + 2 * ich + 70 * it] * 256 + lineFloat[il + 32 + 2 * ich + 70 * it]) / 16.0)
-                                        vMon[ich].append(float(lineFloat[il + 39 + 2 * ich + 70 * it] * 256 + lineFloat[il + 40 + 2 * ich + 70 * it]) / 4096.0 * 3.3 * 11.0)
-                                        iMon[ich].append(float(lineFloat[il + 47 + 2 * ich + 70 * it] * 256 + lineFloat[il + 48 + 2 * ich + 70 * it]) / 4096.0 * 3.3)
-                                        bias[ich].append(vMon[ich][-1] - iMon[ich][-1] * 2.0)
-
-            else: #hexprint
-                lineFloat = []
-                try:
-                    for linestr in lineList:
-                        lineFloat.append(int(linestr, 16))
-                except:
-                    pass
-                il = 0
-                while il + 502 <= len(lineFloat):
-                    #Event data
-                    if (lineFloat[il] == 170 and lineFloat[il + 1] == 187 and lineFloat[il + 2] == 204) and \
-                        ((il + 502 <= len(lineFloat) and lineFloat[il + 499] == 221 and lineFloat[il + 500] == 238 and lineFloat[il + 501] == 255 and (not newProgramme)) \
-                        or (il + 510 <= len(lineFloat) and lineFloat[il + 507] == 221 and lineFloat[il + 508] == 238 and lineFloat[il + 509] == 255 and newProgramme)):
-                            timeEvtBegin = 0.0
-                            timeEvtEnd = 0.0
-                            timeIntv = []
-                            if not newProgramme:
-                                #crc check and crc buffer fill
-                                if len(dataBuffer) >= bufferLen:
-                                    del dataBuffer[0]
-                                dataBuffer.append(lineFloat[il + 496:il + 504])
-                                #check the previous telemetry data
-                                for buf in lineBuffer:
-                                    if buf[498:504] == lineFloat[il + 498:il + 504]:
-                                        bufcrc = buf[496:498]
-                                        buf[496:498] = lineFloat[il + 496:il + 498]
-                                        if not crcCheck(buf[0:510], bufcrc):
-                                            crcError += 1
-                                            del lineBuffer[lineBuffer.index(buf)]
-                                        else:
-                                            for it in range(7):
-                                                uscount.append(float(sum([buf[15 + 70 * it + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                                for ich in range(4):
-                                                    tempSipm[ich].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                        if buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] > 2048 \
-                                                        else tempSipm[ich].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it]) / 16.0)
-                                                    tempAdc[ich].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                        if buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] > 2048 \
-                                                        else tempAdc[ich].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it]) / 16.0)
-                                                    vMon[ich].append(float(buf[39 + 2 * ich + 70 * it] * 256 + buf[40 + 2 * ich + 70 * it]) / 4096.0 * 3.3 * 11.0)
-                                                    iMon[ich].append(float(buf[47 + 2 * ich + 70 * it] * 256 + buf[48 + 2 * ich + 70 * it]) / 4096.0 * 3.3)
-                                                    bias[ich].append(vMon[ich][-1] - iMon[ich][-1])
-                                            del lineBuffer[lineBuffer.index(buf)]
-                                        break
-                                if not crcCheck(lineFloat[il:il + 502], lineFloat[il + 502:il + 504]):
-                                    crcError += 1
-                                    il += 512
-                                    continue
-                            else:
-                                if not crcCheck(lineFloat[il:il + 510], lineFloat[il + 510:il + 512]):
-                                    crcError += 1
-                                    il += 512
-                                    continue
-                            ch = lineFloat[il + 3]
-                            if newProgramme:
-                                ch += 1
-                            if ch > 0 and ch < 5:
-                                amp[ch - 1].append(lineFloat[il + 12] * 256 + lineFloat[il + 13])
-                                uscountEvt[ch - 1].append(float(sum([lineFloat[il + 4 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                            else:
-                                indexOut += 1
-                            if rateStyle == 's':
-                                timeIntv.append(float(sum([lineFloat[il + 4 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                            elif rateStyle == 'p':
-                                timeEvtBegin = float(sum([lineFloat[il + 4 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6
-                            for ie in range(43):
-                                ch = lineFloat[il + 26 + 11 * ie]
-                                if newProgramme:
-                                    ch += 1
-                                if ch > 0 and ch < 5:
-                                    amp[ch - 1].append(lineFloat[il + 35 + 11 * ie] * 256 + lineFloat[il + 36 + 11 * ie])
-                                    uscountEvt[ch - 1].append(float(sum([lineFloat[il + 27 + 11 * ie + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                else:
-                                    indexOut += 1
-                                if rateStyle == 's':
-                                    timeIntv.append(float(sum([lineFloat[il + 27 + 11 * ie + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                            if rateStyle == 's':
-                                timeIntv = np.array(timeIntv)
-                                timeCorrect += list(timeIntv[1:] - timeIntv[:-1])
-                            elif rateStyle == 'p':
-                                timeEvtEnd = float(sum([lineFloat[il + 27 + 11 * 42 + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6
-                                timeCorrect.append(timeEvtEnd - timeEvtBegin)
-                            if newProgramme:
-                                effectiveCount.append(int(sum([lineFloat[il + 499 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-                                missingCount.append(int(sum([lineFloat[il + 503 + ic] * 256 ** (3 - ic) for ic in range(4)])))
-                            il += 511
-                    
-                    #Telemetry data
-                    elif (lineFloat[il] == 1 and lineFloat[il + 1] == 35 and lineFloat[il + 2] == 69 and il + 502 <= len(lineFloat) and lineFloat[il + 493] == 103 and lineFloat[il + 494] == 137 \
-                        and lineFloat[il + 495] == 16 and (not newProgramme)) or (lineFloat[il] == 18 and lineFloat[il + 1] == 52 and lineFloat[il + 2] == 86 and il + 502 <= len(lineFloat) and \
-                        lineFloat[il + 493] == 120 and lineFloat[il + 494] == 154 and lineFloat[il + 495] == 188 and newProgramme):
-                            if not newProgramme:
-                                #check the data before the current data
-                                crcCorrect = []
-                                for i in dataBuffer:
-                                    if i[2:] == lineFloat[il + 498:il + 504]:
-                                        crcCorrect = i[:2]
-                                        break
-                                #check the previous telemetry data
-                                for buf in lineBuffer:
-                                    if buf[498:504] == lineFloat[il + 498:il + 504]:
-                                        bufcrc = buf[496:498]
-                                        buf[496:498] = lineFloat[il + 496:il + 498]
-                                        if not crcCheck(buf[0:510], bufcrc):
-                                            crcError += 1
-                                            del lineBuffer[lineBuffer.index(buf)]
-                                        else:
-                                            for it in range(7):
-                                                uscount.append(float(sum([buf[15 + 70 * it + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                                for ich in range(4):
-                                                    tempSipm[ich].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                        if buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it] > 2048 \
-                                                        else tempSipm[ich].append(float(buf[23 + 2 * ich + 70 * it] * 256 + buf[24 + 2 * ich + 70 * it]) / 16.0)
-                                                    tempAdc[ich].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                                        if buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it] > 2048 \
-                                                        else tempAdc[ich].append(float(buf[31 + 2 * ich + 70 * it] * 256 + buf[32 + 2 * ich + 70 * it]) / 16.0)
-                                                    vMon[ich].append(float(buf[39 + 2 * ich + 70 * it] * 256 + buf[40 + 2 * ich + 70 * it]) / 4096.0 * 3.3 * 11.0)
-                                                    iMon[ich].append(float(buf[47 + 2 * ich + 70 * it] * 256 + buf[48 + 2 * ich + 70 * it]) / 4096.0 * 3.3)
-                                                    bias[ich].append(vMon[ich][-1] - iMon[ich][-1])
-                                            del lineBuffer[lineBuffer.index(buf)]
-                                        break
-                                #crc check and crc buffer fill
-                                if len(dataBuffer) >= bufferLen:
-                                    del dataBuffer[0]
-                                dataBuffer.append(lineFloat[il + 496:il + 504])
-                                temp = lineFloat[il + 496:il + 498]
-                                if not len(crcCorrect) == 0:
-                                    lineFloat[il + 496:il + 498] = crcCorrect
-                                else:
-                                    if len(lineBuffer) >= lineLen:
-                                        del lineBuffer[0]
-                                        crcError += 1
-                                    lineBuffer.append(lineFloat[il:il + 512])
-                                if not crcCheck(lineFloat[il:il + 510], temp):
-                                    crcError += 1
-                                    il += 512
-                                    continue
-                            else:
-                                if not crcCheck(lineFloat[il:il + 496], lineFloat[il + 496:il + 498]):
-                                    crcError += 1
-                                    il += 512
-                                    continue
-                            for it in range(7):
-                                uscount.append(float(sum([lineFloat[il + 15 + 70 * it + ius] * 256 ** (7 - ius) for ius in range(8)])) / 24.05e6)
-                                for ich in range(4):
-                                    tempSipm[ich].append(float(lineFloat[il + 23 + 2 * ich + 70 * it] * 256 + lineFloat[il + 24 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                        if lineFloat[il + 23 + 2 * ich + 70 * it] * 256 + lineFloat[il + 24 + 2 * ich + 70 * it] > 2048 \
-                                        else tempSipm[ich].append(float(lineFloat[il + 23 + 2 * ich + 70 * it] * 256 + lineFloat[il + 24 + 2 * ich + 70 * it]) / 16.0)
-                                    tempAdc[ich].append(float(lineFloat[il + 31 + 2 * ich + 70 * it] * 256 + lineFloat[il + 32 + 2 * ich + 70 * it] - 4096) / 16.0) \
-                                        if lineFloat[il + 31 + 2 * ich + 70 * it] * 256 + lineFloat[il + 32 + 2 * ich + 70 * it] > 2048 \
-                                        else tempAdc[ich].append(float(lineFloat[il + 31 + 2 * ich + 70 * it] * 256 + lineFloat[il + 32 + 2 * ich + 70 * it]) / 16.0)
-                                    vMon[ich].append(float(lineFloat[il + 39 + 2 * ich + 70 * it] * 256 + lineFloat[il + 40 + 2 * ich + 70 * it]) / 4096.0 * 3.3 * 11.0)
-                                    iMon[ich].append(float(lineFloat[il + 47 + 2 * ich + 70 * it] * 256 + lineFloat[il + 48 + 2 * ich + 70 * it]) / 4096.0 * 3.3)
-                                    bias[ich].append(vMon[ich][-1] - iMon[ich][-1])
-                            il += 511
-
-                    il += 1
-
-    print(str(crcError + len(lineBuffer)) + ' data packs with crc error')
-    print(str(indexOut) + ' events with channel out of bound[0-3]')
-
-    #Transforming the data to ndarray(np.array)
-    amp = np.array(amp)
-    tempSipm = np.array(tempSipm)
-    tempAdc = np.array(tempAdc)
-    vMon = np.array(vMon)
-    iMon = np.array(iMon)
-    iMon = iMon / 2.0
-    bias = np.array(bias)
-    uscount = np.array(uscount)
-    uscountEvt = np.array(uscountEvt)
-    timeCorrect = np.array(timeCorrect)
-    timeCorrect = timeCorrect[(timeCorrect > 0) * (timeCorrect < 20 * np.std(timeCorrect))]
-    effectiveCount = np.array(effectiveCount)
-    missingCount = np.array(missingCount)
-    
-    #Time cut
-    if isCi == 2:
-        for isc in range(len(uscount)):
-            q1 = uscount[isc] > timeCut
-            uscount[isc] = uscount[isc][q1]
-            tempSipm[:, isc] = tempSipm[:, isc, q1]
-            tempAdc[:, isc] = tempAdc[:, isc, q1]
-            vMon[:, isc] = vMon[:, isc, q1]
-            iMon[:, isc] = iMon[:, isc, q1]
-            bias[:] = bias[:, isc, q1]
-            for ich in range(4):
-                q2 = uscountEvt[ich, isc] > timeCut
-                uscountEvt[ich, isc] = uscountEvt[ich, isc][q2]
-                amp[ich, isc] = amp[ich, isc][q2]
+    """
+    Function for reading out single Grid raw outout file
+    :param filename: name of the output file, currently supporting only .txt files
+    :param isHex: boolean indicating whether the input file is hexprint output
+    :param isCi: int indicating whether the input file has CI part, with 0 for no CI, 1 for CI, 2 for multiple CI
+    :param isScan: boolean indicating whether the input file has I-V scan part
+    :param scanRange: list containing the scan range for multiple scans
+    :param rateStyle: the style of calculating real count rate, '' for none, 's' for calculation with small data packs(512byte), \
+'l' for calculation with large data packs(4096byte)
+    :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
+    :param timeCut: cut of time data in seconds, specially designed for temp-bias data with pid bias control(6th ver.)
+    :param chunkSize: size of each read from the file in bytes, see dataReadoutChunks()
+    :param cacheDir: directory of the decoded readout cache, '' for no cache
+    :param cacheSize: maximum total size of the cache in MB
+    :param jobs: number of worker processes decoding shards of the file, see dataReadoutShards()
+    :param eventTable: boolean indicating whether to return the event table and its index(see buildEventTable()) after all other data
+    :param ragged: boolean indicating whether to return the data split into scans as RaggedArray instead of ndarray, for multiple scan files only
+    :param decoded: decoded data of the file returned by decodeReadout(), None for decoding the file here
+    :return: all data extracted from the data file, including spectrums, SiPM&ADC temperatures, SiPM voltage&leak current,\
+ uscount, correct live time, effective counts, missing counts, [CI data], [I-V scan data], all data in the form of ndarray(or RaggedArray), \
+[event table, event table index]
+    """
+
+    styleAvailable = ['s', 'p', '']
+    if not rateStyle in styleAvailable:
+        raise Exception('dataReadout: count rate calculation style \'' + rateStyle + '\' not available')
+
+    print('dataReadout: processing ' + filename)
+    if decoded is None:
+        decoded = decodeReadout(filename, isHex, isCi, isScan, scanRange, rateStyle, newProgramme, chunkSize, cacheDir, cacheSize, jobs)
+    decoded = applyTimeCut(decoded, timeCut)
+    nScanAll = decoded['nScan'] + 1
+    if isHex:
+        isCi = 0
+        isScan = False
+    ragged = ragged and isCi == 2
+
+    print(str(decoded['crcError']) + ' data packs with crc error')
+    print(str(decoded['indexOut']) + ' events with channel out of bound[0-3]')
+
+    #Splitting the decoded data into channels, CI parts and scans
+    def splitScan(data, scan):
+        if isCi == 2:
+            bounds = np.searchsorted(scan, np.arange(nScanAll + 1))
+            return [data[bounds[isc]:bounds[isc + 1]] for isc in range(nScanAll)]
+        return data
+
+    ch = decoded['ch']
+    evtScan = decoded['evtScan']
+    evtCi = decoded['evtCi']
+    telScan = decoded['telScan']
+    ampAll = decoded['amp'].astype(np.int64)
+    uscountEvtAll = decoded['uscountRaw'].astype(np.float64) / 24.05e6
+    if ragged:
+        #Grouping by [channel][scan] with a leading group for data before the first scan in each channel
+        def splitEvent(ci):
+            index = np.flatnonzero((evtCi == ci) * (ch >= 1) * (ch <= 4))
+            index = index[np.argsort(ch[index], kind='stable')]
+            group = (ch[index].astype(np.int64) - 1) * (nScanAll + 1) + evtScan[index] + 1
+            return splitRagged(ampAll[index], group, (4, nScanAll + 1))[:, 1:], splitRagged(uscountEvtAll[index], group, (4, nScanAll + 1))[:, 1:]
+        def splitChannel(data):
+            group = (np.arange(4)[:, None] * (nScanAll + 1) + telScan + 1).reshape(-1)
+            return splitRagged(np.array(data).reshape(-1), group, (4, nScanAll + 1))[:, 1:] #copied from the memory-mapped cache
+        amp, uscountEvt = splitEvent(False)
+        ampCI, uscountEvtCI = splitEvent(True)
+        uscount = splitRagged(np.array(decoded['uscount']), telScan, (nScanAll,))
+        tempSipm = splitChannel(decoded['tempSipm'])
+        tempAdc = splitChannel(decoded['tempAdc'])
+        vMon = splitChannel(decoded['vMon'])
+        iMon = splitChannel(decoded['iMon'])
+        bias = splitChannel(decoded['bias'])
+        if rateStyle == '':
+            timeCorrect = np.zeros(0)
+        else:
+            timeCorrect = splitRagged(decoded['timeCorrect'], decoded['timeScan'], (nScanAll,))
+            valid = np.zeros(timeCorrect.data.size, dtype=bool)
+            for isc in range(nScanAll):
+                tc = timeCorrect[isc]
+                if len(tc) > 0:
+                    valid[timeCorrect.start[isc]:timeCorrect.end[isc]] = (tc > 0) * (tc < 20 * np.std(tc))
+            timeCorrect = splitRagged(timeCorrect.data[valid], decoded['timeScan'][valid], (nScanAll,))
+        effectiveCount = np.zeros(0)
+        effectiveCountCI = np.zeros(0)
+        missingCount = np.zeros(0)
+        missingCountCI = np.zeros(0)
+        if newProgramme:
+            packetScan = decoded['packetScan']
+            packetCi = decoded['packetCi']
+            effectiveCount = splitRagged(decoded['effectiveCount'][~packetCi], packetScan[~packetCi], (nScanAll,))
+            missingCount = splitRagged(decoded['missingCount'][~packetCi], packetScan[~packetCi], (nScanAll,))
+            effectiveCountCI = splitRagged(decoded['effectiveCount'][packetCi], packetScan[packetCi], (nScanAll,))
+            missingCountCI = splitRagged(decoded['missingCount'][packetCi], packetScan[packetCi], (nScanAll,))
     else:
-        q1 = uscount > timeCut
-        uscount = uscount[q1]
-        tempSipm = tempSipm[:, q1]
-        tempAdc = tempAdc[:, q1]
-        vMon = vMon[:, q1]
-        iMon = iMon[:, q1]
-        bias = bias[:, q1]
+        amp = []
+        ampCI = []
+        uscountEvt = []
+        uscountEvtCI = []
         for ich in range(4):
-            q2 = np.array(uscountEvt[ich]) > timeCut
-            uscountEvt[ich] = np.array(uscountEvt[ich])[q2]
-            amp[ich] = np.array(amp[ich])[q2]
-            
+            q = (ch == ich + 1) * ~evtCi
+            amp.append(splitScan(ampAll[q], evtScan[q]))
+            uscountEvt.append(splitScan(uscountEvtAll[q], evtScan[q]))
+            q = (ch == ich + 1) * evtCi
+            ampCI.append(splitScan(ampAll[q], evtScan[q]))
+            uscountEvtCI.append(splitScan(uscountEvtAll[q], evtScan[q]))
+        uscount = splitScan(decoded['uscount'], telScan)
+        tempSipm = [splitScan(decoded['tempSipm'][ich], telScan) for ich in range(4)]
+        tempAdc = [splitScan(decoded['tempAdc'][ich], telScan) for ich in range(4)]
+        vMon = [splitScan(decoded['vMon'][ich], telScan) for ich in range(4)]
+        iMon = [splitScan(decoded['iMon'][ich], telScan) for ich in range(4)]
+        bias = [splitScan(decoded['bias'][ich], telScan) for ich in range(4)]
+        if rateStyle == '':
+            timeCorrect = [] if isCi == 2 else np.zeros(0)
+        else:
+            timeCorrect = splitScan(decoded['timeCorrect'], decoded['timeScan'])
+            if isCi == 2:
+                timeCorrect = [tc[(tc > 0) * (tc < 20 * np.std(tc))] if len(tc) > 0 else tc for tc in timeCorrect]
+            elif len(timeCorrect) > 0:
+                timeCorrect = timeCorrect[(timeCorrect > 0) * (timeCorrect < 20 * np.std(timeCorrect))]
+        effectiveCount = []
+        effectiveCountCI = []
+        missingCount = []
+        missingCountCI = []
+        if newProgramme:
+            packetScan = decoded['packetScan']
+            packetCi = decoded['packetCi']
+            effectiveCount = splitScan(decoded['effectiveCount'][~packetCi], packetScan[~packetCi])
+            missingCount = splitScan(decoded['missingCount'][~packetCi], packetScan[~packetCi])
+            effectiveCountCI = splitScan(decoded['effectiveCount'][packetCi], packetScan[packetCi])
+            missingCountCI = splitScan(decoded['missingCount'][packetCi], packetScan[packetCi])
+
+        #Transforming the data to ndarray(np.array)
+        depth = 2 if isCi == 2 else 1
+        amp = buildArray(amp, depth)
+        tempSipm = buildArray(tempSipm, depth)
+        tempAdc = buildArray(tempAdc, depth)
+        vMon = buildArray(vMon, depth)
+        iMon = buildArray(iMon, depth)
+        bias = buildArray(bias, depth)
+        uscountEvt = buildArray(uscountEvt, depth)
+        if isCi == 2:
+            uscount = buildArray(uscount, 1)
+            if not rateStyle == '':
+                timeCorrect = buildArray(timeCorrect, 1)
+            else:
+                timeCorrect = np.array(timeCorrect)
+            if newProgramme:
+                effectiveCount = buildArray(effectiveCount, 1)
+                missingCount = buildArray(missingCount, 1)
+        else:
+            uscount = np.array(uscount) #copied from the memory-mapped cache
+        effectiveCount = np.asarray(effectiveCount)
+        missingCount = np.asarray(missingCount)
+        if not isCi == 0:
+            ampCI = buildArray(ampCI, depth)
+            uscountEvtCI = buildArray(uscountEvtCI, depth)
+            effectiveCountCI = buildArray(effectiveCountCI, 1) if isCi == 2 and newProgramme else np.asarray(effectiveCountCI)
+            missingCountCI = buildArray(missingCountCI, 1) if isCi == 2 and newProgramme else np.asarray(missingCountCI)
+
     #Output
     print('Data readout of ' + filename + ' complete')
     if isScan:
-        vSet = np.array(vSet)
-        vScan = np.array(vScan)
-        iScan = np.array(iScan)
+        vSet = np.array(decoded['vSet'])
+        vScan = np.array(decoded['vScan'])
+        iScan = np.array(decoded['iScan'])
         if isCi == 0:
-            return amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount, vSet, vScan, iScan
+            output = amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount, vSet, vScan, iScan
         else:
-            ampCI = np.array(ampCI)
-            uscountEvtCI = np.array(uscountEvtCI)
-            effectiveCountCI = np.array(effectiveCountCI)
-            missingCountCI = np.array(missingCountCI)
-            return amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount, ampCI, uscountEvtCI, \
+            output = amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount, ampCI, uscountEvtCI, \
                 effectiveCountCI, missingCountCI, vSet, vScan, iScan
     else:
         if isCi == 0:
-            return amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount
+            output = amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount
         else:
-            ampCI = np.array(ampCI)
-            uscountEvtCI = np.array(uscountEvtCI)
-            effectiveCountCI = np.array(effectiveCountCI)
-            missingCountCI = np.array(missingCountCI)
-            return amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount, ampCI, uscountEvtCI, \
+            output = amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount, ampCI, uscountEvtCI, \
                 effectiveCountCI, missingCountCI
+    if eventTable:
+        output += buildEventTable(decoded)
+    return output
 
 def HPGeDataReadout(filename):
     """
@@ -773,6 +2105,7 @@ def deleteEmptyRun(amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt
 'l' for calculation with large data packs(4096byte)
     :param newProgramme: boolean indicating whether the data comes from new hardware programme(6th ver.)
     :return: all the input except scanRange in excatly the same order, and the corresponding scan numbers
+    The scans are selected by slicing the scan level, giving views of the input without copying for both ndarray and RaggedArray
     """
     
     if len(scanRange) == 0:
@@ -781,91 +2114,26 @@ def deleteEmptyRun(amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt
     else:
         lower = scanRange[0] - 1
         upper = scanRange[1] - 1
-    nScan = len(uscount)
-
-    amp = list(amp)
-    tempSipm = list(tempSipm)
-    tempAdc = list(tempAdc)
-    vMon = list(vMon)
-    iMon = list(iMon)
-    bias = list(bias)
-    uscount = list(uscount)
-    uscountEvt = list(uscountEvt)
-    if not rateStyle == '':
-        timeCorrect = list(timeCorrect)
-    ampCI = list(ampCI)
-    uscountEvtCI = list(uscountEvtCI)
-    if newProgramme:
-        effectiveCount = list(effectiveCount)
-        effectiveCountCI = list(effectiveCountCI)
-        missingCount = list(missingCount)
-        missingCountCI = list(missingCountCI)
-    for isc in range(nScan):
-        uscount[isc] = list(uscount[isc])
-        if not rateStyle == '':
-            timeCorrect[isc] = list(timeCorrect[isc])
-        if newProgramme:
-            effectiveCount[isc] = list(effectiveCount[isc])
-            effectiveCountCI[isc] = list(effectiveCountCI[isc])
-            missingCount[isc] = list(missingCount[isc])
-            missingCountCI[isc] = list(missingCountCI[isc])
-    for ich in range(4):
-        amp[ich] = list(amp[ich])
-        tempSipm[ich] = list(tempSipm[ich])
-        tempAdc[ich] = list(tempAdc[ich])
-        vMon[ich] = list(vMon[ich])
-        iMon[ich] = list(iMon[ich])
-        bias[ich] = list(bias[ich])
-        uscountEvt[ich] = list(uscountEvt[ich])
-        ampCI[ich] = list(ampCI[ich])
-        uscountEvtCI[ich] = list(uscountEvtCI[ich])
-        for isc in range(nScan):
-            amp[ich][isc] = list(amp[ich][isc])
-            tempSipm[ich][isc] = list(tempSipm[ich][isc])
-            tempAdc[ich][isc] = list(tempAdc[ich][isc])
-            vMon[ich][isc] = list(vMon[ich][isc])
-            iMon[ich][isc] = list(iMon[ich][isc])
-            bias[ich][isc] = list(bias[ich][isc])
-            uscountEvt[ich][isc] = list(uscountEvt[ich][isc])
-            ampCI[ich][isc] = list(ampCI[ich][isc])
-            uscountEvtCI[ich][isc] = list(uscountEvtCI[ich][isc])
-
-    for isc in range(lower):
-        del uscount[0]
-        if not rateStyle == '':
-            del timeCorrect[0]
-        if newProgramme:
-            del effectiveCount[0], effectiveCountCI[0], missingCount[0], missingCountCI[0]
-        for ich in range(4):
-            del amp[ich][0], tempSipm[ich][0], tempAdc[ich][0], vMon[ich][0], iMon[ich][0], bias[ich][0], uscountEvt[ich][0], ampCI[ich][0], uscountEvtCI[ich][0]
-    for isc in range(nScan - upper - 1):
-        del uscount[-1]
-        if not rateStyle == '':
-            del timeCorrect[-1]
-        if newProgramme:
-            del effectiveCount[-1], effectiveCountCI[-1], missingCount[-1], missingCountCI[-1]
-        for ich in range(4):
-            del amp[ich][-1], tempSipm[ich][-1], tempAdc[ich][-1], vMon[ich][-1], iMon[ich][-1], bias[ich][-1], uscountEvt[ich][-1], ampCI[ich][-1], uscountEvtCI[ich][-1]
-            
-    amp = np.array(amp)
-    tempSipm = np.array(tempSipm)
-    tempAdc = np.array(tempAdc)
-    vMon = np.array(vMon)
-    iMon = np.array(iMon)
-    bias = np.array(bias)
-    uscount = np.array(uscount)
-    uscountEvt = np.array(uscountEvt)
+    run = slice(lower, upper + 1)
+
+    amp = amp[:, run]
+    tempSipm = tempSipm[:, run]
+    tempAdc = tempAdc[:, run]
+    vMon = vMon[:, run]
+    iMon = iMon[:, run]
+    bias = bias[:, run]
+    uscount = uscount[run]
+    uscountEvt = uscountEvt[:, run]
     if not rateStyle == '':
-        timeCorrect = np.array(timeCorrect)
-    ampCI = np.array(ampCI)
-    uscountEvtCI = np.array(uscountEvtCI)
+        timeCorrect = timeCorrect[run]
+    ampCI = ampCI[:, run]
+    uscountEvtCI = uscountEvtCI[:, run]
     if newProgramme:
-        effectiveCount = np.array(effectiveCount)
-        effectiveCountCI = np.array(effectiveCountCI)
-        missingCount = np.array(missingCount)
-        missingCountCI = np.array(missingCountCI)
+        effectiveCount = effectiveCount[run]
+        effectiveCountCI = effectiveCountCI[run]
+        missingCount = missingCount[run]
+        missingCountCI = missingCountCI[run]
 
-    #Thanks to ndarray, ALL THESE matter is needed to delete a SINGLE sublist!
     return amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount, ampCI, uscountEvtCI, \
         effectiveCountCI, missingCountCI
 
@@ -1884,7 +3152,7 @@ def importData(filename, importPath, isCi = 0, isScan = False, scanRange = []):
             return amp, tempSipm, tempAdc, vMon, iMon, bias, uscount, uscountEvt, timeCorrect, effectiveCount, missingCount, ampCI, uscountEvtCI, \
                 effectiveCountCI, missingCountCI, scanNum
 
-def plotRawData(filename, amp, nbins, corr, time, singlech = False, channel = -1, rateStyle = '', rateAll = 0.0, doCorr = True):
+def plotRawData(filename, amp, nbins, corr, time, singlech = False, channel = -1, rateStyle = '', rateAll = 0.0, doCorr = True, full = None):
     
     """
     Function for plotting the processed, unfitted data
@@ -1898,6 +3166,7 @@ def plotRawData(filename, amp, nbins, corr, time, singlech = False, channel = -1
     :param rateStyle: the style of calculating real count rate, '' for none, 's' forsingle live time data, 'p' for calculation with small data packs(512byte)
     :param rateAll: correct count rate of all spectrum in all 4 channels calculated when reading data, only used when rateStyle is 's' or 'l'
     :param doCorr: boolean indicating whether the temperature-bias correction will be done, to avoid warning info output
+    :param full: full resolution spectrum of all 4 channels from fullSpectrum(), calculated from amp if not given
     :return: nothing
     """
 
@@ -1913,14 +3182,14 @@ def plotRawData(filename, amp, nbins, corr, time, singlech = False, channel = -1
     if singlech:
         if not isChannel(channel):
             raise Exception('plotRawData: channel number out of bound[0-3]')
-        spectrum, x = getSpectrum(amp[channel], nbins, singlech)
+        spectrum, x = getSpectrum(amp[channel], nbins, singlech, None if full is None else full[channel])
     else:
-        spectrum, x = getSpectrum(amp, nbins, singlech)
+        spectrum, x = getSpectrum(amp, nbins, singlech, full)
 
     if not rateStyle == '':
         countAll = 0.0
         for ich in range(4):
-            countAll += float(len(amp[ich]))
+            countAll += float(len(amp[ich]) if full is None else np.sum(full[ich]))
         rateFactor = rateAll / countAll
 
     fig = plt.figure(figsize=(12, 8))
@@ -1955,7 +3224,183 @@ def plotRawData(filename, amp, nbins, corr, time, singlech = False, channel = -1
             ax.set_ylabel('count rate/cps')
             ax.legend(loc=0)
             ax.grid()
-    plt.show()
+    showFigure(fig)
+    return
+
+#***********************************************************************************************************************************************************
+#****************************************************************Batch plot rendering part*****************************************************************
+#***********************************************************************************************************************************************************
+
+#State of the batch plot mode, with the output directory(empty for interactive plots), file formats, rendering process pool, pending renders and files written
+batchPlot = {
+        'dir':          '',
+        'formats':      [],
+        'pool':         None,
+        'pending':      [],
+        'files':        [],
+        'count':        0,
+        'prefix':       '',
+        'worker':       False,
+    }
+
+def startBatchPlot(outputDir, formats = ['png'], jobs = 1):
+
+    """
+    Function for starting the batch plot mode, in which the figures are rendered to files with the Agg backend in a separate process pool instead \
+of being shown, so that the processing never waits for the figures
+    :param outputDir: directory of the output figure files
+    :param formats: list of the output file formats supported by matplotlib, e.g. png, pdf
+    :param jobs: number of rendering worker processes
+    :return: nothing
+    The pool is to be started before the data is read out to keep the worker processes small, and finishBatchPlot() is to be called at the end
+    """
+
+    plt.switch_backend('Agg')
+    try:
+        os.makedirs(outputDir, exist_ok=True)
+    except:
+        raise Exception('startBatchPlot: unable to create the output directory ' + outputDir)
+    batchPlot.update({'dir': outputDir, 'formats': list(formats), 'pending': [], 'files': [], 'count': 0})
+    batchPlot['pool'] = processPool(max(jobs, 1), batchPlotInit, (outputDir, list(formats)))
+    return
+
+def batchPlotInit(outputDir, formats):
+
+    """
+    Initializer of the rendering worker processes, saving the figures directly to the files
+    :param outputDir: directory of the output figure files
+    :param formats: list of the output file formats
+    :return: nothing
+    """
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN) #Ctrl+C stopping a watch or live readout is handled by the main process only
+    plt.switch_backend('Agg')
+    batchPlot.update({'dir': outputDir, 'formats': formats, 'pool': None, 'pending': [], 'files': [], 'worker': True})
+    return
+
+def finishBatchPlot():
+
+    """
+    Function for waiting for all pending renders and ending the batch plot mode
+    :return: list of the figure files written
+    """
+
+    if batchPlot['dir'] == '':
+        return []
+    files = batchPlot['files']
+    for future in batchPlot['pending']:
+        try:
+            files += future.result()
+        except Exception as e:
+            print('finishBatchPlot: rendering failed, ' + str(e))
+    if batchPlot['pool'] is not None:
+        batchPlot['pool'].shutdown()
+    print('finishBatchPlot: ' + str(len(files)) + ' figure files written to ' + batchPlot['dir'])
+    batchPlot.update({'dir': '', 'pool': None, 'pending': [], 'files': []})
+    return files
+
+def figurePath(name):
+
+    """
+    Auxiliary function to get the path of the next figure file in the batch plot mode, without the extension
+    :param name: name of the figure, e.g. its title
+    :return: the path, numbered in the order of the figures
+    """
+
+    batchPlot['count'] += 1
+    name = ''.join([c if c.isalnum() or c in '-_.' else '_' for c in name]).strip('_.')[:100]
+    return os.path.join(batchPlot['dir'], str('%04d' % batchPlot['count']) + '_' + (name if not name == '' else 'figure'))
+
+def saveFigure(fig, path):
+
+    """
+    Function for saving a figure in all formats of the batch plot mode
+    :param fig: the figure
+    :param path: path of the figure file without the extension
+    :return: list of the files written
+    """
+
+    files = []
+    for form in batchPlot['formats']:
+        fig.savefig(path + '.' + form)
+        files.append(path + '.' + form)
+    plt.close(fig)
+    return files
+
+def renderFigure(data, path):
+
+    """
+    Function for rendering a pickled figure in a worker process
+    :param data: the figure pickled with pickle.dumps()
+    :param path: path of the figure file without the extension
+    :return: list of the files written
+    """
+
+    return saveFigure(pickle.loads(data), path)
+
+def renderPlot(function, plotData, path):
+
+    """
+    Function for making and rendering the figures of a plot function in a worker process
+    :param function: the plot function taking the plot data only, e.g. plotSpectrumFit()
+    :param plotData: the plot data
+    :param path: path of the figure file without the extension, numbered further if the plot function shows more than one figure
+    :return: list of the files written
+    """
+
+    batchPlot.update({'prefix': path, 'files': [], 'count': 0})
+    function(plotData)
+    return batchPlot['files']
+
+def showFigure(fig = None, name = ''):
+
+    """
+    Function for showing figures, replacing plt.show() so that the figures are rendered to files in the batch plot mode
+    :param fig: the figure, all open figures if not given(as plt.show())
+    :param name: name of the figure file, the title of the figure if not given
+    :return: nothing
+    """
+
+    if batchPlot['dir'] == '':
+        plt.show()
+        return
+    figs = [fig] if fig is not None else [plt.figure(num) for num in plt.get_fignums()]
+    for fig in figs:
+        if batchPlot['worker']:
+            batchPlot['count'] += 1
+            batchPlot['files'] += saveFigure(fig, batchPlot['prefix'] + ('' if batchPlot['count'] == 1 else '_' + str(batchPlot['count'])))
+            continue
+        if name == '':
+            titles = [fig.get_suptitle()] + [ax.get_title() for ax in fig.axes]
+            title = ([title for title in titles if not title == ''] + [''])[0]
+        path = figurePath(name if not name == '' else title)
+        if batchPlot['pool'] is None:
+            batchPlot['files'] += saveFigure(fig, path)
+            continue
+        try:
+            data = pickle.dumps(fig)
+        except:
+            batchPlot['files'] += saveFigure(fig, path)
+            continue
+        plt.close(fig)
+        batchPlot['pending'].append(batchPlot['pool'].submit(renderFigure, data, path))
+    return
+
+def submitPlot(function, plotData):
+
+    """
+    Function for plotting with a plot function taking the plot data only, e.g. plotSpectrumFit(), the figures being made and rendered by the worker \
+processes in the batch plot mode
+    :param function: the plot function
+    :param plotData: the plot data, a dictionary with the key 'filename' naming the figure files
+    :return: nothing
+    """
+
+    if batchPlot['pool'] is None or batchPlot['worker']:
+        function(plotData)
+        return
+    path = figurePath(function.__name__ + '_' + str(plotData.get('filename', '')))
+    batchPlot['pending'].append(batchPlot['pool'].submit(renderPlot, function, plotData, path))
     return
 
 #***********************************************************************************************************************************************************
@@ -2142,10 +3587,145 @@ data is from bias scan #TBD: reomve this part in the final version ,also note th
             
     return corrFactor, corrErr
 
+#***********************************************************************************************************************************************************
+#****************************************************************Automatic peak locator part***************************************************************
+#***********************************************************************************************************************************************************
+
+#Reference fit range data of the supported sources in temperature-bias corrected ADC channels, in the form of [channel][lower, upper]
+sourceFitRange = {
+        'Am241':    np.array([[1100, 2800], [1100, 2300], [1100, 2600], [1200, 2900]]),
+        'Ba133':    np.array([[2500, 4500], [2800, 5500], [2800, 5500], [3200, 5500]]),
+        'Na22':     np.array([[12800, 18000], [12000, 16700], [14000, 18000], [14000, 18600]]),
+        'Cs137':    np.array([[16600, 23100], [16600, 21800], [17200, 25000], [18500, 25000]]),
+        'Th228':    np.array([[5100, 7700], [5700, 8400], [5400, 8000], [5700, 8400]]),
+        'Co60':     np.array([[35840, 41000], [35200, 39700], [38400, 44200], [40320, 46100]]),
+    }
+
+def locatePeaks(full, source = 'x', channel = -1, bound = 3.0, minSignificance = 5.0, lower = 1000, nLog = 1024, resolution = [0.015, 0.12], nScale = 8):
+
+    """
+    Function for locating the photopeaks of full resolution spectra and proposing the fit windows for fitSpectrum(), with a matched filter search of \
+all spectra at once
+    :param full: full resolution spectra from fullSpectrum(), in the form of [...][bin] with any leading dimensions, e.g. [scan][channel][bin]
+    :param source: the source of the spectra, the reference fit range of the channel being used as a loose prior of the peak position for the \
+sources in sourceFitRange, 'x' or any other source for the most significant peak
+    :param channel: channel number in range[0-3] for the reference fit range of a single spectrum, not used for spectra in the form of [...][channel][bin]
+    :param bound: boundary of the proposed fit windows in \sigma, with boundaries being \mu - bound * \sigma and \mu + bound * \sigma
+    :param minSignificance: minimum significance of a peak in the matched filter, in \sigma
+    :param lower: lower limit of the peak search in ADC channels, to keep off the threshold of the spectra
+    :param nLog: number of logarithmic bins in [lower, 65536] used for the search
+    :param resolution: range of the relative peak width \sigma / \mu searched, in the form of [lower, upper]
+    :param nScale: number of filter scales in the range of resolution
+    :return: proposed fit windows in uncorrected ADC channels in the form of [...][lower, upper], peak centers and peak sigmas in the form of [...], \
+all nan for the spectra with no peak found
+    The spectra are rebinned in logarithmic bins where a peak of a given resolution has the same width at any position, and filtered with mexican hat \
+(negative second derivative of gaussian) kernels of nScale widths, the significance being the filter response over its poisson error. The peak width is \
+measured with the zero crossings of the filter response, lying at \pm sqrt(\sigma^2 + s^2) with s being the kernel width
+    """
+
+    full = np.asarray(full)
+    shape = full.shape[:-1]
+    full = full.reshape(-1, full.shape[-1])
+    nSpec = full.shape[0]
+    if source in sourceFitRange:
+        prior = np.log(np.sqrt(sourceFitRange[source][:, 0] * sourceFitRange[source][:, 1]))
+        if len(shape) == 0:
+            if not isChannel(channel):
+                raise Exception('locatePeaks: channel number out of bound[0-3]')
+            prior = prior[channel]
+        elif not shape[-1] == 4:
+            raise Exception('locatePeaks: spectra must be in the form of [...][channel][bin] for the reference fit range')
+        prior = np.broadcast_to(prior, shape).reshape(-1, 1)
+    else:
+        prior = None
+
+    #Logarithmic rebinning, in counts per unit of ln(ADC channel)
+    edges = np.unique(np.round(np.geomspace(lower, full.shape[-1], nLog + 1)).astype(np.int64))
+    counts = np.add.reduceat(full, edges[:-1], axis=-1).astype(float)
+    logEdges = np.log(edges)
+    step = np.diff(logEdges)
+    u = (logEdges[:-1] + logEdges[1:]) / 2
+    du = (logEdges[-1] - logEdges[0]) / len(step)
+    nBins = len(u)
+
+    #Matched filter of all scales and spectra at once, the spectra being extended with the edge values which the kernels do not respond to
+    scales = np.geomspace(resolution[0], resolution[1], nScale)
+    half = int(np.ceil(4 * scales[-1] / du))
+    t = np.arange(-half, half + 1)[None, :] * du / scales[:, None]
+    support = np.abs(t) <= 4
+    kernel = (1 - t ** 2) * np.exp(- t ** 2 / 2) * support
+    kernel -= support * (np.sum(kernel, axis=1) / np.sum(support, axis=1))[:, None]
+    nfft = 1 << int(np.ceil(np.log2(nBins + 4 * half)))
+    density = np.fft.rfft(np.pad(counts / step, ((0, 0), (half, half)), mode='edge'), nfft)
+    variance = np.fft.rfft(np.pad(counts / step ** 2, ((0, 0), (half, half)), mode='edge'), nfft)
+    response = np.fft.irfft(density[None] * np.fft.rfft(kernel, nfft)[:, None], nfft)[..., 2 * half:2 * half + nBins]
+    noise = np.fft.irfft(variance[None] * np.fft.rfft(kernel ** 2, nfft)[:, None], nfft)[..., 2 * half:2 * half + nBins]
+    significance = np.where(noise > 0, response / np.sqrt(np.maximum(noise, 1e-300)), 0.)
+    best = np.argmax(significance, axis=0)
+    significance = np.max(significance, axis=0)
+
+    #Candidates, local maxima of the significance over all scales
+    score = np.full((nSpec, nBins), -np.inf)
+    isPeak = (significance[:, 1:-1] > significance[:, :-2]) * (significance[:, 1:-1] >= significance[:, 2:]) * (significance[:, 1:-1] >= minSignificance)
+    score[:, 1:-1] = np.where(isPeak, significance[:, 1:-1], -np.inf)
+    if prior is not None:
+        score = score * np.exp(- 0.5 * ((u[None, :] - prior) / np.log(2)) ** 2)
+
+    #Selection and width measurement, candidates wider than the searched resolution(e.g. the bump of the continuum) are dropped and the next one taken
+    rows = np.arange(nSpec)
+    index = np.arange(nBins)
+    for iit in range(4):
+        ipeak = np.argmax(score, axis=1)
+        found = np.isfinite(score[rows, ipeak])
+        iscale = best[rows, ipeak]
+        for istep in range(3):
+            current = response[iscale, rows]
+            left = np.maximum.accumulate(np.where(current <= 0, index, -1), axis=1)[rows, ipeak]
+            right = np.minimum.accumulate(np.where(current <= 0, index, nBins)[:, ::-1], axis=1)[:, ::-1][rows, ipeak]
+            crossed = (left >= 0) * (right < nBins)
+            left = np.maximum(left, 0)
+            right = np.minimum(right, nBins - 1)
+            r0, r1 = current[rows, left], current[rows, np.minimum(left + 1, nBins - 1)]
+            uLeft = u[left] + du * r0 / np.where(r0 < r1, r0 - r1, -1.)
+            r0, r1 = current[rows, np.maximum(right - 1, 0)], current[rows, right]
+            uRight = u[right] + du * r1 / np.where(r0 > r1, r0 - r1, 1.)
+            width = np.sqrt(np.maximum(((uRight - uLeft) / 2) ** 2 - scales[iscale] ** 2, (scales[0] / 2) ** 2))
+            iscale = np.argmin(np.abs(np.log(scales)[None, :] - np.log(width)[:, None]), axis=1)
+        rejected = found * ~(crossed * (width <= 1.5 * scales[-1]))
+        if not np.any(rejected):
+            break
+        score[rows[rejected], ipeak[rejected]] = -np.inf
+    found = found * ~rejected
+
+    #Peak center interpolated with the significance around the maximum
+    s0, s1, s2 = significance[rows, np.maximum(ipeak - 1, 0)], significance[rows, ipeak], significance[rows, np.minimum(ipeak + 1, nBins - 1)]
+    curvature = s0 - 2 * s1 + s2
+    shift = np.clip(np.where(curvature < 0, 0.5 * (s0 - s2) / np.where(curvature < 0, curvature, -1.), 0.), -0.5, 0.5)
+    center = np.where(found, np.exp(u[ipeak] + shift * du), np.nan)
+    sigma = np.where(found, width * center, np.nan)
+    window = np.stack([np.maximum(center - bound * sigma, 1.), np.minimum(center + bound * sigma, full.shape[-1] - 1.)], axis=-1)
+    return window.reshape(shape + (2,)), center.reshape(shape), sigma.reshape(shape)
+
 #***********************************************************************************************************************************************************
 #************************************************************Basic fit functions and fit part***********************************************************
 #***********************************************************************************************************************************************************
 
+#Reusable fit models, registered in fitModelBuilders along with the fit functions and built on the first use by fitModel()
+fitModels = {}
+fitModelBuilders = {}
+
+def fitModel(name):
+
+    """
+    Function for getting a reusable fit model, built on the first use so that lmfit and scipy.odr are only loaded when fits are done
+    :param name: name of the model in fitModelBuilders
+    :return: the lmfit or odr model
+    """
+
+    if not name in fitModels:
+        fitModels[name] = fitModelBuilders[name]()
+    return fitModels[name]
+
 def gehrelsErr(ydata):
 
     """
@@ -2164,16 +3744,92 @@ def gehrelsErr(ydata):
         yerr = []
     return yerr
 
-def gaussianFunction(param, x):
+def gaussianFunction(param, x):
+
+    """
+    Auxiliary function to calculate the value of the gaussian function, used for odr fitting
+    :param param: parameters of the gaussian and quadratic function, in the form of [amplitude, center, sigma]
+    :param x: input x value
+    :return: value of the gaussian function
+    """
+    
+    return param[0] * np.exp(-(x - param[1]) ** 2 / (2 * (param[2] ** 2))) / (param[2] * np.sqrt(2 * np.pi))
+
+def gaussianJacobian(param, x):
+
+    """
+    Auxiliary function to calculate the derivatives of the gaussian function against its parameters, used as fjacb of odr fitting
+    :param param: parameters of the gaussian function, in the form of [amplitude, center, sigma]
+    :param x: input x value
+    :return: derivatives against amplitude, center and sigma, in the form of [parameter][data]
+    """
+
+    d = (x - param[1]) / param[2]
+    gauss = np.exp(-d ** 2 / 2) / (param[2] * np.sqrt(2 * np.pi))
+    peak = param[0] * gauss
+    return np.array([gauss, peak * d / param[2], peak * (d ** 2 - 1) / param[2]])
+
+def gaussianSlope(param, x):
+
+    """
+    Auxiliary function to calculate the derivative of the gaussian function against x, used as fjacd of odr fitting
+    :param param: parameters of the gaussian function, in the form of [amplitude, center, sigma]
+    :param x: input x value
+    :return: derivative against x
+    """
+
+    return -gaussianFunction(param, x) * (x - param[1]) / param[2] ** 2
+
+def gaussQuadDfun(params, data, weights, x = None):
+
+    """
+    Auxiliary function to calculate the jacobian of the residual of lmfit GaussianModel, QuadraticModel or their sum with analytic derivatives, \
+used as Dfun of least square fitting with col_deriv
+    :param params: lmfit Parameters of the fit, with the gaussian parameters named as prefix + 'amplitude', 'center', 'sigma' and the quadratic \
+parameters as prefix + 'a', 'b', 'c'
+    :param data: the y data to be fit
+    :param weights: weights of the residual, None for no weights
+    :param x: the x data to be fit
+    :return: derivatives of the residual against all varying parameters in their order, in the form of [parameter][data]
+    """
+
+    values = params.valuesdict()
+    gaussianTerm = ['amplitude', 'center', 'sigma']
+    quadTerm = ['a', 'b', 'c']
+    jacobian = []
+    for name in params:
+        if not params[name].vary:
+            continue
+        prefix, term = name[:name.rfind('_') + 1], name[name.rfind('_') + 1:]
+        if term in gaussianTerm:
+            jacobian.append(gaussianJacobian([values[prefix + 'amplitude'], values[prefix + 'center'], values[prefix + 'sigma']], x)[gaussianTerm.index(term)])
+        elif term in quadTerm:
+            jacobian.append(x ** (2 - quadTerm.index(term)) * np.ones(len(x)))
+        else:
+            raise Exception('gaussQuadDfun: unknown parameter ' + name)
+    #the residual of lmfit models being (data - model) * weights
+    jacobian = - np.array(jacobian)
+    if weights is not None:
+        jacobian = jacobian * weights
+    return jacobian
+
+def buildGaussianModel(prefix):
 
     """
-    Auxiliary function to calculate the value of the gaussian function, used for odr fitting
-    :param param: parameters of the gaussian and quadratic function, in the form of [amplitude, center, sigma]
-    :param x: input x value
-    :return: value of the gaussian function
+    Auxiliary function to build lmfit GaussianModel without the derived parameters fwhm and height, which are not used in the fits but evaluated \
+at every step of the fit
+    :param prefix: prefix of the parameter names
+    :return: the GaussianModel
     """
-    
-    return param[0] * np.exp(-(x - param[1]) ** 2 / (2 * (param[2] ** 2))) / (param[2] * np.sqrt(2 * np.pi))
+
+    model = lmfit.models.GaussianModel(prefix = prefix)
+    model.param_hints.pop('fwhm', None)
+    model.param_hints.pop('height', None)
+    return model
+
+#Builders of the reusable fit models of the gaussian function
+fitModelBuilders['gaussianOdr'] = lambda: scipyOdr.Model(gaussianFunction, fjacb = gaussianJacobian, fjacd = gaussianSlope)
+fitModelBuilders['gaussianFit'] = lambda: buildGaussianModel('fit_')
 
 def doFitGaussian(xdata, ydata, odr = False, xerror = [], yerror = []):
     
@@ -2201,22 +3857,21 @@ def doFitGaussian(xdata, ydata, odr = False, xerror = [], yerror = []):
     standard deviations of parameters: result.sd_beta = [std_amplitude, std_center, std_sigma]
     """
 
-    gModel = lmfit.models.GaussianModel(prefix = 'fit_')
+    gModel = fitModel('gaussianFit')
     param = gModel.guess(ydata, x = xdata)
     if odr:
         if len(xerror) == 0:
             if len(yerror) == 0:
-                data = RealData(xdata, ydata)
+                data = scipyOdr.RealData(xdata, ydata)
             else:
-                data = RealData(xdata, ydata, sy = yerror)
+                data = scipyOdr.RealData(xdata, ydata, sy = yerror)
         else:
             if len(yerror) == 0:
-                data = RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
+                data = scipyOdr.RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
             else:
-                data = RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
-        model = Model(gaussianFunction)
-        odrFit = ODR(data, model, [param.valuesdict()['fit_amplitude'], param.valuesdict()['fit_center'], param.valuesdict()['fit_sigma']])
-        odrFit.set_job(fit_type = 0)
+                data = scipyOdr.RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
+        odrFit = scipyOdr.ODR(data, fitModel('gaussianOdr'), [param.valuesdict()['fit_amplitude'], param.valuesdict()['fit_center'], param.valuesdict()['fit_sigma']])
+        odrFit.set_job(fit_type = 0, deriv = 3)
         result = odrFit.run()
         fitResult = {
                         'fit_amplitude':           result.beta[0],
@@ -2228,9 +3883,9 @@ def doFitGaussian(xdata, ydata, odr = False, xerror = [], yerror = []):
             }
     else:
         if len(yerror) == 0:
-            result = gModel.fit(ydata, param, x = xdata)
+            result = gModel.fit(ydata, param, x = xdata, fit_kws = {'Dfun': gaussQuadDfun, 'col_deriv': 1})
         else:
-            result = gModel.fit(ydata, param, x = xdata, weights = 1. / yerror)
+            result = gModel.fit(ydata, param, x = xdata, weights = 1. / yerror, fit_kws = {'Dfun': gaussQuadDfun, 'col_deriv': 1})
         fitResult = {
                         'fit_amplitude':           result.best_values['fit_amplitude'],
                         'fit_center':                result.best_values['fit_center'],
@@ -2252,7 +3907,35 @@ def peakFunction(param, x):
     
     return param[0] * np.exp(-(x - param[1]) ** 2 / (2 * (param[2] ** 2))) / (param[2] * np.sqrt(2 * np.pi)) + param[3] * x ** 2 + param[4] * x + param[5]
 
-def doFitPeak(xdata, ydata, odr = False, xerror = [], yerror = [], quadBkg = True):
+def peakJacobian(param, x):
+
+    """
+    Auxiliary function to calculate the derivatives of the peak function against its parameters, used as fjacb of odr fitting
+    :param param: parameters of the gaussian and quadratic function, in the form of [amplitude, center, sigma, a, b, c]
+    :param x: input x value
+    :return: derivatives against all parameters, in the form of [parameter][data]
+    """
+
+    return np.concatenate((gaussianJacobian(param[:3], x), quadJacobian(param[3:], x)))
+
+def peakSlope(param, x):
+
+    """
+    Auxiliary function to calculate the derivative of the peak function against x, used as fjacd of odr fitting
+    :param param: parameters of the gaussian and quadratic function, in the form of [amplitude, center, sigma, a, b, c]
+    :param x: input x value
+    :return: derivative against x
+    """
+
+    return gaussianSlope(param[:3], x) + quadSlope(param[3:], x)
+
+#Builders of the reusable fit models of the peak function, the lmfit model being the sum of the background and peak models
+fitModelBuilders['peakOdr'] = lambda: scipyOdr.Model(peakFunction, fjacb = peakJacobian, fjacd = peakSlope)
+fitModelBuilders['peakGaussian'] = lambda: buildGaussianModel('peak_')
+fitModelBuilders['peakQuad'] = lambda: lmfit.models.QuadraticModel(prefix = 'bk_')
+fitModelBuilders['peakFit'] = lambda: fitModel('peakQuad') + fitModel('peakGaussian')
+
+def doFitPeak(xdata, ydata, odr = False, xerror = [], yerror = [], quadBkg = True, initParam = None):
     
     """
     Function for fitting single gaussian peak, with quadratic background
@@ -2262,6 +3945,8 @@ def doFitPeak(xdata, ydata, odr = False, xerror = [], yerror = [], quadBkg = Tru
     :param xerror: standard deviation of x data when using odr fit
     :param yerror: standard deviation of y data when using odr fit
     :param quadBkg: boolean indicating whether the quadratic background is included in the fit function
+    :param initParam: initial values of the fit, in the form of the fit result below(e.g. that of a previous spectrum), None for values guessed \
+from the data. The background is still guessed if not included
     :return: fit result
     For lsq fitting, in the form of a dictionary as
     result.best_values = {
@@ -2282,35 +3967,39 @@ def doFitPeak(xdata, ydata, odr = False, xerror = [], yerror = [], quadBkg = Tru
     standard deviations of parameters: result.sd_beta = [std_amplitude, std_center, std_sigma, std_a, std_b, std_c]
     """
 
-    gModel = lmfit.models.GaussianModel(prefix = 'peak_')
-    param1 = gModel.guess(ydata, x = xdata)
+    gModel = fitModel('peakGaussian')
+    if initParam is None:
+        param1 = gModel.guess(ydata, x = xdata)
+    else:
+        param1 = gModel.make_params(amplitude = initParam['peak_amplitude'], center = initParam['peak_center'], sigma = initParam['peak_sigma'])
     if quadBkg:
-        ydatabkg = ydata - gaussianFunction([param1.valuesdict()['peak_amplitude'], param1.valuesdict()['peak_center'], param1.valuesdict()['peak_sigma']], \
-            xdata)
-        qModel = lmfit.models.QuadraticModel(prefix = 'bk_')
-        param2 = qModel.guess(ydatabkg, x = xdata)
+        qModel = fitModel('peakQuad')
+        if initParam is None or not 'bk_a' in initParam:
+            ydatabkg = ydata - gaussianFunction([param1.valuesdict()['peak_amplitude'], param1.valuesdict()['peak_center'], param1.valuesdict()['peak_sigma']], \
+                xdata)
+            param2 = qModel.guess(ydatabkg, x = xdata)
+        else:
+            param2 = qModel.make_params(a = initParam['bk_a'], b = initParam['bk_b'], c = initParam['bk_c'])
         param = param1 + param2
     else:
         param = param1
     if odr:
         if len(xerror) == 0:
             if len(yerror) == 0:
-                data = RealData(xdata, ydata)
+                data = scipyOdr.RealData(xdata, ydata)
             else:
-                data = RealData(xdata, ydata, sy = yerror)
+                data = scipyOdr.RealData(xdata, ydata, sy = yerror)
         else:
             if len(yerror) == 0:
-                data = RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
+                data = scipyOdr.RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
             else:
-                data = RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
+                data = scipyOdr.RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
         if quadBkg:
-            model = Model(peakFunction)
-            odrFit = ODR(data, model, [param.valuesdict()['peak_amplitude'], param.valuesdict()['peak_center'], param.valuesdict()['peak_sigma'], \
+            odrFit = scipyOdr.ODR(data, fitModel('peakOdr'), [param.valuesdict()['peak_amplitude'], param.valuesdict()['peak_center'], param.valuesdict()['peak_sigma'], \
                 param.valuesdict()['bk_a'], param.valuesdict()['bk_b'], param.valuesdict()['bk_c']])
         else:
-            model = Model(gaussianFunction)
-            odrFit = ODR(data, model, [param.valuesdict()['peak_amplitude'], param.valuesdict()['peak_center'], param.valuesdict()['peak_sigma']])
-        odrFit.set_job(fit_type = 0)
+            odrFit = scipyOdr.ODR(data, fitModel('gaussianOdr'), [param.valuesdict()['peak_amplitude'], param.valuesdict()['peak_center'], param.valuesdict()['peak_sigma']])
+        odrFit.set_job(fit_type = 0, deriv = 3)
         result = odrFit.run()
         if quadBkg:
             fitResult = {
@@ -2335,13 +4024,13 @@ def doFitPeak(xdata, ydata, odr = False, xerror = [], yerror = [], quadBkg = Tru
                 }
     else:
         if quadBkg:
-            model = qModel + gModel
+            model = fitModel('peakFit')
         else:
             model = gModel
         if len(yerror) == 0:
-            result = model.fit(ydata, param, x = xdata)
+            result = model.fit(ydata, param, x = xdata, fit_kws = {'Dfun': gaussQuadDfun, 'col_deriv': 1})
         else:
-            result = model.fit(ydata, param, x = xdata, weights = 1. / yerror)
+            result = model.fit(ydata, param, x = xdata, weights = 1. / yerror, fit_kws = {'Dfun': gaussQuadDfun, 'col_deriv': 1})
         if quadBkg:
             fitResult = {
                             'bk_a':         result.best_values['bk_a'],
@@ -2365,6 +4054,238 @@ def doFitPeak(xdata, ydata, odr = False, xerror = [], yerror = [], quadBkg = Tru
                 }
     return fitResult
 
+def peakBatchFunction(param, t, quadBkg = True):
+
+    """
+    Auxiliary function to calculate the value and the derivatives of the peak function for many spectra at once, used for batched fitting
+    :param param: ndarray of parameters of all spectra, in the form of [spectrum][amplitude, center, sigma, (a, b, c)]
+    :param t: ndarray of input x values of all spectra, in the form of [spectrum][data]
+    :param quadBkg: boolean indicating whether the quadratic background is included in the function
+    :return: value of the peak function and its derivatives against all parameters, in the form of [spectrum][data] and \
+[spectrum][data][parameter]
+    """
+
+    d = (t - param[:, 1:2]) / param[:, 2:3]
+    gauss = np.exp(-d ** 2 / 2) / (param[:, 2:3] * np.sqrt(2 * np.pi))
+    peak = param[:, 0:1] * gauss
+    derivative = [gauss, peak * d / param[:, 2:3], peak * (d ** 2 - 1) / param[:, 2:3]]
+    if quadBkg:
+        peak = peak + param[:, 3:4] * t ** 2 + param[:, 4:5] * t + param[:, 5:6]
+        derivative += [t ** 2, t, np.ones(t.shape)]
+    return peak, np.stack(derivative, axis=-1)
+
+def doFitPeakBatch(xdata, ydata, yerror = [], quadBkg = True, maxfev = 1000, initParam = []):
+
+    """
+    Function for least square fitting of single gaussian peaks with quadratic background to many spectra at once, with the same fit function, \
+initial values and error estimation as the lsq fit of doFitPeak()
+    The spectra are padded into one [spectrum][data] ndarray and fitted together with a vectorized Levenberg-Marquardt method using analytic \
+derivatives, the x data of each spectrum being centered and scaled to [-1, 1] during the fit
+    :param xdata: list of the x data of all spectra
+    :param ydata: list of the y data of all spectra
+    :param yerror: list of the standard deviations of the y data of all spectra, empty list for no weights
+    :param quadBkg: boolean indicating whether the quadratic background is included in the fit function
+    :param maxfev: maximum number of iterations
+    :param initParam: list of initial values of all spectra as in doFitPeak(), None for values guessed from the data, empty list for all guessed
+    :return: list of fit results of all spectra, each in the same form as the lsq fit result of doFitPeak()
+    """
+
+    nFit = len(xdata)
+    nParam = 6 if quadBkg else 3
+    if nFit == 0:
+        return []
+    size = np.array([len(xi) for xi in xdata])
+    if np.any(size < nParam):
+        raise Exception('doFitPeakBatch: fewer data points than fit parameters')
+    t = np.zeros((nFit, size.max()))
+    y = np.zeros((nFit, size.max()))
+    w = np.zeros((nFit, size.max()))
+    x0 = np.zeros(nFit)
+    scale = np.ones(nFit)
+    param = np.zeros((nFit, nParam))
+
+    #Initial values, the same as lmfit GaussianModel.guess() and QuadraticModel.guess()
+    for ifit in range(nFit):
+        xi = np.asarray(xdata[ifit], dtype=np.float64)
+        yi = np.asarray(ydata[ifit], dtype=np.float64)
+        order = np.argsort(xi)
+        xs = xi[order]
+        ys = yi[order]
+        maxy, miny = np.max(ys), np.min(ys)
+        center = xs[np.argmax(ys)]
+        sigma = (xs[-1] - xs[0]) / 6.0
+        halfmax = xs[ys > (maxy + miny) / 2.0]
+        if len(halfmax) > 2:
+            sigma = (halfmax[-1] - halfmax[0]) / 2.0
+            center = halfmax.mean()
+        x0[ifit] = (xs[-1] + xs[0]) / 2.0
+        if xs[-1] > xs[0]:
+            scale[ifit] = (xs[-1] - xs[0]) / 2.0
+        ti = (xi - x0[ifit]) / scale[ifit]
+        param[ifit, :3] = (maxy - miny) * 3.0 * sigma / scale[ifit], (center - x0[ifit]) / scale[ifit], sigma / scale[ifit]
+        init = initParam[ifit] if len(initParam) > 0 else None
+        if init is not None:
+            param[ifit, :3] = init['peak_amplitude'] / scale[ifit], (init['peak_center'] - x0[ifit]) / scale[ifit], init['peak_sigma'] / scale[ifit]
+        if quadBkg:
+            if init is None or not 'bk_a' in init:
+                param[ifit, 3:] = np.polyfit(ti, yi - gaussianFunction(param[ifit, :3], ti), 2)
+            else:
+                #a * x ** 2 + b * x + c with x = x0 + scale * t
+                qa, qb, qc = init['bk_a'], init['bk_b'], init['bk_c']
+                param[ifit, 3:] = qa * scale[ifit] ** 2, (2 * qa * x0[ifit] + qb) * scale[ifit], qa * x0[ifit] ** 2 + qb * x0[ifit] + qc
+        t[ifit, :size[ifit]] = ti
+        y[ifit, :size[ifit]] = yi
+        w[ifit, :size[ifit]] = 1.0 / np.asarray(yerror[ifit], dtype=np.float64) if len(yerror) > 0 else 1.0
+
+    #Levenberg-Marquardt iterations of all unconverged spectra, with the normal equations scaled to unit diagonal
+    residual = (peakBatchFunction(param, t, quadBkg)[0] - y) * w
+    chi2 = np.sum(residual ** 2, axis=1)
+    damping = np.full(nFit, 1e-3)
+    active = np.ones(nFit, dtype=bool)
+    for ifev in range(maxfev):
+        index = np.flatnonzero(active)
+        if len(index) == 0:
+            break
+        jacobian = peakBatchFunction(param[index], t[index], quadBkg)[1] * w[index][:, :, None]
+        alpha = np.einsum('imk,iml->ikl', jacobian, jacobian)
+        beta = np.einsum('imk,im->ik', jacobian, residual[index])
+        diag = np.sqrt(np.diagonal(alpha, axis1=1, axis2=2))
+        diag[diag == 0] = 1.0
+        alpha = alpha / diag[:, :, None] / diag[:, None, :] + damping[index][:, None, None] * np.eye(nParam)
+        step = -np.linalg.solve(alpha, (beta / diag)[:, :, None])[:, :, 0] / diag
+        trial = param[index] + step
+        with np.errstate(all='ignore'):
+            trialResidual = (peakBatchFunction(trial, t[index], quadBkg)[0] - y[index]) * w[index]
+            trialChi2 = np.sum(trialResidual ** 2, axis=1)
+        better = (trialChi2 < chi2[index]) * (trial[:, 2] > 0) * np.isfinite(trialChi2)
+        #relative tolerances of the step and the chi square reduction being the defaults of lmfit
+        small = np.all(np.abs(step) <= 1.5e-8 * (np.abs(param[index]) + 1.5e-8), axis=1)
+        done = small + (better * (chi2[index] - trialChi2 <= 1.5e-8 * chi2[index])) + (damping[index] > 1e12)
+        accept = index[better]
+        param[accept] = trial[better]
+        residual[accept] = trialResidual[better]
+        chi2[accept] = trialChi2[better]
+        damping[index] = np.where(better, damping[index] / 10.0, damping[index] * 10.0)
+        active[index[done]] = False
+
+    #Errors from the covariance matrix scaled by reduced chi square, as lmfit does
+    jacobian = peakBatchFunction(param, t, quadBkg)[1] * w[:, :, None]
+    alpha = np.einsum('imk,iml->ikl', jacobian, jacobian)
+    fitResult = []
+    for ifit in range(nFit):
+        try:
+            covar = np.linalg.inv(alpha[ifit]) * chi2[ifit] / (size[ifit] - nParam)
+            paramErr = np.sqrt(np.diagonal(covar)) * scale[ifit]
+            if not np.all(np.isfinite(paramErr)):
+                raise np.linalg.LinAlgError
+        except np.linalg.LinAlgError:
+            paramErr = [None, None, None]
+        fitResult.append({
+                            'peak_amplitude':           param[ifit, 0] * scale[ifit],
+                            'peak_center':                x0[ifit] + param[ifit, 1] * scale[ifit],
+                            'peak_sigma':                 param[ifit, 2] * scale[ifit],
+                            'peak_amplitude_err':           paramErr[0],
+                            'peak_center_err':                paramErr[1],
+                            'peak_sigma_err':                 paramErr[2],
+            })
+        if quadBkg:
+            qa, qb, qc = param[ifit, 3:]
+            fitResult[-1]['bk_a'] = qa / scale[ifit] ** 2
+            fitResult[-1]['bk_b'] = qb / scale[ifit] - 2 * qa * x0[ifit] / scale[ifit] ** 2
+            fitResult[-1]['bk_c'] = qa * x0[ifit] ** 2 / scale[ifit] ** 2 - qb * x0[ifit] / scale[ifit] + qc
+    return fitResult
+
+def fitPeaks(x, spectrum, spectrumErr, xraw, rangeLim, odr = False, corrErr = [], maxiter = 1, bound = 3.0, quadBkg = True, initParam = []):
+
+    """
+    Function for fitting the peaks of multiple spectra in the way of fitSpectrum(), with a fit in the initial fit range, iterative fits in \
+[center - bound * sigma, center + bound * sigma] and a fit of the uncorrected spectrum for the peak count, all least square fits of each step being \
+done at once with doFitPeakBatch()
+    :param x: list of temperature-bias corrected bin centers of all spectra
+    :param spectrum: list of all spectra
+    :param spectrumErr: list of errors of all spectra
+    :param xraw: list of uncorrected bin centers of all spectra
+    :param rangeLim: list of initial fit ranges in corrected ADC channels, each in the form of [lower, upper]
+    :param odr: boolean indicating the fit method, True if the fit is done with odr, False if the fit is done with least square
+    :param corrErr: list of errors of temperature-bias correction factors of all spectra used for odr fits, empty list for none
+    :param maxiter: maximum number of iterations
+    :param bound: boundary for auto-correction in \sigma, with boundaries being \mu - bound * \sigma and \mu + bound * \sigma
+    :param quadBkg: boolean indicating whether the quadratic background is included in the fit function
+    :param initParam: list of peak fit results of a previous spectrum(e.g. the previous scan) for warm start, in the form of the fit result of \
+doFitPeak(), None or empty list for none. If given, the initial fit is started from these values in [center - bound * sigma, center + bound * sigma] \
+of the previous peak instead of rangeLim, and each following fit of the spectrum is started from the result of the fit before
+    :return: list of peak fit results and list of peak fit results of the uncorrected spectra, both in the form of the fit result of doFitPeak()
+    """
+
+    def fitWindow(index, windows, corrected = True, init = []):
+        xfit = [x[i][q] if corrected else xraw[i][q] for i, q in zip(index, windows)]
+        yfit = [spectrum[i][q] for i, q in zip(index, windows)]
+        yerr = [spectrumErr[i][q] for i, q in zip(index, windows)]
+        if len(init) == 0:
+            init = [None] * len(index)
+        if not odr:
+            return doFitPeakBatch(xfit, yfit, yerr, quadBkg, initParam = init)
+        if not corrected or len(corrErr) == 0:
+            return [doFitPeak(xfit[j], yfit[j], odr, yerror = yerr[j], quadBkg = quadBkg, initParam = init[j]) for j in range(len(index))]
+        return [doFitPeak(xfit[j], yfit[j], odr, xfit[j] * corrErr[i], yerror = yerr[j], quadBkg = quadBkg, initParam = init[j]) for j, i in enumerate(index)]
+
+    nFit = len(x)
+    index = list(range(nFit))
+    windows = []
+    init = []
+    for i in index:
+        window = (x[i] >= rangeLim[i][0]) * (x[i] < rangeLim[i][1])
+        previous = initParam[i] if len(initParam) > 0 else None
+        if previous is not None:
+            center = previous['peak_center']
+            sigma = previous['peak_sigma']
+            previousWindow = (x[i] >= center - bound * sigma) * (x[i] < center + bound * sigma)
+            #previous results out of the spectrum or failed are not used
+            if np.isfinite(center) and np.isfinite(sigma) and sigma > 0 and np.sum(previousWindow) >= (6 if quadBkg else 3):
+                window = previousWindow
+            else:
+                previous = None
+        windows.append(window)
+        init.append(previous)
+    warm = [previous is not None for previous in init]
+    result = fitWindow(index, windows, init = init)
+
+    #Iteration part
+    active = index
+    for iit in range(maxiter):
+        if len(active) == 0:
+            break
+        last = [(result[i]['peak_center'], result[i]['peak_sigma']) for i in active]
+        current = fitWindow(active, [(x[i] >= result[i]['peak_center'] - bound * result[i]['peak_sigma']) * (x[i] < result[i]['peak_center'] + bound * \
+            result[i]['peak_sigma']) for i in active], init = [result[i] if warm[i] else None for i in active])
+        nextActive = []
+        for j, i in enumerate(active):
+            result[i] = current[j]
+            lastCenter, lastSigma = last[j]
+            if not (np.abs((lastCenter - result[i]['peak_center']) / lastCenter) < 1e-4 and np.abs((lastSigma - result[i]['peak_sigma']) / lastSigma) < 1e-4):
+                nextActive.append(i)
+        active = nextActive
+
+    #Count rate part, warm-started fits started from the peak of the corrected spectrum scaled back with the correction factor x / xraw
+    init = []
+    for i in index:
+        if not warm[i]:
+            init.append(None)
+            continue
+        factor = np.sum(x[i]) / np.sum(xraw[i])
+        init.append({
+                        'peak_amplitude':           result[i]['peak_amplitude'] / factor,
+                        'peak_center':                result[i]['peak_center'] / factor,
+                        'peak_sigma':                 result[i]['peak_sigma'] / factor,
+            })
+        if quadBkg:
+            init[-1]['bk_a'] = result[i]['bk_a'] * factor ** 2
+            init[-1]['bk_b'] = result[i]['bk_b'] * factor
+            init[-1]['bk_c'] = result[i]['bk_c']
+    resultRate = fitWindow(index, [(x[i] >= result[i]['peak_center'] - bound * result[i]['peak_sigma']) * (x[i] < result[i]['peak_center'] + bound * \
+        result[i]['peak_sigma']) for i in index], False, init)
+    return result, resultRate
+
 def doFitDouble(xdata, ydata, range):
     
     """
@@ -2399,6 +4320,32 @@ def quadFunction(param, x):
     
     return param[0] * x ** 2 + param[1] * x + param[2]
 
+def quadJacobian(param, x):
+
+    """
+    Auxiliary function to calculate the derivatives of the quadratic function against its parameters, used as fjacb of odr fitting
+    :param param: parameters of the quadratic function, in the form of [a, b, c]
+    :param x: input x value
+    :return: derivatives against a, b and c, in the form of [parameter][data]
+    """
+
+    return np.array([x ** 2, x, np.ones(np.shape(x))])
+
+def quadSlope(param, x):
+
+    """
+    Auxiliary function to calculate the derivative of the quadratic function against x, used as fjacd of odr fitting
+    :param param: parameters of the quadratic function, in the form of [a, b, c]
+    :param x: input x value
+    :return: derivative against x
+    """
+
+    return 2 * param[0] * x + param[1]
+
+#Builders of the reusable fit models of the quadratic function
+fitModelBuilders['quadOdr'] = lambda: scipyOdr.Model(quadFunction, fjacb = quadJacobian, fjacd = quadSlope)
+fitModelBuilders['quadFit'] = lambda: lmfit.models.QuadraticModel(prefix = 'fit_')
+
 def doFitQuad(xdata, ydata, odr = False, xerror = [], yerror = []):
 
     """
@@ -2421,22 +4368,21 @@ def doFitQuad(xdata, ydata, odr = False, xerror = [], yerror = []):
     fit_a * x ** 2 + fit_b * x + fit_c
     """
 
-    qModel = lmfit.models.QuadraticModel(prefix = 'fit_')
+    qModel = fitModel('quadFit')
     param = qModel.guess(ydata, x = xdata)
     if odr:
         if len(xerror) == 0:
             if len(yerror) == 0:
-               data = RealData(xdata, ydata)
+               data = scipyOdr.RealData(xdata, ydata)
             else:
-               data = RealData(xdata, ydata, sy = yerror)
+               data = scipyOdr.RealData(xdata, ydata, sy = yerror)
         else:
             if len(yerror) == 0:
-                data = RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
+                data = scipyOdr.RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
             else:
-                data = RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
-        model = Model(quadFunction)
-        odrFit = ODR(data, model, [param.valuesdict()['fit_a'], param.valuesdict()['fit_b'], param.valuesdict()['fit_c']])
-        odrFit.set_job(fit_type = 0)
+                data = scipyOdr.RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
+        odrFit = scipyOdr.ODR(data, fitModel('quadOdr'), [param.valuesdict()['fit_a'], param.valuesdict()['fit_b'], param.valuesdict()['fit_c']])
+        odrFit.set_job(fit_type = 0, deriv = 3)
         result = odrFit.run()
         fitResult = {
                         'fit_a':            result.beta[0],
@@ -2448,9 +4394,9 @@ def doFitQuad(xdata, ydata, odr = False, xerror = [], yerror = []):
             }
     else:
         if len(yerror) == 0:
-            result = qModel.fit(ydata, param, x = xdata)
+            result = qModel.fit(ydata, param, x = xdata, fit_kws = {'Dfun': gaussQuadDfun, 'col_deriv': 1})
         else:
-            result = qModel.fit(ydata, param, x = xdata, weights = 1. / np.array(yerror))
+            result = qModel.fit(ydata, param, x = xdata, weights = 1. / np.array(yerror), fit_kws = {'Dfun': gaussQuadDfun, 'col_deriv': 1})
         fitResult = {
                         'fit_a':            result.best_values['fit_a'],
                         'fit_b':            result.best_values['fit_b'],
@@ -2484,6 +4430,58 @@ def expFunctionNoConst(param, x):
     C = 50e-6
     return param[0] * np.exp(- (x - C) / param[1])
 
+def expJacobian(param, x):
+
+    """
+    Auxiliary function to calculate the derivatives of the exponential function with a constant against its parameters, used as fjacb of odr fitting
+    :param param: parameters of the exponential function, in the form of [a, b, c]
+    :param x: input x value
+    :return: derivatives against a, b and c, in the form of [parameter][data]
+    """
+
+    exp = np.exp(x / param[1])
+    return np.array([exp, - param[0] * exp * x / param[1] ** 2, np.ones(np.shape(x))])
+
+def expSlope(param, x):
+
+    """
+    Auxiliary function to calculate the derivative of the exponential function with a constant against x, used as fjacd of odr fitting
+    :param param: parameters of the exponential function, in the form of [a, b, c]
+    :param x: input x value
+    :return: derivative against x
+    """
+
+    return param[0] * np.exp(x / param[1]) / param[1]
+
+def expNoConstJacobian(param, x):
+
+    """
+    Auxiliary function to calculate the derivatives of the exponential function with no constant against its parameters, used as fjacb of odr fitting
+    :param param: parameters of the exponential function, in the form of [a, b]
+    :param x: input x value
+    :return: derivatives against a and b, in the form of [parameter][data]
+    """
+
+    C = 50e-6
+    exp = np.exp(- (x - C) / param[1])
+    return np.array([exp, param[0] * exp * (x - C) / param[1] ** 2])
+
+def expNoConstSlope(param, x):
+
+    """
+    Auxiliary function to calculate the derivative of the exponential function with no constant against x, used as fjacd of odr fitting
+    :param param: parameters of the exponential function, in the form of [a, b]
+    :param x: input x value
+    :return: derivative against x
+    """
+
+    return - expFunctionNoConst(param, x) / param[1]
+
+#Builders of the reusable fit models of the exponential functions
+fitModelBuilders['expOdr'] = lambda: scipyOdr.Model(expFunction, fjacb = expJacobian, fjacd = expSlope)
+fitModelBuilders['expNoConstOdr'] = lambda: scipyOdr.Model(expFunctionNoConst, fjacb = expNoConstJacobian, fjacd = expNoConstSlope)
+fitModelBuilders['expFit'] = lambda: lmfit.models.ExponentialModel(prefix = 'fit_')
+
 def doFitExp(xdata, ydata, odr = False, xerror = [], yerror = [], fitRate = False):
 
     """
@@ -2507,28 +4505,25 @@ def doFitExp(xdata, ydata, odr = False, xerror = [], yerror = [], fitRate = Fals
     fit_a * exp(x / fit_b) + fit_c
     """
 
-    eModel = lmfit.models.ExponentialModel(prefix = 'fit_')
-    param = eModel.guess(ydata, x = xdata)
+    param = fitModel('expFit').guess(ydata, x = xdata)
     if len(xerror) == 0:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata)
+            data = scipyOdr.RealData(xdata, ydata)
         else:
-            data = RealData(xdata, ydata, sy = yerror)
+            data = scipyOdr.RealData(xdata, ydata, sy = yerror)
     else:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
         else:
-            data = RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
     if fitRate:
-        model = Model(expFunctionNoConst)
-        odrFit = ODR(data, model, [param.valuesdict()['fit_amplitude'], param.valuesdict()['fit_decay']])
+        odrFit = scipyOdr.ODR(data, fitModel('expNoConstOdr'), [param.valuesdict()['fit_amplitude'], param.valuesdict()['fit_decay']])
     else:
-        model = Model(expFunction)
-        odrFit = ODR(data, model, [param.valuesdict()['fit_amplitude'], - param.valuesdict()['fit_decay'], 1e-6])
+        odrFit = scipyOdr.ODR(data, fitModel('expOdr'), [param.valuesdict()['fit_amplitude'], - param.valuesdict()['fit_decay'], 1e-6])
     if odr:
-        odrFit.set_job(fit_type = 0)
+        odrFit.set_job(fit_type = 0, deriv = 3)
     else:
-        odrFit.set_job(fit_type = 2)
+        odrFit.set_job(fit_type = 2, deriv = 3)
     result = odrFit.run()
     if fitRate:
         fitResult = {
@@ -2588,16 +4583,16 @@ def doLinExpFit(xdata, ydata, init, odr = False, xerror = [], yerror = []):
 
     if len(xerror) == 0:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata)
+            data = scipyOdr.RealData(xdata, ydata)
         else:
-            data = RealData(xdata, ydata, sy = yerror)
+            data = scipyOdr.RealData(xdata, ydata, sy = yerror)
     else:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
         else:
-            data = RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
-    model = Model(linExpFunction)
-    odrFit = ODR(data, model, list(init))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
+    model = scipyOdr.Model(linExpFunction)
+    odrFit = scipyOdr.ODR(data, model, list(init))
     if odr:
         odrFit.set_job(fit_type = 0)
     else:
@@ -2650,16 +4645,16 @@ def doRevExpFit(xdata, ydata, init, odr = False, xerror = [], yerror = []):
 
     if len(xerror) == 0:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata)
+            data = scipyOdr.RealData(xdata, ydata)
         else:
-            data = RealData(xdata, ydata, sy = yerror)
+            data = scipyOdr.RealData(xdata, ydata, sy = yerror)
     else:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
         else:
-            data = RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
-    model = Model(revExpFunction)
-    odrFit = ODR(data, model, list(init))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
+    model = scipyOdr.Model(revExpFunction)
+    odrFit = scipyOdr.ODR(data, model, list(init))
     if odr:
         odrFit.set_job(fit_type = 0)
     else:
@@ -2712,16 +4707,16 @@ def doRevLinExpFit(xdata, ydata, init, odr = False, xerror = [], yerror = []):
 
     if len(xerror) == 0:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata)
+            data = scipyOdr.RealData(xdata, ydata)
         else:
-            data = RealData(xdata, ydata, sy = yerror)
+            data = scipyOdr.RealData(xdata, ydata, sy = yerror)
     else:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
         else:
-            data = RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
-    model = Model(revLinExpFunction)
-    odrFit = ODR(data, model, list(init))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
+    model = scipyOdr.Model(revLinExpFunction)
+    odrFit = scipyOdr.ODR(data, model, list(init))
     if odr:
         odrFit.set_job(fit_type = 0)
     else:
@@ -2776,16 +4771,16 @@ def doMixedExpFit(xdata, ydata, init, odr = False, xerror = [], yerror = []):
 
     if len(xerror) == 0:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata)
+            data = scipyOdr.RealData(xdata, ydata)
         else:
-            data = RealData(xdata, ydata, sy = yerror)
+            data = scipyOdr.RealData(xdata, ydata, sy = yerror)
     else:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
         else:
-            data = RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
-    model = Model(mixedExpFunction)
-    odrFit = ODR(data, model, list(init))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
+    model = scipyOdr.Model(mixedExpFunction)
+    odrFit = scipyOdr.ODR(data, model, list(init))
     if odr:
         odrFit.set_job(fit_type = 0)
     else:
@@ -2838,16 +4833,16 @@ def doFixedExpFit(xdata, ydata, init, odr = False, xerror = [], yerror = []):
 
     if len(xerror) == 0:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata)
+            data = scipyOdr.RealData(xdata, ydata)
         else:
-            data = RealData(xdata, ydata, sy = yerror)
+            data = scipyOdr.RealData(xdata, ydata, sy = yerror)
     else:
         if len(yerror) == 0:
-            data = RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, fix = np.ones(len(xerror)))
         else:
-            data = RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
-    model = Model(fixedExpFunction)
-    odrFit = ODR(data, model, list(init))
+            data = scipyOdr.RealData(xdata, ydata, sx = xerror, sy = yerror, fix = np.ones(len(xerror)))
+    model = scipyOdr.Model(fixedExpFunction)
+    odrFit = scipyOdr.ODR(data, model, list(init))
     if odr:
         odrFit.set_job(fit_type = 0)
     else:
@@ -2875,6 +4870,33 @@ def convExpFunction(param, x):
     C = 50e-6
     return param[0] + 42.0 * np.log(x - 43 * C) - 43.0 * np.log(param[1]) - (x - 43 * C) / param[1]
 
+def convExpJacobian(param, x):
+
+    """
+    Auxiliary function to calculate the derivatives of convExpFunction() against its parameters, used as fjacb of odr fitting
+    :param param: parameters of the function, in the form of [A, b]
+    :param x: x value
+    :return: derivatives against A and b, in the form of [parameter][data]
+    """
+
+    C = 50e-6
+    return np.array([np.ones(np.shape(x)), - 43.0 / param[1] + (x - 43 * C) / param[1] ** 2])
+
+def convExpSlope(param, x):
+
+    """
+    Auxiliary function to calculate the derivative of convExpFunction() against x, used as fjacd of odr fitting
+    :param param: parameters of the function, in the form of [A, b]
+    :param x: x value
+    :return: derivative against x
+    """
+
+    C = 50e-6
+    return 42.0 / (x - 43 * C) - 1.0 / param[1]
+
+#Builder of the reusable fit model of convExpFunction()
+fitModelBuilders['convExpOdr'] = lambda: scipyOdr.Model(convExpFunction, fjacb = convExpJacobian, fjacd = convExpSlope)
+
 def doConvExpFit(xdata, ydata, init, odr = False, xerror = [], yerror = []):
 
     """
@@ -2899,20 +4921,19 @@ def doConvExpFit(xdata, ydata, init, odr = False, xerror = [], yerror = []):
 
     if len(xerror) == 0:
         if len(yerror) == 0:
-            data = RealData(xdata, np.log(ydata))
+            data = scipyOdr.RealData(xdata, np.log(ydata))
         else:
-            data = RealData(xdata, np.log(ydata), sy = yerror / ydata)
+            data = scipyOdr.RealData(xdata, np.log(ydata), sy = yerror / ydata)
     else:
         if len(yerror) == 0:
-            data = RealData(xdata, np.log(ydata), sx = xerror, fix = np.ones(len(xerror)))
+            data = scipyOdr.RealData(xdata, np.log(ydata), sx = xerror, fix = np.ones(len(xerror)))
         else:
-            data = RealData(xdata, np.log(ydata), sx = xerror, sy = yerror / ydata, fix = np.ones(len(xerror)))
-    model = Model(convExpFunction)
-    odrFit = ODR(data, model, list(init))
+            data = scipyOdr.RealData(xdata, np.log(ydata), sx = xerror, sy = yerror / ydata, fix = np.ones(len(xerror)))
+    odrFit = scipyOdr.ODR(data, fitModel('convExpOdr'), list(init))
     if odr:
-        odrFit.set_job(fit_type = 0)
+        odrFit.set_job(fit_type = 0, deriv = 3)
     else:
-        odrFit.set_job(fit_type = 2)
+        odrFit.set_job(fit_type = 2, deriv = 3)
     result = odrFit.run()
     fitResult = {
                     'fit_a':            result.beta[0],
@@ -2951,7 +4972,34 @@ def residualQuad3D(param, xdata, ydata, zdata):
     
     return zdata - quad3DFunction(param, xdata, ydata)
 
-def fitRateCorrect(filename, timeCorrect, plot = True, odr = False, rateStyle = ''):
+def estimateLiveTime(timeCorrect, rateStyle):
+
+    """
+    Function for estimating the live time parameter b of the count rate correction directly from the unbinned live time data with maximum likelihood, \
+as a fast alternative to the histogram fits of fitRateCorrect()
+    For 's' the live time above C follows the exponential distribution exp(-(x - C) / b) / b, so b is the mean of x - C
+    For 'p' the live time of 43 events above 43 * C follows the Erlang distribution of shape 43 and scale b, so b is the mean of x - 43 * C divided by 43
+    :param timeCorrect: correct live time calculated when reading data
+    :param rateStyle: the style of calculating real count rate, 's' for single live time data, 'p' for calculation with small data packs(512byte)
+    :return: b, its error and the number of live time data used, as a tuple
+    """
+
+    C = 50e-6
+    if rateStyle == 's':
+        offset = C
+        shape = 1
+    else:
+        offset = 43 * C
+        shape = 43
+    timeCorrect = np.asarray(timeCorrect, dtype=np.float64)
+    interval = timeCorrect[timeCorrect > offset] - offset
+    if len(interval) == 0:
+        raise Exception('estimateLiveTime: no live time data above the dead time')
+    b = np.mean(interval) / shape
+    bErr = b / np.sqrt(shape * len(interval))
+    return b, bErr, len(interval)
+
+def fitRateCorrect(filename, timeCorrect, plot = True, odr = False, rateStyle = '', deferPlot = False, unbinned = False, crossCheck = False):
 
     """
     Function for calculating correct total count rate and its error with the timeCorrect calculated when reading the data
@@ -2959,7 +5007,10 @@ def fitRateCorrect(filename, timeCorrect, plot = True, odr = False, rateStyle =
     :param timeCorrect: correct live time calculated when reading data
     :param plot: boolean indicating the whether the plotting of the fit result will be done
     :param odr: boolean indicating the fit method, True if the fit is done with odr, False if the fit is done with least square
-    :return: correct total count rate and its error, as a tuple
+    :param deferPlot: boolean indicating whether to return the plot data for plotRateCorrect() along with the count rate instead of plotting
+    :param unbinned: boolean indicating whether the live time is estimated from the unbinned data with estimateLiveTime() instead of the histogram fit
+    :param crossCheck: boolean indicating whether the unbinned estimation is checked against the histogram fit, with both results printed
+    :return: correct total count rate and its error, as a tuple, with the plot data appended if deferPlot is True
     """
 
     styleAvailable = ['s', 'p']
@@ -2967,56 +5018,145 @@ def fitRateCorrect(filename, timeCorrect, plot = True, odr = False, rateStyle =
         raise Exception('fitRateCorrect: unknown count rate correction style ' + rateStyle)
     rateAll = 0.0
     rateAllErr = 0.0
-    specTime, xdata = np.histogram(timeCorrect, bins=250, range=[np.min(timeCorrect), np.max(timeCorrect)])
-    xdata = (xdata[:-1] + xdata[1:]) / 2
     C = 50e-6
-    if rateStyle == 's':
-        qFit = xdata > C
-        result = doFitExp(xdata[qFit], specTime[qFit], odr = odr, yerror = gehrelsErr(specTime[qFit]), fitRate = True)
-        a = result['fit_a']
-        b = result['fit_b']
-        bErr = result['fit_b_err']
-    else:
-        qFit = (xdata > 43 * C) * (specTime > 0)
-        result = doConvExpFit(xdata[qFit], specTime[qFit], (1., C), odr = odr, yerror = gehrelsErr(specTime[qFit]))
-        a = result['fit_a']
-        b = result['fit_b']
-        bErr = result['fit_b_err']
+    if not unbinned or crossCheck or plot or deferPlot:
+        specTime, xdata = np.histogram(timeCorrect, bins=250, range=[np.min(timeCorrect), np.max(timeCorrect)])
+        width = xdata[1] - xdata[0]
+        xdata = (xdata[:-1] + xdata[1:]) / 2
+    if not unbinned or crossCheck:
+        if rateStyle == 's':
+            qFit = xdata > C
+            result = doFitExp(xdata[qFit], specTime[qFit], odr = odr, yerror = gehrelsErr(specTime[qFit]), fitRate = True)
+            a = result['fit_a']
+            b = result['fit_b']
+            bErr = result['fit_b_err']
+        else:
+            qFit = (xdata > 43 * C) * (specTime > 0)
+            result = doConvExpFit(xdata[qFit], specTime[qFit], (1., C), odr = odr, yerror = gehrelsErr(specTime[qFit]))
+            a = result['fit_a']
+            b = result['fit_b']
+            bErr = result['fit_b_err']
+    if unbinned:
+        fitB, fitBErr = (b, bErr) if crossCheck else (0.0, 0.0)
+        b, bErr, nTime = estimateLiveTime(timeCorrect, rateStyle)
+        #amplitude of the expected counts in the histogram bins, for plotting
+        if plot or deferPlot:
+            if rateStyle == 's':
+                a = nTime * width / b
+            else:
+                a = np.log(nTime * width) - np.sum(np.log(np.arange(1, 43)))
+        if crossCheck:
+            print('fitRateCorrect: live time of ' + filename + ' estimated as ' + str('%.4e' % b) + ' +- ' + str('%.3e' % bErr) + 's from unbinned data and ' + \
+                str('%.4e' % fitB) + ' +- ' + str('%.3e' % fitBErr) + 's from histogram fit, differing by ' + str('%.2f' % (np.abs(b - fitB) / np.sqrt(bErr ** 2 + \
+                fitBErr ** 2))) + ' sigma')
     rateAll = 1 / b
     rateAllErr = bErr / b ** 2
+    if not plot and not deferPlot:
+        return rateAll, rateAllErr
+    plotData = {
+                    'filename':     filename,
+                    'rateStyle':    rateStyle,
+                    'unbinned':     unbinned,
+                    'xdata':        xdata,
+                    'specTime':     specTime,
+                    'a':            a,
+                    'b':            b,
+                    'bErr':         bErr,
+                    'C':            C,
+                    'timeAverage':  np.average(timeCorrect),
+                    'rateAll':      rateAll,
+                    'rateAllErr':   rateAllErr,
+        }
+    if deferPlot:
+        return rateAll, rateAllErr, plotData
     if plot:
-        if rateStyle == 's':
-            fitSpec = expFunctionNoConst([a, b], xdata)
-            qPlot = xdata > C
-        else:
-            fitSpec = np.exp(convExpFunction([a, b], xdata))
-            qPlot = xdata > 43 * C
-        fig = plt.figure(figsize=(12, 8))
-        gs = gridspec.GridSpec(1, 1, wspace=0.5, hspace=0.2, left=0.13, right=0.95)
-        ax = fig.add_subplot(gs[0])
-        plt.step(xdata, specTime, where='mid', label='raw data', zorder=1)
-        if rateStyle == 's':
-            plt.plot(xdata[qPlot], fitSpec[qPlot], label='Exponential Fit')
-        else:
-            plt.plot(xdata[qPlot], fitSpec[qPlot], label='Exponential-convolution Fit')
-        plt.text(np.average(timeCorrect), max(specTime) * 1.1, 'live time = ' + str('%.2e' % (b)) + ' $\pm$ ' + str('%.3e' % (bErr)) + 's\ncount rate = ' + \
-            str('%.2e' % (rateAll)) + ' $\pm$ ' + str('%.3e' % (rateAllErr)) + 'cps', fontsize=10, bbox=dict(facecolor='pink', alpha=0.1), horizontalalignment='center', \
-            verticalalignment='center')
-        ax.set_ylim([0, 1.2 * np.max(specTime)])
-        if rateStyle == 's':
-            ax.set_title('Fit of live time of ' + filename + '\nFit function: ' + r'$A e^{- \frac{x - C}{b}}$')
-        else:
-            ax.set_title('Fit of live time of ' + filename + '\nFit function: ' + r'$\frac{A (x - 43 C)^{42}}{(42)!b^{43}} e^{- (x - 43C) / b}$')
-        ax.set_xlabel('live time/s')
-        ax.set_ylabel('count in bins')
-        ax.legend(loc=0)
-        ax.grid()
-        plt.show()
+        submitPlot(plotRateCorrect, plotData)
     return rateAll, rateAllErr
 
+def plotRateCorrect(plotData):
+
+    """
+    Function for plotting the live time fit results of fitRateCorrect()
+    :param plotData: plot data returned by fitRateCorrect() with deferPlot, in the form of a dictionary as
+        {
+            'filename':     name of amplitude data file,
+            'rateStyle':    the style of calculating real count rate,
+            'unbinned':     boolean indicating whether the live time is estimated from the unbinned data,
+            'xdata':        centers of the live time bins,
+            'specTime':     counts in the live time bins,
+            'a':            fitted amplitude,
+            'b':            fitted live time,
+            'bErr':         error of fitted live time,
+            'C':            dead time constant,
+            'timeAverage':  average live time,
+            'rateAll':      correct total count rate,
+            'rateAllErr':   error of correct total count rate,
+        }
+    :return: nothing
+    """
+
+    filename = plotData['filename']
+    rateStyle = plotData['rateStyle']
+    xdata = plotData['xdata']
+    specTime = plotData['specTime']
+    a = plotData['a']
+    b = plotData['b']
+    bErr = plotData['bErr']
+    C = plotData['C']
+    rateAll = plotData['rateAll']
+    rateAllErr = plotData['rateAllErr']
+    if rateStyle == 's':
+        fitSpec = expFunctionNoConst([a, b], xdata)
+        qPlot = xdata > C
+    else:
+        fitSpec = np.exp(convExpFunction([a, b], xdata))
+        qPlot = xdata > 43 * C
+    fig = plt.figure(figsize=(12, 8))
+    gs = gridspec.GridSpec(1, 1, wspace=0.5, hspace=0.2, left=0.13, right=0.95)
+    ax = fig.add_subplot(gs[0])
+    plt.step(xdata, specTime, where='mid', label='raw data', zorder=1)
+    if plotData.get('unbinned', False):
+        plt.plot(xdata[qPlot], fitSpec[qPlot], label='Unbinned Maximum Likelihood Estimation')
+    elif rateStyle == 's':
+        plt.plot(xdata[qPlot], fitSpec[qPlot], label='Exponential Fit')
+    else:
+        plt.plot(xdata[qPlot], fitSpec[qPlot], label='Exponential-convolution Fit')
+    plt.text(plotData['timeAverage'], max(specTime) * 1.1, 'live time = ' + str('%.2e' % (b)) + ' $\pm$ ' + str('%.3e' % (bErr)) + 's\ncount rate = ' + \
+        str('%.2e' % (rateAll)) + ' $\pm$ ' + str('%.3e' % (rateAllErr)) + 'cps', fontsize=10, bbox=dict(facecolor='pink', alpha=0.1), horizontalalignment='center', \
+        verticalalignment='center')
+    ax.set_ylim([0, 1.2 * np.max(specTime)])
+    if rateStyle == 's':
+        ax.set_title('Fit of live time of ' + filename + '\nFit function: ' + r'$A e^{- \frac{x - C}{b}}$')
+    else:
+        ax.set_title('Fit of live time of ' + filename + '\nFit function: ' + r'$\frac{A (x - 43 C)^{42}}{(42)!b^{43}} e^{- (x - 43C) / b}$')
+    ax.set_xlabel('live time/s')
+    ax.set_ylabel('count in bins')
+    ax.legend(loc=0)
+    ax.grid()
+    showFigure(fig)
+    return
+
+def getInitParam(fitResult):
+
+    """
+    Auxiliary function to convert a fit result of fitSpectrum() into the initial values of doFitPeak() for warm-started fits
+    :param fitResult: fit result of a single channel returned by fitSpectrum()
+    :return: initial values in the form of the fit result of doFitPeak()
+    """
+
+    initParam = {
+                    'peak_amplitude':           fitResult['a'],
+                    'peak_center':                fitResult['b'],
+                    'peak_sigma':                 fitResult['c'],
+        }
+    if len(fitResult.get('bkg', [])) == 3:
+        initParam['bk_a'], initParam['bk_b'], initParam['bk_c'] = fitResult['bkg']
+    return initParam
+
 def fitSpectrum(filename, amp, nbins, source, corr, time, fileOutput = False, singlech = False, bkg = False, odr = False, xRange = [],\
  channel = -1, corrErr = [], bkgAmp = [], bkgtime = [], maxiter = 1, bound = 3.0, plot = True, rateStyle = '', rateAll = 0.0, rateAllErr = 0.0,\
- bkgRate = 0.0, bkgRateErr = 0.0, quadBkg = True, doCorr = True):
+ bkgRate = 0.0, bkgRateErr = 0.0, quadBkg = True, doCorr = True, full = None, bkgFull = None, deferPlot = False, initResult = None, peakWindow = None, \
+ cacheDir = '', cacheSize = 2048, sourceFiles = []):
     
     """
     Function for fitting the spectrum
@@ -3046,6 +5186,18 @@ and background) should be given in *args along with the background amplitude
     :param bkgRateErr: error of bkgRate
     :param quadBkg: boolean indicating whether the quadratic background is included in the fit function
     :param doCorr: boolean indicating whether the temperature-bias correction will be done, to avoid warning info output
+    :param full: full resolution spectrum of all 4 channels from fullSpectrum(), calculated from amp if not given
+    :param bkgFull: full resolution spectrum of all 4 channels of background data, calculated from bkgAmp if not given
+    :param deferPlot: boolean indicating whether to return the plot data for plotSpectrumFit() along with the fit results instead of plotting
+    :param initResult: fit results of a previous spectrum with the same channels(e.g. the previous scan) returned by fitSpectrum() for warm start, \
+the fits being started from the previous peaks and background in [center - bound * sigma, center + bound * sigma] instead of the reference fit range. \
+None for no warm start
+    :param peakWindow: fit windows of all 4 channels in uncorrected ADC channels proposed by locatePeaks(), in the form of [channel][lower, upper], \
+used instead of the reference fit range or xRange for the channels with a peak found(no nan). None for none
+    :param cacheDir: directory of the fit result cache, the results of a fit with the same binned spectra and fit options being loaded from the cache \
+instead of fitted again. Not used with fileOutput. Empty string for no cache
+    :param cacheSize: maximum total size of the cache in MB
+    :param sourceFiles: names of the raw output files of the spectra(data and background), recorded in the fit cache entry for clearReadoutCache()
     :return: fit parameters of the gaussian peak to be used for experiment-level processing, in the form of a dictionary:
         {
             'a':        amplitude,
@@ -3056,24 +5208,27 @@ and background) should be given in *args along with the background amplitude
             'c_err':    error of sigma,
             'rate':        peak count rate,
             'rate_err':        error of peak count rate,
+            'bkg':      quadratic background of the fit in the form of [a, b, c], empty list for no background,
         }
     Suggested nbins for various sources at normal temperature and bias level:
     Am241, Ba133: 2048
     Cs137, Na22, Co60: 512
     Th228: 1024
-    x: varies with different circumstances, try plotting and finding the range a bit more, MAY IMPLEMENT AN AUTOMATIC RANGE-\
-FINDING WITH THE RESOLUTION FIT DATA
+    x: varies with different circumstances, try plotting and finding the range a bit more, or use the fit windows proposed by locatePeaks()
     """
     
     #Reference fit range data
-    fitRange = {
-            'Am241':    np.array([[1100, 2800], [1100, 2300], [1100, 2600], [1200, 2900]]),
-            'Ba133':    np.array([[2500, 4500], [2800, 5500], [2800, 5500], [3200, 5500]]),
-            'Na22':     np.array([[12800, 18000], [12000, 16700], [14000, 18000], [14000, 18600]]),
-            'Cs137':    np.array([[16600, 23100], [16600, 21800], [17200, 25000], [18500, 25000]]),
-            'Th228':    np.array([[5100, 7700], [5700, 8400], [5400, 8000], [5700, 8400]]),
-            'Co60':    np.array([[35840, 41000], [35200, 39700], [38400, 44200], [40320, 46100]]),
-        }
+    fitRange = {key: np.array(sourceFitRange[key], dtype=float) for key in sourceFitRange}
+
+    #Fit windows proposed by the peak locator
+    found = [False, False, False, False]
+    if peakWindow is not None:
+        peakWindow = np.array(peakWindow, dtype=float).reshape(4, 2)
+        found = list(np.all(np.isfinite(peakWindow), axis=1) * (peakWindow[:, 0] > 0) * (peakWindow[:, 1] > peakWindow[:, 0]))
+        if source == 'x' and len(xRange) == 0:
+            if not (isChannel(channel) and found[channel] if singlech else all(found)):
+                raise Exception('fitSpectrum: no peak located for the x-ray fit, please specify the fit range')
+            xRange = list(peakWindow[channel]) if singlech else list(peakWindow)
 
     if not source in fitRange or len(xRange) == 2:
         if source == 'x':
@@ -3110,23 +5265,67 @@ FINDING WITH THE RESOLUTION FIT DATA
                     pass
                 corr = [1.0, 1.0, 1.0, 1.0]
                 corrErr = []
+    if singlech:
+        if isChannel(channel) and found[channel]:
+            rangeLim = peakWindow[channel]
+    else:
+        rangeLim = [peakWindow[ich] if found[ich] else rangeLim[ich] for ich in range(4)]
 
-    if fileOutput:
-        try:
-            fout = open('fit_' + filename, 'w')
-        except:
-            raise Exception('fitSpectrum: Error opening output file')
-        
     if singlech:
         if not isChannel(channel):
             raise Exception('fitSpectrum: channel number out of bound[0-3]')
-        spectrum, xraw = getSpectrum(amp[channel], nbins, singlech)
+        spectrum, xraw = getSpectrum(amp[channel], nbins, singlech, None if full is None else full[channel])
         spectrumStatErr = gehrelsErr(spectrum)
     else:
-        spectrum, xraw = getSpectrum(amp, nbins, singlech)
+        spectrum, xraw = getSpectrum(amp, nbins, singlech, full)
         spectrumStatErr = []
         for ich in range(4):
             spectrumStatErr.append(gehrelsErr(spectrum[ich]))
+    bkgSpectrum = None
+    if bkg and not len(bkgAmp) == 0:
+        if singlech:
+            bkgSpectrum = getSpectrum(bkgAmp[channel], nbins, singlech, None if bkgFull is None else bkgFull[channel])[0]
+        else:
+            bkgSpectrum = getSpectrum(bkgAmp, nbins, singlech, bkgFull)[0]
+
+    #Fit result cache, keyed by the binned spectra and all options affecting the results
+    cacheKey = ''
+    if not cacheDir == '' and not fileOutput:
+        cacheKey = fitCacheKey(spectrum, bkgSpectrum, {
+                    'source':       source,
+                    'nbins':        nbins,
+                    'singlech':     singlech,
+                    'channel':      channel,
+                    'range':        rangeLim,
+                    'corr':         corr,
+                    'corrErr':      corrErr,
+                    'time':         time,
+                    'odr':          odr,
+                    'maxiter':      maxiter,
+                    'bound':        bound,
+                    'quadBkg':      quadBkg,
+                    'rateStyle':    rateStyle,
+                    'rate':         [rateAll, rateAllErr, bkgRate, bkgRateErr] if not rateStyle == '' else [],
+                    'count':        [len(amp[ich]) for ich in range(4)] + [len(bkgAmp[ich]) for ich in range(4) if bkgSpectrum is not None] \
+                        if not rateStyle == '' else [],
+                    'bkgtime':      bkgtime if bkgSpectrum is not None else [],
+                    'init':         initResult,
+            })
+        cached = loadFitCache(cacheDir, cacheKey)
+        if cached is not None:
+            fitResult, plotData = cached
+            plotData['filename'] = filename
+            if deferPlot:
+                return fitResult, plotData
+            if plot:
+                submitPlot(plotSpectrumFit, plotData)
+            return fitResult
+
+    if fileOutput:
+        try:
+            fout = open('fit_' + filename, 'w')
+        except:
+            raise Exception('fitSpectrum: Error opening output file')
             
     if not rateStyle == '':
         countAll = 0.0
@@ -3162,7 +5361,6 @@ FINDING WITH THE RESOLUTION FIT DATA
             bkgRateFactor = bkgRate / bkgCountAll
             bkgRateFactorErr = bkgRateErr / bkgCountAll
         if singlech:
-            bkgSpectrum = getSpectrum(bkgAmp[channel], nbins, singlech)[0]
             bkgSpectrumStatErr = gehrelsErr(bkgSpectrum)
             if rateStyle == '':
                 spectrum = spectrum - bkgSpectrum * timeScale[channel]
@@ -3171,7 +5369,6 @@ FINDING WITH THE RESOLUTION FIT DATA
                 spectrum = spectrum - bkgSpectrum * bkgRateFactor
                 spectrumErr = np.sqrt(spectrumErr ** 2 + (bkgSpectrum * bkgRateFactorErr) ** 2 + (bkgSpectrumStatErr * bkgRateFactor) ** 2)
         else:
-            bkgSpectrum = getSpectrum(bkgAmp, nbins, singlech)[0]
             bkgSpectrumStatErr = []
             for ich in range(4):
                 bkgSpectrumStatErr.append(gehrelsErr(bkgSpectrum[ich]))
@@ -3187,12 +5384,16 @@ FINDING WITH THE RESOLUTION FIT DATA
             rateFactor -= bkgRateFactor
             rateFactorErr = np.sqrt(rateFactorErr ** 2 + bkgRateFactorErr ** 2)
                     
-    minDiff = 1e-4
     #multi-channel fits
+    plotData = {
+                    'filename':     filename,
+                    'singlech':     singlech,
+                    'rateStyle':    rateStyle,
+                    'quadBkg':      quadBkg,
+                    'bound':        bound,
+                    'channels':     [],
+        }
     if not singlech:
-        if plot:
-            fig = plt.figure(figsize=(12, 8))
-            gs = gridspec.GridSpec(4, 1, wspace=0.5, hspace=0.2, left=0.13, right=0.95)
         fitResult = []
 
         x = copy(xraw)
@@ -3200,11 +5401,11 @@ FINDING WITH THE RESOLUTION FIT DATA
             x[ich] *= corr[ich] #temperature-bias correction
             spectrum[ich] = spectrum[ich] * nbins / 65535
             spectrumErr[ich] = spectrumErr[ich] * nbins / 65535
-            q1 = (x[ich] >= rangeLim[ich][0] * corr[ich]) * (x[ich] < rangeLim[ich][1] * corr[ich])
-            if not len(corrErr) == 0:
-                result = doFitPeak(x[ich][q1], spectrum[ich][q1], odr, x[ich][q1] * corrErr[ich], yerror = spectrumErr[ich][q1], quadBkg = quadBkg)
-            else:
-                result = doFitPeak(x[ich][q1], spectrum[ich][q1], odr, yerror = spectrumErr[ich][q1], quadBkg = quadBkg)
+        #Fits of all 4 channels done together, including the iteration and count rate fits
+        results, resultsRate = fitPeaks(x, spectrum, spectrumErr, xraw, [[rangeLim[ich][0] * corr[ich], rangeLim[ich][1] * corr[ich]] for ich in range(4)], \
+            odr, corrErr, maxiter, bound, quadBkg, [] if initResult is None else [getInitParam(initResult[ich]) for ich in range(4)])
+        for ich in range(4):
+            result = results[ich]
             amplitude = result['peak_amplitude']
             center = result['peak_center']
             sigma = result['peak_sigma']
@@ -3212,35 +5413,13 @@ FINDING WITH THE RESOLUTION FIT DATA
                 a = result['bk_a']
                 b = result['bk_b']
                 c = result['bk_c']
-            lastCenter, lastSigma = center, sigma
-
-            #Iteration part
-            for iit in range(maxiter):
-                q2 = (x[ich] >= center - bound * sigma) * (x[ich] < center + bound * sigma)
-                if not len(corrErr) == 0:
-                    result = doFitPeak(x[ich][q2], spectrum[ich][q2], odr, x[ich][q2] * corrErr[ich], yerror = spectrumErr[ich][q2], quadBkg = quadBkg)
-                else:
-                    result = doFitPeak(x[ich][q2], spectrum[ich][q2], odr, yerror = spectrumErr[ich][q2], quadBkg = quadBkg)
-                amplitude = result['peak_amplitude']
-                center = result['peak_center']
-                sigma = result['peak_sigma']
-                if quadBkg:
-                    a = result['bk_a']
-                    b = result['bk_b']
-                    c = result['bk_c']
-                if np.abs((lastCenter - center) / lastCenter) < minDiff and np.abs((lastSigma - sigma) / lastSigma) < minDiff:
-                    break
-                lastCenter, lastSigma = center, sigma
-
             ampErr = result['peak_amplitude_err']
             centerErr = result['peak_center_err']
             sigmaErr = result['peak_sigma_err']
             resolution = 2 * np.sqrt(2 * np.log(2)) * sigma / center
             resolutionErr = 2 * np.sqrt(2 * np.log(2)) * np.sqrt((sigmaErr / center) ** 2 + (sigma * centerErr / center ** 2) ** 2)
             #Count rate calculation part
-            qRate = (x[ich] >= center - bound * sigma) * (x[ich] < center + bound * sigma)
-            resultRate = doFitPeak(xraw[ich][qRate], spectrum[ich][qRate], odr, yerror = spectrumErr[ich][qRate], quadBkg = quadBkg)
-            ampRate = resultRate['peak_amplitude']
+            ampRate = resultsRate[ich]['peak_amplitude']
             if rateStyle == '':
                 rate = ampRate / time[ich]
                 rateErr = np.sqrt(ampRate) / time[ich]
@@ -3272,53 +5451,26 @@ FINDING WITH THE RESOLUTION FIT DATA
                                         'c_err':        sigmaErr,
                                         'rate':        rate,
                                         'rate_err':        rateErr,
+                                        'bkg':          [a, b, c] if quadBkg else [],
                 })
 
-            #Plot part
-            if plot:
-                fitPeak = amplitude * np.exp(-(x[ich] - center) ** 2 / (2 * (sigma ** 2))) / (sigma * np.sqrt(2 * np.pi))
-                if quadBkg:
-                    fitBk = a * x[ich] ** 2 + b * x[ich] + c
-                    fitTotal = fitBk + fitPeak
-                else:
-                    fitTotal = fitPeak
-                qplot = (x[ich] >= center - bound * sigma) * (x[ich] < center + bound * sigma)
-                ax = fig.add_subplot(gs[ich])
-                if rateStyle == '':
-                    plt.step(x[ich], spectrum[ich] / time[ich], where='mid', label='raw data', zorder=1) #TBD: change the x data to energy with additional EC calculation funtcion
-                    plt.plot(x[ich][qplot], fitPeak[qplot] / time[ich], label='Gaussian Peak Fit')
-                    if quadBkg:
-                        plt.plot(x[ich][qplot], fitBk[qplot] / time[ich], label='Background Fit')
-                        plt.plot(x[ich][qplot], fitTotal[qplot] / time[ich], label='Gaussian Peak and Background Fit')
-                    plt.text(center - 4 * sigma, max(fitPeak[qplot] / time[ich]) * 0.8, 'count rate = ' + str('%.2e' % (rate)) + ' $\pm$ ' + str('%.3e' % (rateErr)) + \
-                        ', center = ' + str('%.3e' % center) + ' $\pm$ ' + str('%.3e' % centerErr) + '\nsigma = ' + str('%.3e' % sigma) + ' $\pm$ ' + str('%.3e' % sigmaErr) + ', resolution = ' + \
-                        str('%.3e' % resolution) + ' $\pm$ ' + str('%.3e' % resolutionErr), fontsize=10, bbox=dict(facecolor='pink', alpha=0.1), horizontalalignment='center', verticalalignment='center')
-                    ax.set_ylim([0, 1.2 * np.max(spectrum[ich][qplot] / time[ich])])
-                else:
-                    plt.step(x[ich], spectrum[ich], where='mid', label='raw data', zorder=1) #TBD: change the x data to energy with additional EC calculation funtcion
-                    plt.plot(x[ich][qplot], fitPeak[qplot], label='Gaussian Peak Fit')
-                    if quadBkg:
-                        plt.plot(x[ich][qplot], fitBk[qplot], label='Background Fit')
-                        plt.plot(x[ich][qplot], fitTotal[qplot], label='Gaussian Peak and Background Fit')
-                    plt.text(center - 4 * sigma, max(fitPeak[qplot]) * 0.8, 'count rate = ' + str('%.2e' % (rate)) + ' $\pm$ ' + str('%.3e' % (rateErr)) + ', center = ' + str('%.3e' % center) + \
-                        ' $\pm$ ' + str('%.3e' % centerErr) + '\nsigma = ' + str('%.3e' % sigma) + ' $\pm$ ' + str('%.3e' % sigmaErr) + ', resolution = ' + str('%.3e' % resolution) + ' $\pm$ ' + \
-                        str('%.3e' % resolutionErr), fontsize=10, bbox=dict(facecolor='pink', alpha=0.1), horizontalalignment='center', verticalalignment='center')
-                    ax.set_ylim([0, 1.2 * np.max(spectrum[ich][qplot])])
-                lower = center - 6 * sigma
-                if lower < 0:
-                    lower = 0
-                upper = center + 6 * sigma
-                if upper > 65535:
-                    upper = 65535
-                ax.set_xlim([lower, upper])
-                if ich == 0:
-                    ax.set_title('Spectrum fit of data from ' + filename + '\nFit function: ' + r'$\frac{a}{\sqrt{2\pi}\sigma} e^{[{-{(x - \mu)^2}/{{2\sigma}^2}}]}$')
-                ax.set_xlabel('ADC/channel')
-                ax.set_ylabel('count rante/cps')
-                ax.legend(loc=0)
-                ax.grid()
-        if plot:
-            plt.show()
+            #Plot data
+            plotData['channels'].append({
+                                        'ich':              ich,
+                                        'x':                x[ich],
+                                        'spectrum':         spectrum[ich],
+                                        'time':             time[ich] if rateStyle == '' else 1.0,
+                                        'amplitude':        amplitude,
+                                        'center':           center,
+                                        'sigma':            sigma,
+                                        'bkg':              [a, b, c] if quadBkg else [],
+                                        'centerErr':        centerErr,
+                                        'sigmaErr':         sigmaErr,
+                                        'rate':             rate,
+                                        'rateErr':          rateErr,
+                                        'resolution':       resolution,
+                                        'resolutionErr':    resolutionErr,
+                })
 
         if fileOutput:
             fout.close()
@@ -3331,11 +5483,9 @@ FINDING WITH THE RESOLUTION FIT DATA
         x = xraw * corr[ich] #temperature-bias correction
         spectrum = spectrum * nbins / 65535
         spectrumErr = spectrumErr * nbins / 65535
-        q1 = (x >= rangeLim[0] * corr[ich]) * (x < rangeLim[1] * corr[ich])
-        if not len(corrErr) == 0:
-            result = doFitPeak(x[q1], spectrum[q1], odr, x[q1] * corrErr[ich], yerror = spectrumErr[q1], quadBkg = quadBkg)
-        else:
-            result = doFitPeak(x[q1], spectrum[q1], odr, yerror = spectrumErr[q1], quadBkg = quadBkg)
+        results, resultsRate = fitPeaks([x], [spectrum], [spectrumErr], [xraw], [[rangeLim[0] * corr[ich], rangeLim[1] * corr[ich]]], odr, \
+            [] if len(corrErr) == 0 else [corrErr[ich]], maxiter, bound, quadBkg, [] if initResult is None else [getInitParam(initResult)])
+        result = results[0]
         amplitude = result['peak_amplitude']
         center = result['peak_center']
         sigma = result['peak_sigma']
@@ -3343,35 +5493,13 @@ FINDING WITH THE RESOLUTION FIT DATA
             a = result['bk_a']
             b = result['bk_b']
             c = result['bk_c']
-        lastCenter, lastSigma = center, sigma
-
-        #Iteration part
-        for iit in range(maxiter):
-            q2 = (x >= center - bound * sigma) * (x < center + bound * sigma)
-            if not len(corrErr) == 0:
-                result = doFitPeak(x[q2], spectrum[q2], odr, x[q2] * corrErr[ich], yerror = spectrumErr[q2], quadBkg = quadBkg)
-            else:
-                result = doFitPeak(x[q2], spectrum[q2], odr, yerror = spectrumErr[q2], quadBkg = quadBkg)
-            amplitude = result['peak_amplitude']
-            center = result['peak_center']
-            sigma = result['peak_sigma']
-            if quadBkg:
-                a = result['bk_a']
-                b = result['bk_b']
-                c = result['bk_c']
-            if np.abs((lastCenter - center) / lastCenter) < minDiff and np.abs((lastSigma - sigma) / lastSigma) < minDiff:
-                break
-            lastCenter, lastSigma = center, sigma
-            
         ampErr = result['peak_amplitude_err']
         centerErr = result['peak_center_err']
         sigmaErr = result['peak_sigma_err']
         resolution = 2 * np.sqrt(2 * np.log(2)) * sigma / center
         resolutionErr = 2 * np.sqrt(2 * np.log(2)) * np.sqrt((sigmaErr / center) ** 2 + (sigma * centerErr / center ** 2) ** 2)
         #Count rate calculation part
-        qRate = (x >= center - bound * sigma) * (x < center + bound * sigma)
-        resultRate = doFitPeak(xraw[qRate], spectrum[qRate], odr, yerror = spectrumErr[qRate], quadBkg = quadBkg)
-        ampRate = resultRate['peak_amplitude']
+        ampRate = resultsRate[0]['peak_amplitude']
         if rateStyle == '':
             rate = ampRate / time[ich]
             rateErr = np.sqrt(ampRate) / time[ich]
@@ -3401,53 +5529,178 @@ FINDING WITH THE RESOLUTION FIT DATA
                                         'c_err':        sigmaErr,
                                         'rate':        rate,
                                         'rate_err':        rateErr,
+                                        'bkg':          [a, b, c] if quadBkg else [],
                 }
 
-        #Plot part
-        if plot:
-            fitPeak = amplitude * np.exp(-(x - center) ** 2 / (2 * (sigma ** 2))) / (sigma * np.sqrt(2 * np.pi))
-            if quadBkg:
-                fitBk = a * x ** 2 + b * x + c
-                fitTotal = fitBk + fitPeak
-            else:
-                fitTotal = fitPeak
-            qplot = (x >= center - bound * sigma) * (x < center + bound * sigma)
-            fig = plt.figure(figsize=(12, 8))
-            gs = gridspec.GridSpec(1, 1, wspace=0.5, hspace=0.2, left=0.13, right=0.95)
-            ax = fig.add_subplot(gs[0])
-            if rateStyle == '':
-                plt.step(x, spectrum / time[ich], where='mid', label='raw data', zorder=1) #TBD: change the x data to energy with additional EC calculation funtcion
-                plt.plot(x[qplot], fitPeak[qplot] / time[ich], label='Gaussian Peak Fit')
-                if quadBkg:
-                    plt.plot(x[qplot], fitBk[qplot] / time[ich], label='Background Fit')
-                    plt.plot(x[qplot], fitTotal[qplot] / time[ich], label='Gaussian Peak and Background Fit')
-                plt.text(center - 4 * sigma, max(fitPeak[qplot] / time[ich]) * 0.8, 'count rate = ' + str('%.2e' % (rate)) + ' $\pm$ ' + str('%.3e' % (rateErr)) + \
-                    ', center = ' + str('%.3e' % center) + ' $\pm$ ' + str('%.3e' % centerErr) + '\nsigma = ' + str('%.3e' % sigma) + ' $\pm$ ' + str('%.3e' % sigmaErr) + ', resolution = ' + \
-                    str('%.3e' % resolution) + ' $\pm$ ' + str('%.3e' % resolutionErr), fontsize=10, bbox=dict(facecolor='pink', alpha=0.1), horizontalalignment='center', verticalalignment='center')
-                ax.set_ylim([0, 1.2 * np.max(spectrum[qplot] / time[ich])])
-            else:
-                plt.step(x, spectrum, where='mid', label='raw data', zorder=1) #TBD: change the x data to energy with additional EC calculation funtcion
-                plt.plot(x[qplot], fitPeak[qplot], label='Gaussian Peak Fit')
-                if quadBkg:
-                    plt.plot(x[qplot], fitBk[qplot], label='Background Fit')
-                    plt.plot(x[qplot], fitTotal[qplot], label='Gaussian Peak and Background Fit')
-                plt.text(center - 4 * sigma, max(fitPeak[qplot]) * 0.8, 'count rate = ' + str('%.2e' % (rate)) + ' $\pm$ ' + str('%.3e' % (rateErr)) + ', center = ' + str('%.3e' % center) + \
-                    ' $\pm$ ' + str('%.3e' % centerErr) + '\nsigma = ' + str('%.3e' % sigma) + ' $\pm$ ' + str('%.3e' % sigmaErr) + ', resolution = ' + str('%.3e' % resolution) + ' $\pm$ ' + \
-                    str('%.3e' % resolutionErr), fontsize=10, bbox=dict(facecolor='pink', alpha=0.1), horizontalalignment='center', verticalalignment='center')
-                ax.set_ylim([0, 1.2 * np.max(spectrum[qplot])])
-            lower = center - 6 * sigma
-            if lower < 0:
-                lower = 0
-            upper = center + 6 * sigma
-            if upper > 65535:
-                upper = 65535
-            ax.set_xlim([lower, upper])
-            if ich == 0:
+        #Plot data
+        plotData['channels'].append({
+                                        'ich':              ich,
+                                        'x':                x,
+                                        'spectrum':         spectrum,
+                                        'time':             time[ich] if rateStyle == '' else 1.0,
+                                        'amplitude':        amplitude,
+                                        'center':           center,
+                                        'sigma':            sigma,
+                                        'bkg':              [a, b, c] if quadBkg else [],
+                                        'centerErr':        centerErr,
+                                        'sigmaErr':         sigmaErr,
+                                        'rate':             rate,
+                                        'rateErr':          rateErr,
+                                        'resolution':       resolution,
+                                        'resolutionErr':    resolutionErr,
+            })
+
+    if not cacheKey == '':
+        saveFitCache(cacheDir, cacheKey, fitResult, plotData, sourceFiles, cacheSize)
+    if deferPlot:
+        return fitResult, plotData
+    if plot:
+        submitPlot(plotSpectrumFit, plotData)
+    return fitResult
+
+def plotSpectrumFit(plotData):
+
+    """
+    Function for plotting the spectrum fit results of fitSpectrum()
+    :param plotData: plot data returned by fitSpectrum() with deferPlot, in the form of a dictionary as
+        {
+            'filename':     name of amplitude data file,
+            'singlech':     boolean indicating whether the fit is for single channel,
+            'rateStyle':    the style of calculating real count rate,
+            'quadBkg':      boolean indicating whether the quadratic background is included in the fit function,
+            'bound':        boundary of the fit range in \sigma,
+            'channels':     list of the spectrum and fit results of each channel fitted,
+        }
+    :return: nothing
+    """
+
+    filename = plotData['filename']
+    quadBkg = plotData['quadBkg']
+    bound = plotData['bound']
+    fig = plt.figure(figsize=(12, 8))
+    if plotData['singlech']:
+        gs = gridspec.GridSpec(1, 1, wspace=0.5, hspace=0.2, left=0.13, right=0.95)
+    else:
+        gs = gridspec.GridSpec(4, 1, wspace=0.5, hspace=0.2, left=0.13, right=0.95)
+    for channelData in plotData['channels']:
+        ich = channelData['ich']
+        x = channelData['x']
+        time = channelData['time']
+        amplitude = channelData['amplitude']
+        center = channelData['center']
+        sigma = channelData['sigma']
+        centerErr = channelData['centerErr']
+        sigmaErr = channelData['sigmaErr']
+        rate = channelData['rate']
+        rateErr = channelData['rateErr']
+        resolution = channelData['resolution']
+        resolutionErr = channelData['resolutionErr']
+        fitPeak = amplitude * np.exp(-(x - center) ** 2 / (2 * (sigma ** 2))) / (sigma * np.sqrt(2 * np.pi))
+        if quadBkg:
+            a, b, c = channelData['bkg']
+            fitBk = a * x ** 2 + b * x + c
+            fitTotal = fitBk + fitPeak
+        else:
+            fitTotal = fitPeak
+        qplot = (x >= center - bound * sigma) * (x < center + bound * sigma)
+        spectrum = channelData['spectrum'] / time
+        ax = fig.add_subplot(gs[0] if plotData['singlech'] else gs[ich])
+        plt.step(x, spectrum, where='mid', label='raw data', zorder=1) #TBD: change the x data to energy with additional EC calculation funtcion
+        plt.plot(x[qplot], fitPeak[qplot] / time, label='Gaussian Peak Fit')
+        if quadBkg:
+            plt.plot(x[qplot], fitBk[qplot] / time, label='Background Fit')
+            plt.plot(x[qplot], fitTotal[qplot] / time, label='Gaussian Peak and Background Fit')
+        plt.text(center - 4 * sigma, max(fitPeak[qplot] / time) * 0.8, 'count rate = ' + str('%.2e' % (rate)) + ' $\pm$ ' + str('%.3e' % (rateErr)) + \
+            ', center = ' + str('%.3e' % center) + ' $\pm$ ' + str('%.3e' % centerErr) + '\nsigma = ' + str('%.3e' % sigma) + ' $\pm$ ' + str('%.3e' % sigmaErr) + ', resolution = ' + \
+            str('%.3e' % resolution) + ' $\pm$ ' + str('%.3e' % resolutionErr), fontsize=10, bbox=dict(facecolor='pink', alpha=0.1), horizontalalignment='center', verticalalignment='center')
+        ax.set_ylim([0, 1.2 * np.max(spectrum[qplot])])
+        lower = center - 6 * sigma
+        if lower < 0:
+            lower = 0
+        upper = center + 6 * sigma
+        if upper > 65535:
+            upper = 65535
+        ax.set_xlim([lower, upper])
+        if ich == 0:
+            if plotData['singlech']:
                 ax.set_title('Spectrum fit of data from channel ' + str(ich) + ' in ' + filename + '\nFit function: ' + r'$\frac{a}{\sqrt{2\pi}\sigma} e^{[{-{(x - \mu)^2}/{{2\sigma}^2}}]}$')
-            ax.set_xlabel('ADC/channel')
-            ax.set_ylabel('count rate/cps')
-            ax.legend(loc=0)
-            ax.grid()
-            plt.show()
+            else:
+                ax.set_title('Spectrum fit of data from ' + filename + '\nFit function: ' + r'$\frac{a}{\sqrt{2\pi}\sigma} e^{[{-{(x - \mu)^2}/{{2\sigma}^2}}]}$')
+        ax.set_xlabel('ADC/channel')
+        ax.set_ylabel('count rate/cps' if plotData['singlech'] else 'count rante/cps')
+        ax.legend(loc=0)
+        ax.grid()
+    showFigure(fig)
+    return
 
-    return fitResult
+def fitJob(args):
+
+    """
+    Auxiliary function for running the fits of a single fit job, with all plotting deferred
+    :param args: tuple of the arguments of fitRateCorrect() and fitSpectrum(), each as a tuple of the positional arguments and the keyword arguments, \
+the former being None if the correct count rate is not needed. rateAll and rateAllErr of fitSpectrum() are taken from the result of fitRateCorrect() if given
+    :return: result of fitSpectrum(), plot data of fitRateCorrect()(None if not done) and plot data of fitSpectrum()
+    """
+
+    rateArgs, fitArgs = args
+    ratePlotData = None
+    fitKwargs = dict(fitArgs[1])
+    if rateArgs is not None:
+        rateAll, rateAllErr, ratePlotData = fitRateCorrect(*rateArgs[0], **rateArgs[1], deferPlot = True)
+        fitKwargs['rateAll'] = rateAll
+        fitKwargs['rateAllErr'] = rateAllErr
+    fitResult, plotData = fitSpectrum(*fitArgs[0], **fitKwargs, deferPlot = True)
+    return fitResult, ratePlotData, plotData
+
+def fitWorker(args):
+
+    """
+    Auxiliary function for running fitJob() in a worker process, with the printed messages kept to be printed by the main process
+    :param args: arguments of fitJob()
+    :return: result of fitJob() and the printed messages
+    """
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = fitJob(args)
+    return result, output.getvalue()
+
+def fitSpectrumParallel(fitJobs, jobs = 1, plot = True, warmStart = False, deferPlot = False):
+
+    """
+    Function for doing the independent spectrum fits of multiple scans in parallel with a process pool, and plotting the results after all fits are done
+    :param fitJobs: list of the arguments of fitJob(), one for each spectrum fit
+    :param jobs: number of worker processes, the fits are done one by one if jobs is 1
+    :param plot: boolean indicating whether the fit results will be plotted after all fits are done
+    :param warmStart: boolean indicating whether each fit is started from the result of the previous one with initResult of fitSpectrum(), in which \
+case the fits are done one by one
+    :param deferPlot: boolean indicating whether to return the results of fitJob() with the plot data instead of plotting
+    :return: list of the results of fitSpectrum() in the same order as fitJobs, with the messages of each fit also printed in this order
+    """
+
+    results = []
+    if warmStart and jobs > 1:
+        print('fitSpectrumParallel: warm-started fits depend on the previous ones, fitting the spectra one by one')
+        jobs = 1
+    if jobs <= 1 or len(fitJobs) <= 1:
+        initResult = None
+        for rateArgs, fitArgs in fitJobs:
+            if warmStart:
+                fitArgs = (fitArgs[0], dict(fitArgs[1], initResult = initResult))
+            results.append(fitJob((rateArgs, fitArgs)))
+            initResult = results[-1][0]
+    else:
+        with processPool(min(jobs, len(fitJobs))) as executor:
+            for result, output in executor.map(fitWorker, fitJobs):
+                print(output, end='')
+                results.append(result)
+
+    #Plot session
+    if deferPlot:
+        return results
+    if plot:
+        for fitResult, ratePlotData, plotData in results:
+            if ratePlotData is not None:
+                submitPlot(plotRateCorrect, ratePlotData)
+            submitPlot(plotSpectrumFit, plotData)
+    return [result[0] for result in results]
@@ -7,17 +7,19 @@ import gridBasicFunctions as grid
 import datetime
 import sys, os
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-from mpl_toolkits.mplot3d import Axes3D
-from scipy.optimize import curve_fit, least_squares
-import lmfit
-import xlrd,csv
-from scipy import interpolate
+import csv
 from fnmatch import fnmatch
-from scipy.odr import ODR, Model, Data, RealData
-import crc16,struct
+import struct
+
+#Heavy packages loaded only when the experiment-level stages run, the 3d projection of matplotlib being registered by matplotlib itself
+pd = grid.lazyImport('pandas')
+plt = grid.lazyImport('matplotlib.pyplot')
+gridspec = grid.lazyImport('matplotlib.gridspec')
+optimize = grid.lazyImport('scipy.optimize')
+lmfit = grid.lazyImport('lmfit')
+xlrd = grid.lazyImport('xlrd')
+interpolate = grid.lazyImport('scipy.interpolate')
+scipyOdr = grid.lazyImport('scipy.odr')
 
 #******************************************************************************************************************************************************
 #*************************************************Experiment-level processing functions********************************************************
@@ -135,7 +137,7 @@ def tempBiasVariation(temp, bias, vmon, iMon, uscount, isTemp, singlech = False,
     ax0.set_title('Variation of SiPM temperature with time')
     ax0.legend(loc=0)
     ax0.grid()
-    plt.show()
+    grid.showFigure()
 
     #Bias variation with time
     fig1 = plt.figure(figsize=(12, 8))
@@ -205,7 +207,7 @@ def tempBiasVariation(temp, bias, vmon, iMon, uscount, isTemp, singlech = False,
     ax1.set_title('Variation of SiPM bias with time')
     ax1.legend(loc=0)
     ax1.grid()
-    plt.show()
+    grid.showFigure()
 
     #Monotored voltage variation with time
     fig2 = plt.figure(figsize=(12, 8))
@@ -275,7 +277,7 @@ def tempBiasVariation(temp, bias, vmon, iMon, uscount, isTemp, singlech = False,
     ax2.set_title('Variation of monitored voltage with time')
     ax2.legend(loc=0)
     ax2.grid()
-    plt.show()
+    grid.showFigure()
 
     #Monotored current variation with time
     fig3 = plt.figure(figsize=(12, 8))
@@ -345,7 +347,7 @@ def tempBiasVariation(temp, bias, vmon, iMon, uscount, isTemp, singlech = False,
     ax3.set_title('Variation of monitored current with time')
     ax3.legend(loc=0)
     ax3.grid()
-    plt.show()
+    grid.showFigure()
 
     if isTemp:
         #Monitored voltage variation with temperature
@@ -384,7 +386,7 @@ def tempBiasVariation(temp, bias, vmon, iMon, uscount, isTemp, singlech = False,
         ax4.set_ylabel('monitored voltage/V')
         ax4.legend(loc=0)
         ax4.grid()
-        plt.show()
+        grid.showFigure()
 
         #Monitored current variation with temperature
         fig5 = plt.figure(figsize=(12, 8))
@@ -422,7 +424,7 @@ def tempBiasVariation(temp, bias, vmon, iMon, uscount, isTemp, singlech = False,
         ax5.set_ylabel('leak current/mA')
         ax5.legend(loc=0)
         ax5.grid()
-        plt.show()
+        grid.showFigure()
 
     else:
         #Monitored voltage variation with bias
@@ -461,7 +463,7 @@ def tempBiasVariation(temp, bias, vmon, iMon, uscount, isTemp, singlech = False,
         ax6.set_ylabel('monitored voltage/V')
         ax6.legend(loc=0)
         ax6.grid()
-        plt.show()
+        grid.showFigure()
 
         #Monitored current variation with bias
         fig7 = plt.figure(figsize=(12, 8))
@@ -499,7 +501,7 @@ def tempBiasVariation(temp, bias, vmon, iMon, uscount, isTemp, singlech = False,
         ax7.set_ylabel('leak current/mA')
         ax7.legend(loc=0)
         ax7.grid()
-        plt.show()
+        grid.showFigure()
 
     #TBD: add histogram for vmon
 
@@ -587,7 +589,7 @@ a better fit method(currently least-square) or perhaps a better model is require
             biasAvg = np.array(biasAvg)
                         
             #Do 3d quadratic fit
-            result = least_squares(grid.residualQuad3D, init[channel], args = (tempAvg, biasAvg, center))
+            result = optimize.least_squares(grid.residualQuad3D, init[channel], args = (tempAvg, biasAvg, center))
             params = result.x
             tempFit = np.linspace(np.min(tempAvg), np.max(tempAvg), 100)
             biasFit = np.linspace(np.min(biasAvg), np.max(biasAvg), 100)
@@ -617,7 +619,7 @@ a better fit method(currently least-square) or perhaps a better model is require
                 ax.set_title('Correlated fit of temperature-bias responce data')
                 ax.set_zlabel('ADC/channel')
             ax.legend(loc = 0)
-            plt.show()
+            grid.showFigure()
 
             #Residual plots
             if not cont:
@@ -631,7 +633,7 @@ a better fit method(currently least-square) or perhaps a better model is require
                 ax.set_xlabel('SiPM temperature/$^{\circ}$C')
                 ax.set_ylabel('SiPM bias/V')
                 ax.legend(loc = 0)
-                plt.show()
+                grid.showFigure()
 
         #Multiple channel fits
         else:
@@ -663,7 +665,7 @@ a better fit method(currently least-square) or perhaps a better model is require
                 biasAvg[ich] = np.array(biasAvg[ich])
 
                 #Do 3d quadratic fit
-                result = least_squares(grid.residualQuad3D, init[ich], args = (tempAvg[ich], biasAvg[ich], center[ich]))
+                result = optimize.least_squares(grid.residualQuad3D, init[ich], args = (tempAvg[ich], biasAvg[ich], center[ich]))
                 params = result.x
                 tempFit = np.linspace(np.min(tempAvg[ich]), np.max(tempAvg[ich]), 100)
                 biasFit = np.linspace(np.min(biasAvg[ich]), np.max(biasAvg[ich]), 100)
@@ -692,7 +694,7 @@ a better fit method(currently least-square) or perhaps a better model is require
                 ax.set_title('Correlated fit of temperature-bias responce data')
                 ax.set_zlabel('ADC/channel')
             ax.legend(loc = 0)
-            plt.show()
+            grid.showFigure()
 
             #Residual plots
             if not cont:
@@ -707,7 +709,7 @@ a better fit method(currently least-square) or perhaps a better model is require
                     ax.set_xlabel('SiPM temperature/$^{\circ}$C')
                     ax.set_ylabel('SiPM bias/V')
                     ax.legend(loc = 0)
-                    plt.show()
+                    grid.showFigure()
 
             if fileOutput:
                 fout.close()
@@ -807,7 +809,7 @@ a better fit method(currently least-square) or perhaps a better model is require
             ax1.set_ylabel('residual/%')
             ax1.legend(loc=0)
             ax1.grid()
-            plt.show()
+            grid.showFigure()
 
         #Multiple channel fits
         else:
@@ -894,7 +896,7 @@ a better fit method(currently least-square) or perhaps a better model is require
             ax1.set_ylabel('residual/%')
             ax1.legend(loc=0)
             ax1.grid()
-            plt.show()
+            grid.showFigure()
 
             if fileOutput:
                 fout.close()
@@ -1240,7 +1242,7 @@ def currentFit(input, iMon, isTemp, fileOutput = False, form = 'quad', odr = Fal
     ax1.set_ylabel('residual/%')
     ax1.legend(loc=0)
     ax1.grid()
-    plt.show()
+    grid.showFigure()
 
     if fileOutput:
         fout.close()
@@ -1387,7 +1389,7 @@ def overvoltageFit(temp, bias, isTemp, fileOutput = False, odr = False):
     ax1.set_ylabel('residual/%')
     ax1.legend(loc=0)
     ax1.grid()
-    plt.show()
+    grid.showFigure()
 
     if fileOutput:
         fout.close()
@@ -1647,10 +1649,10 @@ def plotAngularResponce(fitResults, angle, source, fileOutput = False, singlech
         ax1.set_ylabel('residual/$\sigma$')
         ax1.legend(loc=0)
         ax1.grid()
-    plt.show()
+    grid.showFigure()
     return
 
-def plotEnergyChannel(ecFilepath, nbins = 8192, ch = 0, doCorr = True, rateCorr = True, isPlotSpec=False, isPlotEC= True, fitEC=False):
+def plotEnergyChannel(ecFilepath, nbins = 8192, ch = 0, doCorr = True, rateCorr = True, isPlotSpec=False, isPlotEC= True, fitEC=False, unbinnedRate = False):
     """
     Function for plotting the E-C curve and the energy resolution curve of data from NIM.
     ONLY process data from single channel
@@ -1662,6 +1664,7 @@ def plotEnergyChannel(ecFilepath, nbins = 8192, ch = 0, doCorr = True, rateCorr
     :param isPlotSpec: True to plot energy spectrums of each source file 
     :param isPlotEC: True to plot the final EC curve and the Energy Resolution curve
     :param fitEC: True to plot the fit curve of the EC curve and the Energy Resolution curve
+    :param unbinnedRate: True to estimate the live time of rate correction from unbinned data instead of the histogram fit
     :return: result of the process on GRID data, in the form of a dictionary:
         {
             'energys' : energys of the source,
@@ -1770,8 +1773,8 @@ def plotEnergyChannel(ecFilepath, nbins = 8192, ch = 0, doCorr = True, rateCorr
                         cpsTotalSrc.append(np.size(np.hstack(uscountEvtSrc))/extimeSrc)
                         cpsTotalBkg.append(np.size(np.hstack(uscountEvtBkg))/extimeBkg)
                         
-                        rateAllSrc, rateAllErrSrcErr = grid.fitRateCorrect(srcFile.split('\\')[-1], rateCorrectSrc, plot = False, odr = False, rateStyle = 'p')
-                        rateAllBkg, rateAllErrBkgErr = grid.fitRateCorrect(bkgFile.split('\\')[-1], rateCorrectBkg, plot = False, odr = False, rateStyle = 'p')
+                        rateAllSrc, rateAllErrSrcErr = grid.fitRateCorrect(srcFile.split('\\')[-1], rateCorrectSrc, plot = False, odr = False, rateStyle = 'p', unbinned = unbinnedRate)
+                        rateAllBkg, rateAllErrBkgErr = grid.fitRateCorrect(bkgFile.split('\\')[-1], rateCorrectBkg, plot = False, odr = False, rateStyle = 'p', unbinned = unbinnedRate)
                         
                         cpsRateCorrectSrc.append(rateAllSrc)
                         cpsRateCorrectBkg.append(rateAllBkg)
@@ -1867,8 +1870,8 @@ def plotEnergyChannel(ecFilepath, nbins = 8192, ch = 0, doCorr = True, rateCorr
                                 cpsTotalSrc.append(np.size(np.hstack(uscountEvtSrc))/extimeSrc)
                                 cpsTotalBkg.append(np.size(np.hstack(uscountEvtBkg))/extimeBkg)
                                 
-                                rateAllSrc, rateAllErrSrcErr = grid.fitRateCorrect(srcFile.split('\\')[-1], rateCorrectSrc, plot = False, odr = False, rateStyle = 'p')
-                                rateAllBkg, rateAllErrBkgErr = grid.fitRateCorrect(bkgFile.split('\\')[-1], rateCorrectBkg, plot = False, odr = False, rateStyle = 'p')
+                                rateAllSrc, rateAllErrSrcErr = grid.fitRateCorrect(srcFile.split('\\')[-1], rateCorrectSrc, plot = False, odr = False, rateStyle = 'p', unbinned = unbinnedRate)
+                                rateAllBkg, rateAllErrBkgErr = grid.fitRateCorrect(bkgFile.split('\\')[-1], rateCorrectBkg, plot = False, odr = False, rateStyle = 'p', unbinned = unbinnedRate)
                                 
                                 cpsRateCorrectSrc.append(rateAllSrc)
                                 cpsRateCorrectBkg.append(rateAllBkg)
@@ -1964,8 +1967,8 @@ def plotEnergyChannel(ecFilepath, nbins = 8192, ch = 0, doCorr = True, rateCorr
                                 cpsTotalSrc.append(np.size(np.hstack(uscountEvtSrc))/extimeSrc)
                                 cpsTotalBkg.append(np.size(np.hstack(uscountEvtBkg))/extimeBkg)
                                 
-                                rateAllSrc, rateAllErrSrcErr = grid.fitRateCorrect(srcFile.split('\\')[-1], rateCorrectSrc, plot = False, odr = False, rateStyle = 'p')
-                                rateAllBkg, rateAllErrBkgErr = grid.fitRateCorrect(bkgFile.split('\\')[-1], rateCorrectBkg, plot = False, odr = False, rateStyle = 'p')
+                                rateAllSrc, rateAllErrSrcErr = grid.fitRateCorrect(srcFile.split('\\')[-1], rateCorrectSrc, plot = False, odr = False, rateStyle = 'p', unbinned = unbinnedRate)
+                                rateAllBkg, rateAllErrBkgErr = grid.fitRateCorrect(bkgFile.split('\\')[-1], rateCorrectBkg, plot = False, odr = False, rateStyle = 'p', unbinned = unbinnedRate)
                                 
                                 cpsRateCorrectSrc.append(rateAllSrc)
                                 cpsRateCorrectBkg.append(rateAllBkg)
@@ -2087,23 +2090,23 @@ def plotEnergyChannel(ecFilepath, nbins = 8192, ch = 0, doCorr = True, rateCorr
 
             q_low = energys<49.
             p_low = np.polyfit(energys[q_low], centers[q_low], 2)
-            par_low, pcov_low = curve_fit(polyfit_quad, energys[q_low], centers[q_low], sigma=centersErr[q_low], p0=p) #pre_fit
+            par_low, pcov_low = optimize.curve_fit(polyfit_quad, energys[q_low], centers[q_low], sigma=centersErr[q_low], p0=p) #pre_fit
             perr_low = np.sqrt(np.diag(pcov_low))
             energy_set_low = np.arange(10,50,2)
             ax0.plot(energy_set_low, polyfit_quad(energy_set_low, *par_low), linestyle = '-', label='quadratic fit on X-ray tube ch%d, < 49keV'%ch)
 
             q_high = energys>55.
             p_high = np.polyfit(energys[q_high], centers[q_high], 2)
-            par_high, pcov_high = curve_fit(polyfit_quad, energys[q_high], centers[q_high], sigma=centersErr[q_high], p0=p) #pre_fit
+            par_high, pcov_high = optimize.curve_fit(polyfit_quad, energys[q_high], centers[q_high], sigma=centersErr[q_high], p0=p) #pre_fit
             perr_high = np.sqrt(np.diag(pcov_high))
             energy_set_high = np.arange(50,1400,10)
             ax0.plot(energy_set_high, polyfit_quad(energy_set_high, *par_high), linestyle = '-', label='quadratic fit on X-ray tube ch%d, > 55keV'%ch)
 
             qModel = lmfit.models.QuadraticModel(prefix = 'bk_')
             param1 = qModel.guess(energys[q_low], x = centers[q_low])
-            data = RealData(centers[q_low], energys[q_low], sx = centersErr[q_low], fix = np.ones(3))
-            model = Model(polyfit_quad_odr)
-            odr = ODR(data, model, beta0=p_low)#[param1.valuesdict()['bk_a'], param1.valuesdict()['bk_b'], param1.valuesdict()['bk_c']])
+            data = scipyOdr.RealData(centers[q_low], energys[q_low], sx = centersErr[q_low], fix = np.ones(3))
+            model = scipyOdr.Model(polyfit_quad_odr)
+            odr = scipyOdr.ODR(data, model, beta0=p_low)#[param1.valuesdict()['bk_a'], param1.valuesdict()['bk_b'], param1.valuesdict()['bk_c']])
             odr.set_job(fit_type = 0)
             result = odr.run()
             fitResult = {
@@ -2145,13 +2148,13 @@ def plotEnergyChannel(ecFilepath, nbins = 8192, ch = 0, doCorr = True, rateCorr
             p=np.ones(3)
 
             q_low = energys<49.
-            par_low, pcov_low = curve_fit(resolution_fit, energys[q_low], energyResolutions[q_low], sigma=energyResolutionsErr[q_low], p0=p, bounds=(lbd, ubd)) #pre_fit
+            par_low, pcov_low = optimize.curve_fit(resolution_fit, energys[q_low], energyResolutions[q_low], sigma=energyResolutionsErr[q_low], p0=p, bounds=(lbd, ubd)) #pre_fit
             perr_low = np.sqrt(np.diag(pcov_low))
             energy_set_low = np.arange(10,50,2)
             ax0.plot(energy_set_low, resolution_fit(energy_set_low, *par_low)*100, linestyle = '-', zorder=0, label='fit on ch%d, low energy'%ch)
 
             q_high = energys>55.
-            par_high, pcov_high = curve_fit(resolution_fit, energys[q_high], energyResolutions[q_high], sigma=energyResolutionsErr[q_high], p0=p, bounds=(lbd, ubd)) #pre_fit
+            par_high, pcov_high = optimize.curve_fit(resolution_fit, energys[q_high], energyResolutions[q_high], sigma=energyResolutionsErr[q_high], p0=p, bounds=(lbd, ubd)) #pre_fit
             perr_high = np.sqrt(np.diag(pcov_high))
             energy_set_high = np.arange(50,1400,10)
             ax0.plot(energy_set_high, resolution_fit(energy_set_high, *par_high)*100, linestyle = '-', zorder=0, label='fit on ch%d, high energy'%ch)
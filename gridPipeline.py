@@ -0,0 +1,1311 @@
+#Pipeline of Grid Data Processor by ydx and ghz
+#Used for Grid2 calibration
+#The readout, spectrum, fit and experiment stages of 'GridDataProcessor.py' as functions, with the options given as a job and the stage outputs kept between jobs
+
+import gridBasicFunctions as grid
+import gridExperimentFunctions as experiment
+import os
+import io
+import json
+import pickle
+import time
+import hashlib
+import contextlib
+import numpy as np
+
+#*****************************************************************************************************************************************************
+#****************************************************************Job and pipeline part****************************************************************
+#*****************************************************************************************************************************************************
+
+#h: hexprint, c: with (single) CI, s: with I-V scan, o:file output, f:fit, p: plot raw data, t: temperature calibration, B: bias calibration
+#i: import data from file, v: temp&bias curves & imon fit, r: temp/bias responce, O: odr fitting, a: angular responce
+optionsAvailable = ['h', 'c', 's', 'o', 'f', 'p', 't', 'b', 'v', 'r', 'O', 'a', 'g', 'n', 'm', 'w', 'u']
+sourceAvailable = ['Am241', 'Ba133', 'Cs137', 'Na22', 'Th228', 'Co60', 'x']
+rateStyles = ['s', 'p']
+plotFormatsAvailable = ['png', 'pdf', 'svg', 'eps', 'ps', 'jpg', 'jpeg', 'tif', 'tiff']
+#Default nbins of the sources
+nbinsRef = {
+                'Am241':        2048,
+                'Ba133':        2048,
+                'Th228':        1024,
+                'Cs137':        512,
+                'Na22':         512,
+                'Co60':         512,
+    }
+#Settings of a job and their default values, same as the options of GridDataProcessor, with nbins = 0 for the default nbins of the source
+jobDefaults = {
+                'filename':         [],
+                'mulfilename':      [],
+                'scanRange':        [],
+                'bkgFilename':      [],
+                'importPath':       [],
+                'source':           '',
+                'nbins':            0,
+                'channel':          -1,
+                'fitRange':         [],
+                'maxiter':          1,
+                'bound':            3.0,
+                'rateStyle':        '',
+                'timeCut':          0.0,
+                'corr':             True,
+                'fitPlot':          True,
+                'rateCheck':        False,
+                'autoRange':        False,
+                'simuFilename':     '',
+                'gridFilepath':     '',
+                'hpgeFilepath':     '',
+                'cacheDir':         '',
+                'cacheSize':        2048,
+                'plotDir':          '',
+                'plotFormats':      [],
+                'clearCache':       False,
+                'jobs':             1,
+    }
+
+def makeJob(option = '', **settings):
+
+    """
+    Function for building a job of the pipeline from the options of GridDataProcessor
+    :param option: option letters, same as the first argument of GridDataProcessor without '-'
+    :param settings: other options, with the names and default values in jobDefaults, e.g. filename = ['a.txt'], source = 'Cs137', \
+bkgFilename = ['bkg.txt'] for 'a.txt --src Cs137 --bkg bkg.txt'
+    :return: dict of the job, with the settings checked and the flags of the option letters added
+    """
+
+    for s in option:
+        if not s in optionsAvailable:
+            raise Exception('makeJob: unsupported option ' + s)
+    for key in settings:
+        if not key in jobDefaults:
+            raise Exception('makeJob: unknown setting ' + key)
+    if ('r' in option or 'a' in option) and not 'f' in option:
+        option += 'f'
+    job = {}
+    for key in jobDefaults:
+        value = settings[key] if key in settings else jobDefaults[key]
+        job[key] = list(value) if isinstance(value, list) else value
+
+    #Flags of the option letters
+    job['option'] = option
+    job['isHex'] = 'h' in option
+    job['isCi'] = 1 if 'c' in option and not 'h' in option else 0
+    job['isScan'] = 's' in option and not 'h' in option
+    job['fileOutput'] = 'o' in option
+    job['odr'] = 'O' in option
+    job['quadBkg'] = not 'g' in option
+    job['warmStart'] = 'w' in option
+    job['unbinnedRate'] = 'u' in option
+    job['newProgramme'] = 'n' in option
+
+    #Flags of the other settings
+    job['bkg'] = not len(job['bkgFilename']) == 0
+    job['singlech'] = job['source'] == 'x' or grid.isChannel(job['channel'])
+    job['plotNIM'] = not job['gridFilepath'] == '' or not job['hpgeFilepath'] == ''
+    job['rateStyleSpecified'] = not job['rateStyle'] == ''
+    job['filename'] = [file for file in job['filename'] if not any([file.endswith(bkfile) for bkfile in job['bkgFilename']])]
+    job['scanRange'] += [[]] * (len(job['mulfilename']) - len(job['scanRange']))
+
+    #nbins not specified if plot and fit is to be conducted
+    if job['nbins'] == 0:
+        if job['source'] in nbinsRef:
+            job['nbins'] = nbinsRef[job['source']]
+        elif 'f' in option or 'p' in option:
+            raise Exception('makeJob: to make the fit for data or plot the spectrum, nbins must be specified')
+        else:
+            job['nbins'] = 65536
+    if job['nbins'] < 0 or job['nbins'] > 65536:
+        raise Exception('makeJob: nbins should be in integer form and within range [1-65536]')
+
+    #Unknown source
+    if not job['source'] in sourceAvailable:
+        if 'f' in option and not 'b' in option:
+            raise Exception('makeJob: to make the fit for data, the source must be specified')
+
+    #Channel or fit range not specified for x-ray data fit
+    elif job['source'] == 'x':
+        if 'f' in option and not (grid.isChannel(job['channel']) and (not len(job['fitRange']) == 0 or job['autoRange'])):
+            raise Exception('makeJob: to make the fit for x-ray data, the channel and fit range(or \'autoRange\') must be specified')
+
+    #Other settings
+    if not job['rateStyle'] in [''] + rateStyles:
+        raise Exception('makeJob: rate calculation style \'' + job['rateStyle'] + '\' not supported')
+    if not all([form in plotFormatsAvailable for form in job['plotFormats']]):
+        raise Exception('makeJob: unsupported plot format in ' + ','.join(job['plotFormats']))
+    if job['clearCache'] and job['cacheDir'] == '':
+        raise Exception('makeJob: to clear the readout cache, the cache directory must be specified')
+
+    #Import path not specified for processed data import
+    if 'i' in option and len(job['importPath']) == 0:
+        print('makeJob: import path specified, setting the import path as default (current path)')
+        job['importPath'].append(os.getcwd())
+    return job
+
+def hasPlots(job):
+
+    """
+    Function for checking whether a job makes any figure
+    :param job: dict of the job
+    :return: True if the job plots the fits, the raw spectra or the experiment results, False if not
+    """
+
+    return job['fitPlot'] and 'f' in job['option'] or any([s in job['option'] for s in 'pvra'])
+
+def makePipeline(memory = 4):
+
+    """
+    Function for building a pipeline, which keeps the outputs of the processing stages in memory between the jobs run with it, see evaluateStage()
+    :param memory: maximum number of outputs kept in memory for each stage, the least recently used ones dropped first, 0 for no output kept
+    :return: dict of the pipeline
+    """
+
+    return {'memory': memory, 'stages': {}}
+
+def keepInMemory(memo, key, value, size):
+
+    """
+    Auxiliary function to keep a value in a memory dict of the pipeline as the most recently used one
+    :param memo: memory dict, in the order of use
+    :param key: key of the value
+    :param value: the value
+    :param size: maximum number of values kept, the least recently used ones dropped first
+    :return: the value
+    """
+
+    memo.pop(key, None)
+    memo[key] = value
+    while len(memo) > size:
+        del memo[next(iter(memo))]
+    return value
+
+#*****************************************************************************************************************************************************
+#****************************************************************Processing stage part****************************************************************
+#*****************************************************************************************************************************************************
+
+#Settings of a job affecting the fit results, with the fit stage of a file run again only when one of them or the data is changed
+fitSettings = ['source', 'nbins', 'channel', 'fitRange', 'maxiter', 'bound', 'rateStyle', 'corr', 'autoRange', 'odr', 'quadBkg', 'warmStart', 'unbinnedRate', \
+    'rateCheck', 'fileOutput', 'singlech', 'bkg']
+
+def stageKey(name, inputs, params):
+
+    """
+    Auxiliary function to get the key of a stage output, addressed by the name and parameters of the stage and the keys of its inputs
+    :param name: name of the stage
+    :param inputs: list of the keys of the input stages
+    :param params: parameters of the stage, with values of numbers, strings, lists, dicts or ndarrays
+    :return: the key string
+    """
+
+    params = json.dumps([name, inputs, params], sort_keys=True, default=lambda value: np.asarray(value).tolist())
+    return name + '_' + hashlib.sha1(params.encode()).hexdigest()
+
+def makeStage(name, function, inputs = [], params = {}, options = {}, keep = True, depends = []):
+
+    """
+    Function for building a stage of the processing chain, which is only evaluated when its output is needed and not kept, see evaluateStage()
+    :param name: name of the stage
+    :param function: function of the stage, called with the outputs of the input stages as positional arguments and the parameters and options as \
+keyword arguments
+    :param inputs: list of the input stages
+    :param params: dict of the parameters affecting the output
+    :param options: dict of the other keyword arguments of the function, e.g. the cache directory
+    :param keep: boolean indicating whether the output is to be kept in memory by the pipeline
+    :param depends: list of the other stages the output depends on, not evaluated but only used for addressing the output
+    :return: dict of the stage
+    """
+
+    return {'name': name, 'key': stageKey(name, [stage['key'] for stage in inputs + depends], params), 'function': function, 'inputs': inputs, 'params': params, \
+        'options': options, 'keep': keep}
+
+def fileStage(filename):
+
+    """
+    Function for building the input stage of a raw file, addressed by the path, size and modification time of the file
+    :param filename: name of the file
+    :return: dict of the stage, with the filename as its output
+    """
+
+    stat = os.stat(filename)
+    return {'name': 'file', 'key': stageKey('file', [], [os.path.realpath(filename), stat.st_size, stat.st_mtime_ns]), 'output': filename, 'keep': False}
+
+def isStageKept(pipeline, stage):
+
+    """
+    Auxiliary function to check whether the output of a stage is kept in memory by the pipeline
+    :param pipeline: dict of the pipeline
+    :param stage: dict of the stage
+    :return: boolean indicating whether the output is kept
+    """
+
+    return 'output' in stage or stage['key'] in pipeline['stages'].get(stage['name'], {})
+
+def evaluateStage(pipeline, stage, known = {}):
+
+    """
+    Function for evaluating a stage, with the output taken from memory if kept and the input stages evaluated only if the output is not kept, so that \
+only the stages with changed inputs or parameters are run again
+    :param pipeline: dict of the pipeline
+    :param stage: dict of the stage
+    :param known: dict of the outputs already known, with the keys of the stages as keys
+    :return: output of the stage
+    """
+
+    if 'output' in stage:
+        return stage['output']
+    memo = pipeline['stages'].setdefault(stage['name'], {})
+    if stage['key'] in known:
+        output = known[stage['key']]
+    elif stage['key'] in memo:
+        output = memo[stage['key']]
+    else:
+        output = stage['function'](*[evaluateStage(pipeline, curStage, known) for curStage in stage['inputs']], **stage['params'], **stage['options'])
+    if stage['keep']:
+        keepInMemory(memo, stage['key'], output, pipeline['memory'])
+    return output
+
+def stageWorker(stage):
+
+    """
+    Auxiliary function for evaluating a stage in a worker process, with the printed messages kept to be printed by the main process
+    :param stage: dict of the stage
+    :return: output of the stage and the printed messages
+    """
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = evaluateStage(makePipeline(0), stage)
+    return result, output.getvalue()
+
+def evaluateStages(pipeline, stages, jobs = 1):
+
+    """
+    Function for evaluating independent stages, with the ones not kept in memory evaluated in parallel by a process pool
+    :param pipeline: dict of the pipeline
+    :param stages: list of the stages
+    :param jobs: number of worker processes
+    :return: dict of the outputs, with the keys of the stages as keys
+    """
+
+    outputs = {}
+    missing = {}
+    for stage in stages:
+        if isStageKept(pipeline, stage):
+            outputs[stage['key']] = evaluateStage(pipeline, stage)
+        else:
+            missing[stage['key']] = stage
+    missing = list(missing.values())
+    if jobs > 1 and len(missing) > 1:
+        with grid.processPool(min(jobs, len(missing))) as executor:
+            for stage, (output, messages) in zip(missing, executor.map(stageWorker, missing)):
+                print(messages, end='')
+                outputs[stage['key']] = evaluateStage(pipeline, stage, {stage['key']: output})
+    else:
+        for stage in missing:
+            outputs[stage['key']] = evaluateStage(pipeline, stage)
+    return outputs
+
+def readoutOutput(decoded, **settings):
+
+    """
+    Function of the readout stage, the time cut and splitting of the decoded data with dataReadout()
+    :param decoded: output of the decode stage
+    :param settings: keyword arguments of dataReadout()
+    :return: output of dataReadout()
+    """
+
+    return grid.dataReadout(decoded = decoded, **settings)
+
+def readoutStage(filename, isHex = False, isCi = 0, isScan = False, scanRange = [], rateStyle = '', newProgramme = False, timeCut = -1.0, ragged = False, \
+                 cacheDir = '', cacheSize = 2048, jobs = 1):
+
+    """
+    Function for building the stages reading out a raw file, the decode stage shared by the readouts with different time cuts and the readout stage
+    :param filename: name of the file
+    :param isHex, isCi, isScan, scanRange, rateStyle, newProgramme, timeCut, ragged, cacheDir, cacheSize, jobs: see dataReadout()
+    :return: dict of the readout stage, with the output of dataReadout()
+    """
+
+    settings = {'isHex': isHex, 'isCi': isCi, 'isScan': isScan, 'scanRange': scanRange, 'rateStyle': rateStyle, 'newProgramme': newProgramme}
+    decode = makeStage('decode', grid.decodeReadout, [fileStage(filename)], settings, {'cacheDir': cacheDir, 'cacheSize': cacheSize, 'jobs': jobs})
+    return makeStage('readout', readoutOutput, [decode], dict(settings, timeCut = timeCut, ragged = ragged), {'filename': filename})
+
+def fileReadoutStages(job):
+
+    """
+    Auxiliary function to get the readout stages of the data files of a job
+    :param job: dict of the job
+    :return: list of the readout stages, in the order of mulfilename + filename
+    """
+
+    stages = []
+    for file in job['mulfilename'] + job['filename']:
+        curCi = job['isCi']
+        curscanRange = []
+        if file in job['mulfilename']:
+            curCi = 2
+            curscanRange = job['scanRange'][job['mulfilename'].index(file)]
+        stages.append(readoutStage(file, job['isHex'], curCi, job['isScan'], curscanRange, job['rateStyle'], job['newProgramme'], job['timeCut'], \
+            curCi == 2, job['cacheDir'], job['cacheSize'], job['jobs']))
+    return stages
+
+def backgroundReadoutStages(job):
+
+    """
+    Auxiliary function to get the readout stages of the background files of a job
+    :param job: dict of the job
+    :return: list of the readout stages, in the order of bkgFilename
+    """
+
+    return [readoutStage(bkfile, job['isHex'], 1, rateStyle = job['rateStyle'], cacheDir = job['cacheDir'], cacheSize = job['cacheSize'], jobs = job['jobs']) \
+        for bkfile in job['bkgFilename']]
+
+def readFiles(pipeline, stages, jobs = 1):
+
+    """
+    Function for reading out raw files with their readout stages, the files not kept in memory decoded in parallel if more than one(a single file \
+is split into shards by decodeReadout() instead)
+    :param pipeline: dict of the pipeline
+    :param stages: list of the readout stages
+    :param jobs: number of processes
+    :return: list of the readout results, in the order of stages
+    """
+
+    decodes = [stage['inputs'][0] for stage in stages if not isStageKept(pipeline, stage)]
+    if len(set([stage['key'] for stage in decodes if not isStageKept(pipeline, stage)])) > 1:
+        for stage in decodes:
+            stage['options']['jobs'] = 1
+    known = evaluateStages(pipeline, decodes, jobs)
+    readouts = []
+    for stage in stages:
+        readouts.append(evaluateStage(pipeline, stage, known))
+        if not any([curStage['inputs'][0]['key'] == stage['inputs'][0]['key'] for curStage in stages[len(readouts):]]):
+            known.pop(stage['inputs'][0]['key'], None)
+    return readouts
+
+def histogramOutput(readout, multiple = False, scanRange = []):
+
+    """
+    Function of the histogram stage, the full resolution spectra of a readout
+    :param readout: output of the readout stage
+    :param multiple: boolean indicating whether the file has multiple scans
+    :param scanRange: scan range of the file, with None for the scans out of the range
+    :return: the full resolution spectrum, or the list of the spectra of all scans for multiple scan files
+    """
+
+    amp = readout[0]
+    if not multiple:
+        return grid.fullSpectrum(amp)
+    full = []
+    for isc in range(len(readout[6])):
+        if not len(scanRange) == 0 and not (isc >= scanRange[0] - 1 and isc <= scanRange[1] - 1):
+            full.append(None)
+            continue
+        full.append(grid.fullSpectrum(amp[:, isc]))
+    return full
+
+def fitOutput(fitJobs = [], jobs = 1, warmScans = False, **params):
+
+    """
+    Function of the fit stage, the spectrum fits of a file with the plot data
+    :param fitJobs: list of the arguments of fitJob(), one for each spectrum fit
+    :param jobs: number of worker processes
+    :param warmScans: boolean indicating whether each fit is started from the result of the previous one
+    :param params: settings of the job affecting the fit results, only used for addressing the output
+    :return: list of the results of fitJob()
+    """
+
+    return grid.fitSpectrumParallel(fitJobs, jobs, False, warmScans, deferPlot = True)
+
+def fitStage(pipeline, job, fitJobs, depends, params = {}, warmScans = False):
+
+    """
+    Function for the spectrum fits of a file as a stage, with the fits plotted after all fits are done
+    :param pipeline: dict of the pipeline
+    :param job: dict of the job
+    :param fitJobs: list of the arguments of fitJob(), one for each spectrum fit
+    :param depends: list of the readout, histogram and background stages of the fits, with the fit stage of the previous file for warm-started fits
+    :param params: other parameters of the fits not given by the job
+    :param warmScans: boolean indicating whether each fit of the file is started from the result of the previous one
+    :return: the fit stage and the list of the results of fitSpectrum(), one for each spectrum fit
+    """
+
+    params = dict({key: job[key] for key in fitSettings}, **params)
+    stage = makeStage('fit', fitOutput, [], params, {'fitJobs': fitJobs, 'jobs': job['jobs'], 'warmScans': warmScans}, not job['fileOutput'], depends)
+    results = evaluateStage(pipeline, stage)
+    if job['fitPlot']:
+        for fitResult, ratePlotData, plotData in results:
+            if ratePlotData is not None:
+                grid.submitPlot(grid.plotRateCorrect, ratePlotData)
+            grid.submitPlot(grid.plotSpectrumFit, plotData)
+    return stage, [result[0] for result in results]
+
+def backgroundOutput(*readouts, bkgFilename = [], rateStyle = '', fitPlot = True, odr = False, unbinnedRate = False, rateCheck = False):
+
+    """
+    Function of the background stage, the background spectrum and count rate correction of the readouts of the background files
+    :param readouts: outputs of the readout stages of the background files
+    :param bkgFilename: names of the background files
+    :param rateStyle, fitPlot, odr, unbinnedRate, rateCheck: see makeJob()
+    :return: amplitudes, full resolution spectrum, live time, count rate correction and its error of the background
+    """
+
+    bamp = []
+    for ich in range(4):
+        bamp.append([])
+    bfull = None
+    bkgTime = np.ones(4)
+    brateAll = 0.0
+    brateAllErr = 0.0
+    curbamp = []
+    curbtimeCorrect = []
+    brateData = []
+    brateDataErr = []
+    if not len(readouts) == 0:
+        bkgTime = np.zeros(4)
+        for bkfile, bkgdata in zip(bkgFilename, readouts):
+            curbamp, curbuscountEvt, curbtimeCorrect = bkgdata[0], bkgdata[7], bkgdata[8]
+            for ich in range(4):
+                bamp[ich] += list(curbamp[ich])
+                bkgTime[ich] += curbuscountEvt[ich][-1] - curbuscountEvt[ich][0]
+            if not rateStyle == '':
+                curbrateData = grid.fitRateCorrect(bkfile, curbtimeCorrect, fitPlot, odr, rateStyle = rateStyle, unbinned = unbinnedRate, crossCheck = rateCheck)
+                brateData.append(curbrateData[0])
+                brateDataErr.append(curbrateData[1])
+        bamp = grid.buildRagged(bamp, 1)
+        bfull = grid.fullSpectrum(bamp)
+        if not rateStyle == '':
+            brateAll = np.average(np.array(brateData))
+            brateAllErr = np.sqrt(np.std(np.array(brateData)) ** 2 + np.sum(np.array(brateDataErr) ** 2) / len(brateData) ** 2)
+    return bamp, bfull, bkgTime, brateAll, brateAllErr
+
+#*****************************************************************************************************************************************************
+#**************************************************************Data readout and fit part**************************************************************
+#*****************************************************************************************************************************************************
+#v0.0.2 by ghz
+
+def readBackground(pipeline, job):
+
+    """
+    Function for reading out the background files of a job and building the background spectrum, kept in memory by the pipeline for the jobs with \
+the same background files
+    :param pipeline: dict of the pipeline
+    :param job: dict of the job
+    :return: the background stage and its output, see backgroundOutput()
+    """
+
+    readouts = backgroundReadoutStages(job)
+    stage = makeStage('background', backgroundOutput, readouts, {'rateStyle': job['rateStyle'], 'odr': job['odr'], 'unbinnedRate': job['unbinnedRate'], \
+        'rateCheck': job['rateCheck']}, {'bkgFilename': job['bkgFilename'], 'fitPlot': job['fitPlot']})
+    if isStageKept(pipeline, stage):
+        return stage, evaluateStage(pipeline, stage)
+    return stage, evaluateStage(pipeline, stage, dict(zip([curStage['key'] for curStage in readouts], readFiles(pipeline, readouts, job['jobs']))))
+
+def processFiles(pipeline, job, background):
+
+    """
+    Function for reading out the data files of a job, plotting and fitting their spectra
+    :param pipeline: dict of the pipeline
+    :param job: dict of the job
+    :param background: background stage and its output from readBackground()
+    :return: dict of the data of all runs, in the form of [channel][run][data] or [run][data], and the fit results, None if no fit is done
+    """
+
+    option = job['option']
+    filename = job['filename']
+    mulfilename = job['mulfilename']
+    scanRange = job['scanRange']
+    importPath = job['importPath']
+    isCi = job['isCi']
+    isScan = job['isScan']
+    fileOutput = job['fileOutput']
+    singlech = job['singlech']
+    odr = job['odr']
+    quadBkg = job['quadBkg']
+    warmStart = job['warmStart']
+    unbinnedRate = job['unbinnedRate']
+    newProgramme = job['newProgramme']
+    source = job['source']
+    nbins = job['nbins']
+    channel = job['channel']
+    fitRange = job['fitRange']
+    maxiter = job['maxiter']
+    bound = job['bound']
+    rateStyle = job['rateStyle']
+    rateStyleSpecified = job['rateStyleSpecified']
+    corr = job['corr']
+    fitPlot = job['fitPlot']
+    rateCheck = job['rateCheck']
+    autoRange = job['autoRange']
+    bkg = job['bkg']
+    cacheDir = job['cacheDir']
+    cacheSize = job['cacheSize']
+    jobs = job['jobs']
+    bkgStage, (bamp, bfull, bkgTime, brateAll, brateAllErr) = background
+
+    amp = []
+    tempSipm = []
+    tempAdc = []
+    vMon = []
+    iMon = []
+    bias = []
+    uscount = []
+    uscountEvt = []
+    timeCorrect = []
+    effectiveCount = []
+    missingCount = []
+    if not isCi == 0:
+        ampCI = []
+        uscountEvtCI = []
+        effectiveCountCI = []
+        missingCountCI = []
+    if isScan:
+        vSet = []
+        vScan = []
+        iScan = []
+    for ich in range(4):
+        amp.append([])
+        tempSipm.append([])
+        tempAdc.append([])
+        vMon.append([])
+        iMon.append([])
+        bias.append([])
+        uscountEvt.append([])
+        if isCi == 1:
+            ampCI.append([])
+            uscountEvtCI.append([])
+        if isScan:
+            vScan.append([])
+            iScan.append([])
+
+    if 'f' in option:
+        fitResults = []
+        if not singlech:
+            for ich in range(4):
+                fitResults.append([])
+        lastfitResults = None
+
+    curamp = []
+    curtempSipm = []
+    curtempAdc = []
+    curvMon = []
+    curiMon = []
+    curbias = []
+    curuscount = []
+    curuscountEvt = []
+    curtimeCorrect = []
+    cureffectiveCount = []
+    curmissingCount = []
+    if not isCi == 0:
+        curampCI = []
+        curuscountEvtCI = []
+        cureffectiveCountCI = []
+        curmissingCountCI = []
+    if isScan:
+        curvSet = []
+        curvScan = []
+        curiScan = []
+
+    #Readout of all raw files, in parallel if more than one file is to be read(a single file is split into shards by dataReadout instead)
+    readouts = [None] * len(mulfilename + filename)
+    if not 'i' in option:
+        stages = fileReadoutStages(job)
+        readouts = readFiles(pipeline, stages, jobs)
+    lastFitStage = None
+
+    for ifile, file in enumerate(mulfilename + filename):
+        #Data readout
+        curCi = isCi
+        curscanRange = []
+        scanNum = []
+        if file in mulfilename:
+            curCi = 2
+            curscanRange = scanRange[mulfilename.index(file)]
+        #Readout from processed files
+        if 'i' in option:
+            #UNUSED
+            if isScan:
+                if curCi == 0:
+                    curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curvSet, \
+                        curvScan, curiScan = grid.importData(file, importPath, curCi, isScan, curscanRange)
+                else:
+                    curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, \
+                        curuscountEvtCI, cureffectiveCountCI, curmissingCountCI, curvSet, curvScan, curiScan, scanNum = grid.importData(file, importPath, curCi, isScan, curscanRange)
+            else:
+                if curCi == 0:
+                    curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount = grid.importData(\
+                        file, importPath, curCi, isScan, curscanRange)
+                else:
+                    curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, \
+                        curuscountEvtCI, cureffectiveCountCI, curmissingCountCI, scanNum = grid.importData(file, importPath, curCi, isScan, curscanRange)
+            #imported data never kept in memory
+            curStage = {'name': 'import', 'key': 'import_' + os.urandom(16).hex(), 'output': (curamp, None, None, None, None, None, curuscount)}
+            curReadout = curStage['output']
+        #Readout from raw data
+        else:
+            curStage = stages[ifile]
+            curReadout = readouts[ifile]
+            readouts[ifile] = None
+            if isScan:
+                if curCi == 0:
+                    curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curvSet, curvScan, \
+                        curiScan = curReadout
+                    if fileOutput:
+                        grid.fileOutput(file.split('\\')[-1], curCi, isScan, curscanRange, *[curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, \
+                            curtimeCorrect, cureffectiveCount, curmissingCount, curvSet, curvScan, curiScan])
+                else:
+                    curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, \
+                        cureffectiveCountCI, curmissingCountCI, curvSet, curvScan, curiScan = curReadout
+                    if fileOutput:
+                        grid.fileOutput(file.split('\\')[-1], curCi, isScan, curscanRange, *[curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, \
+                            cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, cureffectiveCountCI, curmissingCountCI, curvSet, curvScan, curiScan])
+            else:
+                if curCi == 0:
+                    curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount = curReadout
+                    if fileOutput:
+                        grid.fileOutput(file.split('\\')[-1], curCi, isScan, curscanRange, *[curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, \
+                            cureffectiveCount, curmissingCount])
+                else:
+                    curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, \
+                        cureffectiveCountCI, curmissingCountCI = curReadout
+                    if fileOutput:
+                        grid.fileOutput(file.split('\\')[-1], curCi, isScan, curscanRange, *[curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, \
+                            cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, cureffectiveCountCI, curmissingCountCI])
+
+        #Full resolution spectra, rebinned for both the plot and fit sessions
+        curfull = None
+        curKnown = {curStage['key']: curReadout}
+        curHistogram = makeStage('histogram', histogramOutput, [curStage], {'multiple': curCi == 2, 'scanRange': curscanRange})
+        if 'p' in option or 'f' in option:
+            curfull = evaluateStage(pipeline, curHistogram, curKnown)
+
+        #Plot raw spectrum
+        rateAll = 1.0
+        if 'p' in option:
+            #Multiple scans
+            if curCi == 2:
+                for isc in range(len(curuscount)):
+                    if not len(curscanRange) == 0 and not (isc >= curscanRange[0] - 1 and isc <= curscanRange[1] - 1):
+                        continue
+                    if rateStyleSpecified:
+                        rateAll, rateAllErr = grid.fitRateCorrect('', curtimeCorrect[isc], False, odr, rateStyle = rateStyle, unbinned = unbinnedRate, crossCheck = rateCheck)
+                    timeSpec = []
+                    for ich in range(4):
+                        timeSpec.append(curuscountEvt[ich][isc][-1] - curuscountEvt[ich][isc][0])
+                    grid.plotRawData('Run #' + str(isc + 1) + ' of ' + file.split('\\')[-1], curamp[:, isc], nbins * grid.getBiasnbinsFactor(isc + 1), grid.tempBiasCorrection(\
+                        curtempSipm[:, isc], curbias[:, isc], False, not 't' in option)[0], timeSpec, singlech, channel = channel, rateStyle = rateStyle, rateAll = rateAll, \
+                        doCorr = corr, full = curfull[isc])
+            #Single scan
+            else:
+                if rateStyleSpecified:
+                    rateAll, rateAllErr = grid.fitRateCorrect('', curtimeCorrect, False, odr, rateStyle = rateStyle, unbinned = unbinnedRate, crossCheck = rateCheck)
+                timeSpec = []
+                for ich in range(4):
+                    timeSpec.append(curuscountEvt[ich][-1] - curuscountEvt[ich][0])
+                grid.plotRawData(file.split('\\')[-1], curamp, nbins, grid.tempBiasCorrection(curtempSipm, curbias, False, not 't' in option)[0], timeSpec, singlech, \
+                    channel = channel, rateStyle = rateStyle, rateAll = rateAll, doCorr = corr, full = curfull)
+
+        #Fit session
+        if 'f' in option:
+            #Multiple scans, the independent fits of all scans done by a process pool and plotted after all fits are done
+            if curCi == 2:
+                #Fit windows of all scans located at once
+                if autoRange:
+                    scanFit = [isc for isc in range(len(curuscount)) if curfull[isc] is not None]
+                    peakWindows = dict(zip(scanFit, grid.locatePeaks(np.array([curfull[isc] for isc in scanFit]).reshape(-1, 4, 65536), 'x' if 'b' in \
+                        option else source, bound = bound)[0]))
+                fitJobs = []
+                for isc in range(len(curuscount)):
+                    if not len(curscanRange) == 0 and not (isc >= curscanRange[0] - 1 and isc <= curscanRange[1] - 1):
+                        continue
+                    rateArgs = None
+                    if rateStyleSpecified:
+                        rateArgs = ((str(isc + 1) + '_' + file.split('\\')[-1], curtimeCorrect[isc], fitPlot, odr), {'rateStyle': rateStyle, 'unbinned': unbinnedRate, 'crossCheck': rateCheck})
+                    timeSpec = []
+                    for ich in range(4):
+                        timeSpec.append(curuscountEvt[ich][isc][-1] - curuscountEvt[ich][isc][0])
+                    curcorr, curcorrErr = grid.tempBiasCorrection(curtempSipm[:, isc], curbias[:, isc], False, False)
+                    fitKwargs = {'channel': channel, 'bkgAmp': bamp, 'bkgtime': bkgTime, 'corrErr': curcorrErr, 'odr': odr, 'maxiter': maxiter, 'bound': bound, \
+                        'plot': fitPlot, 'rateStyle': rateStyle, 'rateAll': 0.0, 'rateAllErr': 0.0, 'bkgRate': brateAll, 'bkgRateErr': brateAllErr, 'quadBkg': quadBkg, \
+                        'doCorr': corr, 'full': curfull[isc], 'bkgFull': bfull, 'cacheDir': cacheDir, 'cacheSize': cacheSize, 'sourceFiles': [file] + \
+                        job['bkgFilename']}
+                    if source == 'x':
+                        cursource = 'x'
+                        fitKwargs['xRange'] = fitRange
+                    elif 'b' in option:
+                        cursource = 'x'
+                        fitKwargs['xRange'] = grid.getBiasFitRange(isc, False)
+                    else:
+                        cursource = source
+                    if autoRange:
+                        fitKwargs['peakWindow'] = peakWindows[isc]
+                    fitJobs.append((rateArgs, ((str(isc + 1) + '_' + file.split('\\')[-1], curamp[:, isc], nbins * grid.getBiasnbinsFactor(isc + 1), cursource, curcorr, \
+                        timeSpec, fileOutput, singlech, bkg), fitKwargs)))
+                for curfitResults in fitStage(pipeline, job, fitJobs, [curStage, curHistogram, bkgStage], {'bias': 'b' in option}, warmStart)[1]:
+                    if singlech:
+                        fitResults.append(curfitResults)
+                    else:
+                        for ich in range(4):
+                            fitResults[ich].append(curfitResults[ich])
+
+            #Single scan, the fit of each file started from the result of the previous one for warm-started fits
+            else:
+                peakWindow = grid.locatePeaks(curfull, source, bound = bound)[0] if autoRange else None
+                rateArgs = None
+                if rateStyleSpecified:
+                    rateArgs = ((file.split('\\')[-1], curtimeCorrect, fitPlot, odr), {'rateStyle': rateStyle, 'unbinned': unbinnedRate, 'crossCheck': rateCheck})
+                timeSpec = []
+                for ich in range(4):
+                    timeSpec.append(curuscountEvt[ich][-1] - curuscountEvt[ich][0])
+                curcorr, curcorrErr = grid.tempBiasCorrection(curtempSipm, curbias, False, False)
+                fitKwargs = {'channel': channel, 'bkgAmp': bamp, 'bkgtime': bkgTime, 'corrErr': curcorrErr, 'odr': odr, 'maxiter': maxiter, 'bound': bound, \
+                    'plot': fitPlot, 'rateStyle': rateStyle, 'rateAll': 0.0, 'rateAllErr': 0.0, 'bkgRate': brateAll, 'bkgRateErr': brateAllErr, 'quadBkg': quadBkg, \
+                    'doCorr': corr, 'full': curfull, 'bkgFull': bfull, 'initResult': lastfitResults if warmStart else None, 'peakWindow': peakWindow, \
+                    'cacheDir': cacheDir, 'cacheSize': cacheSize, 'sourceFiles': [file] + job['bkgFilename']}
+                if source == 'x':
+                    fitKwargs['xRange'] = fitRange
+                fitJobs = [(rateArgs, ((file.split('\\')[-1], curamp, nbins, source, curcorr, timeSpec, fileOutput, singlech, bkg), fitKwargs))]
+                lastFitStage, curfitResults = fitStage(pipeline, job, fitJobs, [curStage, curHistogram, bkgStage] + ([lastFitStage] if warmStart and \
+                    lastFitStage is not None else []))
+                lastfitResults = curfitResults[0]
+                if singlech:
+                    fitResults.append(lastfitResults)
+                else:
+                    for ich in range(4):
+                        fitResults[ich].append(lastfitResults[ich])
+
+        #Remove empty runs for multiple scan files
+        if curCi == 2:
+            if not len(scanRange) == 0:
+                curamp, curtempSipm, curtempAdc, curvMon, curiMon, curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, \
+                    curampCI, curuscountEvtCI, cureffectiveCountCI, curmissingCountCI = grid.deleteEmptyRun(curamp, curtempSipm, curtempAdc, curvMon, curiMon, \
+                    curbias, curuscount, curuscountEvt, curtimeCorrect, cureffectiveCount, curmissingCount, curampCI, curuscountEvtCI, cureffectiveCountCI, curmissingCountCI, \
+                    curscanRange, rateStyle, newProgramme)
+
+        #Add processed data to data list, as views of the data of each run
+        for ich in range(4):
+            if curCi == 2:
+                amp[ich] += list(curamp[ich])
+                tempSipm[ich] += list(curtempSipm[ich])
+                tempAdc[ich] += list(curtempAdc[ich])
+                vMon[ich] += list(curvMon[ich])
+                iMon[ich] += list(curiMon[ich])
+                bias[ich] += list(curbias[ich])
+                uscountEvt[ich] += list(curuscountEvt[ich])
+            else:
+                amp[ich].append(curamp[ich])
+                tempSipm[ich].append(curtempSipm[ich])
+                tempAdc[ich].append(curtempAdc[ich])
+                vMon[ich].append(curvMon[ich])
+                iMon[ich].append(curiMon[ich])
+                bias[ich].append(curbias[ich])
+                uscountEvt[ich].append(curuscountEvt[ich])
+                if not isCi == 0:
+                    ampCI[ich].append(curampCI[ich])
+                    uscountEvtCI[ich].append(curuscountEvtCI[ich])
+            if isScan:
+                vScan[ich].append(curvScan[ich])
+                iScan[ich].append(curiScan[ich])
+        if curCi == 2:
+            uscount += list(curuscount)
+            if not rateStyle == '':
+                timeCorrect += list(curtimeCorrect)
+            if newProgramme:
+                effectiveCount += list(cureffectiveCount)
+                missingCount += list(curmissingCount)
+                if not isCi == 0:
+                    effectiveCountCI += list(cureffectiveCountCI)
+                    missingCountCI += list(curmissingCountCI)
+        else:
+            uscount.append(curuscount)
+            if not rateStyle == '':
+                timeCorrect.append(curtimeCorrect)
+            if newProgramme:
+                effectiveCount.append(cureffectiveCount)
+                missingCount.append(curmissingCount)
+                if not isCi == 0:
+                    effectiveCountCI.append(cureffectiveCountCI)
+                    missingCountCI.append(curmissingCountCI)
+        if isScan:
+            vSet.append(curvSet)
+
+    #Data of all runs in the form of [channel][run][data] or [run][data], with runs of different lengths
+    amp = grid.buildRagged(amp, 2)
+    tempSipm = grid.buildRagged(tempSipm, 2)
+    tempAdc = grid.buildRagged(tempAdc, 2)
+    vMon = grid.buildRagged(vMon, 2)
+    iMon = grid.buildRagged(iMon, 2)
+    bias = grid.buildRagged(bias, 2)
+    uscount = grid.buildRagged(uscount, 1)
+    uscountEvt = grid.buildRagged(uscountEvt, 2)
+    if not rateStyle == '':
+        timeCorrect = grid.buildRagged(timeCorrect, 1)
+    if newProgramme:
+        effectiveCount = grid.buildRagged(effectiveCount, 1)
+        missingCount = grid.buildRagged(missingCount, 1)
+    if not isCi == 0:
+        ampCI = grid.buildRagged(ampCI, 2)
+        uscountEvtCI = grid.buildRagged(uscountEvtCI, 2)
+        if newProgramme:
+            effectiveCountCI = grid.buildRagged(effectiveCountCI, 1)
+            missingCountCI = grid.buildRagged(missingCountCI, 1)
+    if isScan:
+        vSet = np.array(vSet)
+        vScan = np.array(vScan)
+        iScan = np.array(iScan)
+
+    data = {
+            'filename':         filename,
+            'amp':              amp,
+            'tempSipm':         tempSipm,
+            'tempAdc':          tempAdc,
+            'vMon':             vMon,
+            'iMon':             iMon,
+            'bias':             bias,
+            'uscount':          uscount,
+            'uscountEvt':       uscountEvt,
+            'timeCorrect':      timeCorrect,
+            'effectiveCount':   effectiveCount,
+            'missingCount':     missingCount,
+        }
+    if not isCi == 0:
+        data.update({'ampCI': ampCI, 'uscountEvtCI': uscountEvtCI, 'effectiveCountCI': effectiveCountCI, 'missingCountCI': missingCountCI})
+    if isScan:
+        data.update({'vSet': vSet, 'vScan': vScan, 'iScan': iScan})
+    if 'f' in option:
+        #fit results in the form of [channel][fit] for fits of all channels, or [fit] for single channel fits
+        nFit = len(fitResults) if singlech else len(fitResults[0])
+        if not singlech and not all([len(fitResults[ich]) == nFit for ich in range(4)]):
+            raise Exception('processFiles: fit results of the channels in different numbers ' + str([len(fitResults[ich]) for ich in range(4)]))
+        fitResults = np.array(fitResults)
+        shape = (nFit,) if singlech else (4, nFit)
+        if not fitResults.shape[:len(shape)] == shape:
+            raise Exception('processFiles: fit results in unexpected shape ' + str(fitResults.shape))
+        return data, fitResults
+    return data, None
+
+#*****************************************************************************************************************************************************
+#*******************************************************************Experiment part*******************************************************************
+#*****************************************************************************************************************************************************
+
+def experimentStage(job, data, fitResults, partial = False):
+
+    """
+    Function for the temperature and bias, angular responce and NIM data analyses of a job
+    :param job: dict of the job
+    :param data: data of processFiles
+    :param fitResults: fit results of processFiles
+    :param partial: boolean indicating whether the files of the angular responce are only the first ones of all angles, e.g. while watching a folder
+    :return: dict of the results of the analyses done
+    """
+
+    option = job['option']
+    source = job['source']
+    channel = job['channel']
+    corr = job['corr']
+    fileOutput = job['fileOutput']
+    singlech = job['singlech']
+    odr = job['odr']
+    unbinnedRate = job['unbinnedRate']
+    simuFilename = job['simuFilename']
+    gridFilepath = job['gridFilepath']
+    hpgeFilepath = job['hpgeFilepath']
+    plotNIM = job['plotNIM']
+    results = {}
+
+    #Temperature and bias curves, leak current and overvoltage fit
+    if ('b' in option or 't' in option) and 'v' in option:
+        experiment.tempBiasVariation(data['tempSipm'], data['bias'], data['vMon'], data['iMon'], data['uscount'], 't' in option, singlech, False, filenames = data['filename'])
+        #if 't' in option:
+        #    currentInput = tempSipm
+        #else:
+        #    currentInput = bias
+        #experiment.currentFit(currentInput, iMon, 't' in option, fileOutput, form = 'mixexp', odr = odr)
+        #experiment.overvoltageFit(tempSipm, bias, 't' in option, fileOutput, odr = odr)
+
+    #Temperature\bias responce fit
+    if 'r' in option:
+        if 't' in option and 'b' in option:
+            results['responceFit'] = experiment.tempBiasFit(fitResults, data['tempSipm'], data['bias'], True, fileOutput, singlech, channel = channel, odr = odr, \
+                corr = True, cont = False)
+        elif 't' in option:
+            results['responceFit'] = experiment.tempBiasFit(fitResults, data['tempSipm'], data['bias'], True, fileOutput, singlech, channel = channel, odr = odr)
+        elif 'b' in option:
+            results['responceFit'] = experiment.tempBiasFit(fitResults, data['tempSipm'], data['bias'], False, fileOutput, singlech, channel = channel, odr = odr)
+
+    angle = np.arange(0, 375, 15)
+    if partial and 'a' in option:
+        angle = angle[:len(fitResults) if singlech else len(fitResults[0])]
+    #Plot angular responce
+    if 'a' in option:
+        results['angularResponce'] = experiment.plotAngularResponce(fitResults, angle, source, fileOutput, singlech, channel = channel, rateCorr = True, \
+            simuFile = simuFilename)
+
+    #Plot nim data, including EC, Resolution and efficiency
+    if 'm' in option:
+        results['nim'] = {}
+        results['nim']['grid'] = experiment.plotEnergyChannel(gridFilepath, ch = channel, doCorr = corr, isPlotSpec = False, isPlotEC = plotNIM, rateCorr = True, fitEC = False, \
+            unbinnedRate = unbinnedRate)
+        results['nim']['hpge'] = experiment.processHPGe(hpgeFilepath, isPlotSpec = False)
+        results['nim']['efficiency'] = experiment.getEfficiency(results['nim']['grid'], results['nim']['hpge'], isPlot = plotNIM)
+    return results
+
+#*****************************************************************************************************************************************************
+#*********************************************************************Job run part********************************************************************
+#*****************************************************************************************************************************************************
+
+def runJob(pipeline, job):
+
+    """
+    Function for running a job through the readout, spectrum, fit and experiment stages
+    :param pipeline: dict of the pipeline, with the readouts kept between jobs
+    :param job: dict of the job
+    :return: dict of the results, with the data of all runs in 'data', the fit results in 'fitResults', the number of cache entries removed in \
+'removed', the figure files of batch plotting in 'figures' and the results of experimentStage
+    """
+
+    results = {'data': None, 'fitResults': None, 'removed': 0, 'figures': []}
+
+    #Readout cache invalidation, the whole cache cleared if no input file is given, with the stage outputs kept in memory dropped as well
+    if job['clearCache']:
+        files = job['filename'] + job['mulfilename'] + job['bkgFilename']
+        pipeline['stages'].clear()
+        if len(files) == 0:
+            results['removed'] = grid.clearReadoutCache(job['cacheDir'])
+            print('runJob: ' + str(results['removed']) + ' cache entries removed')
+            return results
+        for file in files:
+            results['removed'] += grid.clearReadoutCache(job['cacheDir'], file)
+        print('runJob: ' + str(results['removed']) + ' readout cache entries of the input files removed')
+
+    #Batch plotting, the rendering processes started before the readout
+    if not job['plotDir'] == '':
+        grid.startBatchPlot(job['plotDir'], job['plotFormats'] if not len(job['plotFormats']) == 0 else ['png'], job['jobs'])
+    elif not len(job['plotFormats']) == 0:
+        print('runJob: plot formats are only used for batch plotting with \'plotDir\'')
+
+    #Stages, with the pending figures of batch plotting rendered even if a stage fails
+    try:
+        background = readBackground(pipeline, job)
+        results['data'], results['fitResults'] = processFiles(pipeline, job, background)
+        results.update(experimentStage(job, results['data'], results['fitResults']))
+    finally:
+        if not job['plotDir'] == '':
+            results['figures'] = grid.finishBatchPlot()
+    return results
+
+#*****************************************************************************************************************************************************
+#**********************************************************************Batch part*********************************************************************
+#*****************************************************************************************************************************************************
+
+#Settings of a job given as paths, relative to the manifest
+manifestPaths = ['filename', 'mulfilename', 'bkgFilename', 'importPath', 'simuFilename', 'gridFilepath', 'hpgeFilepath', 'cacheDir', 'plotDir']
+
+def readManifest(path):
+
+    """
+    Function for reading a batch manifest, a JSON(.json) or TOML(.toml) file with the settings of many jobs
+    :param path: path of the manifest, with 'output' for the output directory(the name of the manifest by default), 'defaults' for the settings \
+shared by all jobs and 'jobs' for the list of jobs, each with its 'name', 'option' and other settings of makeJob, relative paths taken from the \
+directory of the manifest
+    :return: dict of the batch, with the output directory in 'output' and the list of (name, job) in 'jobs'
+    """
+
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            raise Exception('readManifest: TOML manifests need Python 3.11 or later, please use a JSON manifest instead')
+        with open(path, 'rb') as f:
+            manifest = tomllib.load(f)
+    else:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    if not isinstance(manifest.get('jobs'), list) or len(manifest['jobs']) == 0:
+        raise Exception('readManifest: no job given in ' + path)
+    base = os.path.dirname(os.path.realpath(path))
+    batch = {'output': os.path.join(base, manifest.get('output', os.path.splitext(os.path.basename(path))[0])), 'jobs': []}
+    names = []
+    for ijob, curSettings in enumerate(manifest['jobs']):
+        settings = dict(manifest.get('defaults', {}))
+        settings.update(curSettings)
+        name = str(settings.pop('name', 'job' + str(ijob + 1)))
+        option = settings.pop('option', '')
+        if name in names:
+            raise Exception('readManifest: job name ' + name + ' given more than once')
+        names.append(name)
+        for key in manifestPaths:
+            if not key in settings:
+                continue
+            if isinstance(settings[key], list):
+                settings[key] = [os.path.join(base, file) for file in settings[key]]
+            elif not settings[key] == '':
+                settings[key] = os.path.join(base, settings[key])
+        try:
+            batch['jobs'].append((name, makeJob(option, **settings)))
+        except Exception as e:
+            raise Exception('readManifest: job ' + name + ', ' + str(e))
+    return batch
+
+def runBatch(pipeline, batch, workers = 1):
+
+    """
+    Function for running the jobs of a batch, with the background files shared by the jobs read out once and the data files of every group of \
+workers jobs read out together by a process pool before their fits
+    :param pipeline: dict of the pipeline
+    :param batch: dict of the batch from readManifest
+    :param workers: number of processes for the readout and fits
+    :return: list of the summaries of the jobs, also written to 'summary.json' in the output directory, with the results of each job but the data \
+in '<name>.pkl' and the figures of the jobs making plots in '<name>' there unless their 'plotDir' is given
+    """
+
+    jobs = batch['jobs']
+    output = batch['output']
+    os.makedirs(output, exist_ok = True)
+    bkgStages = {}
+    groups = [jobs[i:i + workers] for i in range(0, len(jobs), workers)]
+    groupStages = []
+    for group in groups:
+        groupStages.append({})
+        for name, job in group:
+            #jobs with missing files left to fail in runJob
+            try:
+                bkgStages.update([(stage['key'], stage) for stage in backgroundReadoutStages(job)])
+                if not 'i' in job['option']:
+                    groupStages[-1].update([(stage['key'], stage) for stage in fileReadoutStages(job)])
+            except OSError:
+                continue
+    bkgStages = list(bkgStages.values())
+    groupStages = [list(curStages.values()) for curStages in groupStages]
+    memory = pipeline['memory']
+    pipeline['memory'] = max([memory, len(bkgStages) + max([len(curStages) for curStages in groupStages])])
+    summary = []
+    try:
+        #Shared background files
+        if not len(bkgStages) == 0:
+            try:
+                readFiles(pipeline, bkgStages, workers)
+            except Exception as e:
+                print('runBatch: readout of the background files failed, ' + str(e))
+
+        for group, curStages in zip(groups, groupStages):
+            #Data files of the group, read out again by the jobs themselves if failed here
+            try:
+                readFiles(pipeline, curStages, workers)
+            except Exception as e:
+                print('runBatch: readout of the data files failed, ' + str(e))
+
+            for name, job in group:
+                curSummary = {'name': name, 'status': 'done', 'error': '', 'time': 0.0, 'files': len(job['mulfilename'] + job['filename']), 'runs': 0, \
+                    'figures': 0, 'results': name + '.pkl'}
+                plotDir = job['plotDir']
+                if plotDir == '' and hasPlots(job):
+                    plotDir = os.path.join(output, name)
+                start = time.perf_counter()
+                try:
+                    results = runJob(pipeline, dict(job, jobs = max(job['jobs'], workers), plotDir = plotDir))
+                    curSummary['runs'] = len(results['data']['uscount'])
+                    curSummary['figures'] = len(results['figures'])
+                    results['filename'] = results.pop('data')['filename']
+                    with open(os.path.join(output, name + '.pkl'), 'wb') as f:
+                        pickle.dump(results, f)
+                except Exception as e:
+                    curSummary.update({'status': 'failed', 'error': str(e), 'results': ''})
+                    print('runBatch: job ' + name + ' failed, ' + str(e))
+                curSummary['time'] = time.perf_counter() - start
+                if os.path.isdir(plotDir) and len(os.listdir(plotDir)) == 0:
+                    os.rmdir(plotDir)
+                summary.append(curSummary)
+                with open(os.path.join(output, 'summary.json'), 'w') as f:
+                    json.dump(summary, f, indent = 4)
+    finally:
+        pipeline['memory'] = memory
+        for memo in pipeline['stages'].values():
+            while len(memo) > memory:
+                del memo[next(iter(memo))]
+    print('runBatch: ' + str(len([curSummary for curSummary in summary if curSummary['status'] == 'done'])) + ' of ' + str(len(jobs)) + \
+        ' jobs done, summary written to ' + os.path.join(output, 'summary.json'))
+    return summary
+
+#*****************************************************************************************************************************************************
+#****************************************************************Watch and follow part****************************************************************
+#*****************************************************************************************************************************************************
+
+def pollFolder(folder, sizes):
+
+    """
+    Function for finding the raw files complete in a folder, a file being taken as complete once its size and modification time are unchanged since \
+the last poll
+    :param folder: the folder
+    :param sizes: dict of the sizes and modification times of the files at the last poll, updated here
+    :return: list of the complete files, in the order of modification time
+    """
+
+    current = {}
+    for file in os.listdir(folder):
+        path = os.path.join(folder, file)
+        if not file.endswith('.txt'):
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        current[path] = (stat.st_size, stat.st_mtime_ns)
+    complete = [path for path in current if current[path][0] > 0 and sizes.get(path) == current[path]]
+    sizes.clear()
+    sizes.update(current)
+    return sorted(complete, key=lambda path: current[path][1])
+
+def mergeData(data, newData):
+
+    """
+    Function for appending the data of the runs of new files to the data of processFiles()
+    :param data: data of processFiles(), None for no data yet
+    :param newData: data of processFiles() for the new files
+    :return: data of all runs, in the form of [channel][run][data] or [run][data]
+    """
+
+    if data is None:
+        return newData
+    merged = {}
+    for key in data:
+        if key == 'filename':
+            merged[key] = data[key] + newData[key]
+        elif isinstance(data[key], grid.RaggedArray) and data[key].ndim == 2:
+            merged[key] = grid.buildRagged([list(data[key][ich]) + list(newData[key][ich]) for ich in range(4)], 2)
+        elif isinstance(data[key], grid.RaggedArray):
+            merged[key] = grid.buildRagged(list(data[key]) + list(newData[key]), 1)
+        #I-V scan data in the form of [channel][file][data]
+        elif key in ['vScan', 'iScan']:
+            merged[key] = np.concatenate([data[key], newData[key]], axis=1)
+        elif isinstance(data[key], np.ndarray):
+            merged[key] = np.concatenate([data[key], newData[key]])
+        #Data not read out
+        else:
+            merged[key] = data[key]
+    return merged
+
+def watchFolder(pipeline, job, folder, interval = 2.0, polls = 0):
+
+    """
+    Function for watching a folder of the raw files written by the DAQ, each new file read out and fitted once it is complete and the results of the \
+experiment stage updated with the data and fit results of all files processed so far, with no file processed again
+    :param pipeline: dict of the pipeline
+    :param job: dict of the job, with its files replaced by the files of the folder, all taken as single run files in the order of the angles for the \
+angular responce
+    :param folder: the folder, with the files already there processed at the first update
+    :param interval: time between the polls of the folder in seconds
+    :param polls: number of polls before the watch stops, 0 for watching until interrupted
+    :return: dict of the results as runJob(), with the files processed in 'processed' and the files failed in 'failed'
+    """
+
+    if not os.path.isdir(folder):
+        raise Exception('watchFolder: directory ' + folder + ' does not exist')
+    if job['plotDir'] == '' and hasPlots(job):
+        print('watchFolder: figures shown interactively will stop the watch until closed, please give \'plotDir\' for batch plotting instead')
+    results = {'data': None, 'fitResults': None, 'removed': 0, 'figures': [], 'processed': [], 'failed': []}
+    sizes = {}
+    ipoll = 0
+    bkgFiles = [os.path.realpath(file) for file in job['bkgFilename']]
+
+    if not job['plotDir'] == '':
+        grid.startBatchPlot(job['plotDir'], job['plotFormats'] if not len(job['plotFormats']) == 0 else ['png'], job['jobs'])
+    try:
+        background = readBackground(pipeline, job)
+        print('watchFolder: watching ' + folder + ', press Ctrl+C to stop')
+        while polls == 0 or ipoll < polls:
+            start = time.perf_counter()
+            newFiles = [file for file in pollFolder(folder, sizes) if not file in results['processed'] + results['failed'] and \
+                not os.path.realpath(file) in bkgFiles]
+
+            #Readout and fits of the new files only, with the data and fit results appended to those of the files processed before
+            if not len(newFiles) == 0:
+                try:
+                    data, fitResults = processFiles(pipeline, dict(job, filename = newFiles, mulfilename = [], scanRange = []), background)
+                except Exception as e:
+                    print('watchFolder: processing of ' + ', '.join(newFiles) + ' failed, ' + str(e))
+                    results['failed'] += newFiles
+                    newFiles = []
+            if not len(newFiles) == 0:
+                results['processed'] += newFiles
+                results['data'] = mergeData(results['data'], data)
+                if fitResults is not None:
+                    #fit results in the form of [channel][file] for fits of all channels, or [file] for single channel fits
+                    axis = 0 if job['singlech'] else 1
+                    results['fitResults'] = fitResults if results['fitResults'] is None else np.concatenate([results['fitResults'], fitResults], axis=axis)
+
+                #Experiment stage with all files processed so far
+                try:
+                    results.update(experimentStage(job, results['data'], results['fitResults'], True))
+                except Exception as e:
+                    print('watchFolder: experiment stage failed with ' + str(len(results['processed'])) + ' files, ' + str(e))
+                print('watchFolder: ' + str(len(newFiles)) + ' new files processed in ' + '{:.2f}'.format(time.perf_counter() - start) + ' s, ' + \
+                    str(len(results['processed'])) + ' files processed in total')
+
+            ipoll += 1
+            if polls == 0 or ipoll < polls:
+                time.sleep(max(interval - (time.perf_counter() - start), 0.0))
+    except KeyboardInterrupt:
+        print('watchFolder: watch stopped')
+    finally:
+        if not job['plotDir'] == '':
+            results['figures'] = grid.finishBatchPlot()
+    return results
+
+def followFile(job, filename, interval = 2.0, polls = 0):
+
+    """
+    Function for following a raw file still being written, the lines appended since the last poll decoded and the running spectra and count rates of \
+all channels updated and printed along with the rate-corrected total count rate of tailLiveTime() if the job has rateStyle, with the spectra also \
+plotted for each update if 'p' in the option of the job
+    :param job: dict of the job, with the readout settings and nbins of the plots
+    :param filename: name of the file
+    :param interval: time between the polls of the file in seconds
+    :param polls: number of polls before the readout stops, 0 for following until interrupted
+    :return: live readout state of tailReadout(), with the running spectra and live time
+    """
+
+    if not os.path.isfile(filename):
+        raise Exception('followFile: file ' + filename + ' not found')
+    if job['plotDir'] == '' and 'p' in job['option']:
+        print('followFile: figures shown interactively will stop the readout until closed, please give \'plotDir\' for batch plotting instead')
+    tail = grid.tailState(filename, job['isHex'], job['isCi'], job['isScan'], [], job['rateStyle'], job['newProgramme'], job['timeCut'])
+    ipoll = 0
+
+    if not job['plotDir'] == '':
+        grid.startBatchPlot(job['plotDir'], job['plotFormats'] if not len(job['plotFormats']) == 0 else ['png'], job['jobs'])
+    try:
+        print('followFile: following ' + filename + ', press Ctrl+C to stop')
+        while polls == 0 or ipoll < polls:
+            start = time.perf_counter()
+            size = grid.tailReadout(tail)
+            if size > 0:
+                liveTime = np.nan_to_num(tail['last'] - tail['first'])
+                counts = np.sum(tail['full'], axis=1)
+                rates = [counts[ich] / liveTime[ich] if liveTime[ich] > 0 else 0.0 for ich in range(4)]
+                rateStyle = ''
+                rateAll = 1.0
+                rateInfo = ''
+                if not job['rateStyle'] == '':
+                    b, bErr, nTime = grid.tailLiveTime(tail)
+                    if b > 0:
+                        rateStyle = job['rateStyle']
+                        rateAll = 1 / b
+                        rateInfo = ', corrected total count rate ' + '{:.2f}'.format(rateAll) + ' +- ' + '{:.2f}'.format(bErr / b ** 2) + ' cps from ' + \
+                            str(nTime) + ' live time data'
+                print('followFile: ' + str(size) + ' new bytes decoded in ' + '{:.2f}'.format(time.perf_counter() - start) + ' s, ' + str(tail['events']) + \
+                    ' events, count rates ' + ', '.join(['{:.2f}'.format(rate) for rate in rates]) + ' cps' + rateInfo)
+                if 'p' in job['option']:
+                    grid.plotRawData(filename.split('\\')[-1], tail['full'], job['nbins'], [1.0, 1.0, 1.0, 1.0], list(liveTime), rateStyle = rateStyle, \
+                        rateAll = rateAll, doCorr = False, full = tail['full'])
+            ipoll += 1
+            if polls == 0 or ipoll < polls:
+                time.sleep(max(interval - (time.perf_counter() - start), 0.0))
+    except KeyboardInterrupt:
+        print('followFile: readout stopped')
+    finally:
+        if not job['plotDir'] == '':
+            grid.finishBatchPlot()
+    if not job['rateStyle'] == '' and tail['timeCount'] > 0:
+        b, bErr, nTime = grid.tailLiveTime(tail, True)
+        print('followFile: corrected total count rate ' + '{:.2f}'.format(1 / b) + ' +- ' + '{:.2f}'.format(bErr / b ** 2) + ' cps from ' + str(nTime) + \
+            ' live time data after the outlier cut')
+    return tail